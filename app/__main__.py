@@ -1,3 +1,15 @@
+import sys
+
+if "--headless" in sys.argv[1:]:
+    # 无界面服务模式：不导入 tkinter/界面模块，启动更快、内存更少
+    try:
+        from app.headless import main as headless_main  # type: ignore
+    except Exception:  # 回退在包内相对导入
+        from .headless import main as headless_main  # type: ignore
+
+    headless_main([arg for arg in sys.argv[1:] if arg != "--headless"])
+    sys.exit(0)
+
 try:
     # 优先绝对导入，兼容打包/解释器不同运行环境
     from app.main import main  # type: ignore
@@ -7,5 +19,3 @@ except Exception:  # 回退在包内相对导入
 
 if __name__ == "__main__":
     main()
-
-
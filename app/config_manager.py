@@ -1,11 +1,24 @@
 from __future__ import annotations
 
 import json
+import logging
+import os
+import threading
+import time
 import uuid
 from dataclasses import asdict, dataclass, field
 from pathlib import Path
 from typing import Dict, List, Optional
 
+logger = logging.getLogger("app.config")
+
+# 连续保存时，最后一次保存后等待该时间（毫秒）再写入，合并输入框逐字修改等连续保存
+SAVE_DEBOUNCE_MS = 300
+# 持续有保存时，第一次保存后最迟在该时间（毫秒）内写入
+SAVE_MAX_DELAY_MS = 2000
+# 替换配置文件失败（例如被杀毒软件短暂占用）时的重试次数
+REPLACE_RETRIES = 5
+
 
 @dataclass
 class Rect:
@@ -27,6 +40,13 @@ class Rect:
         return {"x": self.x, "y": self.y, "width": self.width, "height": self.height}
 
 
+# 默认启用名单匹配的字段（人员和诊室，取值范围有限）
+ROSTER_PARAMS = ("docName", "auxiliaryNurse", "examiningTable")
+
+# 数字字段的重试变体：numeric 方案二值化时按前景自动定极性，反色变体不会改变结果
+NUMERIC_RETRY_VARIANTS = "pad,upscale"
+
+
 @dataclass
 class OCRField:
     field_id: str
@@ -38,6 +58,11 @@ class OCRField:
     sample_value: str = ""
     recognized_value: str = ""
     builtin: bool = False
+    preprocess_profile: str = ""  # 预处理预设名称或方案，见 app/ocr_preprocess.py；空为默认预设
+    retry_variants: str = "pad,upscale,invert"  # 识别未通过时依次尝试的变体，见 app/ocr_retry.py
+    validator: str = ""  # 识别结果校验规则（正则表达式），为空时按置信度判断
+    min_confidence: float = 0.0  # 字段置信度阈值，为0时使用全局阈值
+    use_roster: bool = False  # 识别结果吸附到字段名单（见 app/roster.py）
 
     @classmethod
     def from_dict(cls, data: Dict) -> "OCRField":
@@ -52,6 +77,11 @@ class OCRField:
             sample_value=data.get("sample_value", ""),
             recognized_value=data.get("recognized_value", ""),
             builtin=bool(data.get("builtin", False)),
+            preprocess_profile=data.get("preprocess_profile", ""),
+            retry_variants=data.get("retry_variants", "pad,upscale,invert"),
+            validator=data.get("validator", ""),
+            min_confidence=float(data.get("min_confidence", 0.0)),
+            use_roster=bool(data.get("use_roster", data.get("param_name") in ROSTER_PARAMS)),
         )
 
     def to_dict(self) -> Dict:
@@ -106,6 +136,8 @@ class ServiceConfig:
     enable_verification: bool = True
     popup_success: bool = True
     popup_failure: bool = True
+    # V2：发出洗消验证请求的同时开始识别字段，验证为“可用”时直接使用识别结果
+    speculative_ocr: bool = True
 
     @classmethod
     def from_dict(cls, data: Dict) -> "ServiceConfig":
@@ -123,6 +155,7 @@ class ServiceConfig:
             enable_verification=bool(data.get("enable_verification", True)),
             popup_success=bool(data.get("popup_success", True)),
             popup_failure=bool(data.get("popup_failure", True)),
+            speculative_ocr=bool(data.get("speculative_ocr", True)),
         )
 
     def to_dict(self) -> Dict:
@@ -132,6 +165,7 @@ class ServiceConfig:
             "enable_verification": self.enable_verification,
             "popup_success": self.popup_success,
             "popup_failure": self.popup_failure,
+            "speculative_ocr": self.speculative_ocr,
         }
 
     def get_selected_version(self) -> ServiceVersionConfig:
@@ -145,6 +179,15 @@ class BackendConfig:
     enable_startup: bool = False
     enable_float_input: bool = False
     enable_service: bool = True
+    # 同一卡号在该时间（秒）内从任意来源重复到达只处理一次
+    swipe_dedupe_seconds: float = 2.0
+    # 流水线式刷卡：新卡排队等待前面的卡确认/提交，不打断正在进行的流程
+    swipe_pipeline: bool = False
+    swipe_max_active: int = 1  # 流水线模式下同时进行的刷卡流程数
+    # 本机 Prometheus 指标端点 http://127.0.0.1:<端口>/metrics，0 表示不启用
+    metrics_port: int = 0
+    # 每次刷卡的耗时分段写入 logs/traces.jsonl，分析见 scripts/trace_report.py
+    trace_swipes: bool = True
 
     @classmethod
     def from_dict(cls, data: Dict) -> "BackendConfig":
@@ -154,6 +197,11 @@ class BackendConfig:
             enable_startup=bool(data.get("enable_startup", False)),
             enable_float_input=bool(data.get("enable_float_input", False)),
             enable_service=bool(data.get("enable_service", True)),
+            swipe_dedupe_seconds=float(data.get("swipe_dedupe_seconds", 2.0)),
+            swipe_pipeline=bool(data.get("swipe_pipeline", False)),
+            swipe_max_active=int(data.get("swipe_max_active", 1)),
+            metrics_port=int(data.get("metrics_port", 0)),
+            trace_swipes=bool(data.get("trace_swipes", True)),
         )
 
     def to_dict(self) -> Dict:
@@ -163,6 +211,11 @@ class BackendConfig:
             "enable_startup": self.enable_startup,
             "enable_float_input": self.enable_float_input,
             "enable_service": self.enable_service,
+            "swipe_dedupe_seconds": self.swipe_dedupe_seconds,
+            "swipe_pipeline": self.swipe_pipeline,
+            "swipe_max_active": self.swipe_max_active,
+            "metrics_port": self.metrics_port,
+            "trace_swipes": self.trace_swipes,
         }
 
 
@@ -195,26 +248,130 @@ class HidConfig:
         }
 
 
+@dataclass
+class OCRConfig:
+    """OCR运行配置"""
+    enable_screen_watcher: bool = False
+    watcher_interval_ms: int = 500
+    watcher_settle_ticks: int = 2
+    use_ocr_server: bool = False
+    ocr_server_port: int = 47831
+    ocr_server_timeout_ms: int = 15000
+    preferred_engine: str = ""
+    auto_calibrate: bool = True
+    calibration_accuracy_floor: float = 0.8
+    calibration_summary: str = ""
+    engine_pool_size: int = 2
+    min_confidence: float = 0.5
+    # 识别结果缓存写入配置目录下的 ocr_cache.db，重启后依然有效；默认只缓存在内存中
+    disk_cache: bool = False
+    # 整页识别：所有字段一次检测识别后按位置分配，未通过校验的字段再逐字段识别
+    form_recognition: bool = False
+    # 截屏后端：auto / pil / mss / replay（replay 从 capture_replay_path 读取保存的整屏截图）
+    capture_backend: str = "auto"
+    capture_ttl_ms: int = 20
+    capture_replay_path: str = ""
+    # 空闲多少分钟后卸载OCR模型（0 表示不卸载），有刷卡活动时自动重新加载
+    idle_unload_minutes: int = 30
+    # OCR引擎所在进程的常驻内存预算（MB），0 表示不限制
+    memory_budget_mb: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "OCRConfig":
+        return cls(
+            enable_screen_watcher=bool(data.get("enable_screen_watcher", False)),
+            watcher_interval_ms=int(data.get("watcher_interval_ms", 500)),
+            watcher_settle_ticks=int(data.get("watcher_settle_ticks", 2)),
+            use_ocr_server=bool(data.get("use_ocr_server", False)),
+            ocr_server_port=int(data.get("ocr_server_port", 47831)),
+            ocr_server_timeout_ms=int(data.get("ocr_server_timeout_ms", 15000)),
+            preferred_engine=data.get("preferred_engine", ""),
+            auto_calibrate=bool(data.get("auto_calibrate", True)),
+            calibration_accuracy_floor=float(data.get("calibration_accuracy_floor", 0.8)),
+            calibration_summary=data.get("calibration_summary", ""),
+            engine_pool_size=int(data.get("engine_pool_size", 2)),
+            min_confidence=float(data.get("min_confidence", 0.5)),
+            disk_cache=bool(data.get("disk_cache", False)),
+            form_recognition=bool(data.get("form_recognition", False)),
+            capture_backend=data.get("capture_backend", "auto"),
+            capture_ttl_ms=int(data.get("capture_ttl_ms", 20)),
+            capture_replay_path=data.get("capture_replay_path", ""),
+            idle_unload_minutes=int(data.get("idle_unload_minutes", 30)),
+            memory_budget_mb=int(data.get("memory_budget_mb", 0)),
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "enable_screen_watcher": self.enable_screen_watcher,
+            "watcher_interval_ms": self.watcher_interval_ms,
+            "watcher_settle_ticks": self.watcher_settle_ticks,
+            "use_ocr_server": self.use_ocr_server,
+            "ocr_server_port": self.ocr_server_port,
+            "ocr_server_timeout_ms": self.ocr_server_timeout_ms,
+            "preferred_engine": self.preferred_engine,
+            "auto_calibrate": self.auto_calibrate,
+            "calibration_accuracy_floor": self.calibration_accuracy_floor,
+            "calibration_summary": self.calibration_summary,
+            "engine_pool_size": self.engine_pool_size,
+            "min_confidence": self.min_confidence,
+            "disk_cache": self.disk_cache,
+            "form_recognition": self.form_recognition,
+            "capture_backend": self.capture_backend,
+            "capture_ttl_ms": self.capture_ttl_ms,
+            "capture_replay_path": self.capture_replay_path,
+            "idle_unload_minutes": self.idle_unload_minutes,
+            "memory_budget_mb": self.memory_budget_mb,
+        }
+
+
+@dataclass
+class LayoutAnchor:
+    """版面锚点：定位时框选的参考图及其屏幕位置，字段区域随锚点的位移平移"""
+    rect: Rect
+    image_file: str = "layout_anchor.png"  # 相对于配置目录
+    search_margin: int = 200  # 在锚点原位置周围搜索的范围（像素）
+    min_score: float = 0.8  # 相关系数低于该值视为未找到
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LayoutAnchor":
+        return cls(
+            rect=Rect.from_dict(data.get("rect", {})),
+            image_file=data.get("image_file", "layout_anchor.png"),
+            search_margin=int(data.get("search_margin", 200)),
+            min_score=float(data.get("min_score", 0.8)),
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "rect": self.rect.to_dict(),
+            "image_file": self.image_file,
+            "search_margin": self.search_margin,
+            "min_score": self.min_score,
+        }
+
+
 @dataclass
 class AppConfig:
     ocr_fields: List[OCRField] = field(default_factory=list)
     service: ServiceConfig = field(default_factory=ServiceConfig)
     backend: BackendConfig = field(default_factory=BackendConfig)
     hid: HidConfig = field(default_factory=HidConfig)
+    ocr: OCRConfig = field(default_factory=OCRConfig)
+    anchor: Optional[LayoutAnchor] = None
 
     @classmethod
     def default(cls) -> "AppConfig":
         fields = [
             OCRField(field_id=str(uuid.uuid4()), name="卡ID", param_name="RFID", builtin=True),
-            OCRField(field_id=str(uuid.uuid4()), name="诊疗时间", param_name="Treatime", builtin=True),
-            OCRField(field_id=str(uuid.uuid4()), name="唯一ID", param_name="Number1", sample_value="ID001"),
-            OCRField(field_id=str(uuid.uuid4()), name="流水号", param_name="LSNumber2", sample_value="SN001"),
+            OCRField(field_id=str(uuid.uuid4()), name="诊疗时间", param_name="Treatime", builtin=True, preprocess_profile="numeric", retry_variants=NUMERIC_RETRY_VARIANTS, validator=r"\d"),
+            OCRField(field_id=str(uuid.uuid4()), name="唯一ID", param_name="Number1", sample_value="ID001", preprocess_profile="numeric", retry_variants=NUMERIC_RETRY_VARIANTS),
+            OCRField(field_id=str(uuid.uuid4()), name="流水号", param_name="LSNumber2", sample_value="SN001", preprocess_profile="numeric", retry_variants=NUMERIC_RETRY_VARIANTS),
             OCRField(field_id=str(uuid.uuid4()), name="姓名", param_name="DJName", sample_value="张三"),
-            OCRField(field_id=str(uuid.uuid4()), name="年龄", param_name="Age", sample_value="23"),
+            OCRField(field_id=str(uuid.uuid4()), name="年龄", param_name="Age", sample_value="23", preprocess_profile="numeric", retry_variants=NUMERIC_RETRY_VARIANTS, validator=r"\d"),
             OCRField(field_id=str(uuid.uuid4()), name="性别", param_name="Sex", sample_value="男"),
-            OCRField(field_id=str(uuid.uuid4()), name="医生", param_name="docName", sample_value="王医生"),
-            OCRField(field_id=str(uuid.uuid4()), name="护士", param_name="auxiliaryNurse", sample_value="李护士"),
-            OCRField(field_id=str(uuid.uuid4()), name="诊疗间", param_name="examiningTable", sample_value="诊疗间2"),
+            OCRField(field_id=str(uuid.uuid4()), name="医生", param_name="docName", sample_value="王医生", use_roster=True),
+            OCRField(field_id=str(uuid.uuid4()), name="护士", param_name="auxiliaryNurse", sample_value="李护士", use_roster=True),
+            OCRField(field_id=str(uuid.uuid4()), name="诊疗间", param_name="examiningTable", sample_value="诊疗间2", use_roster=True),
             OCRField(field_id=str(uuid.uuid4()), name="阴阳性", param_name="infectivity", default_value="1"),
         ]
         return cls(ocr_fields=fields)
@@ -228,6 +385,8 @@ class AppConfig:
             service=ServiceConfig.from_dict(data.get("service", {})),
             backend=BackendConfig.from_dict(data.get("backend", {})),
             hid=HidConfig.from_dict(data.get("hid", {})),
+            ocr=OCRConfig.from_dict(data.get("ocr", {})),
+            anchor=LayoutAnchor.from_dict(data["anchor"]) if data.get("anchor") else None,
         )
 
     def to_dict(self) -> Dict:
@@ -236,30 +395,162 @@ class AppConfig:
             "service": self.service.to_dict(),
             "backend": self.backend.to_dict(),
             "hid": self.hid.to_dict(),
+            "ocr": self.ocr.to_dict(),
+            "anchor": self.anchor.to_dict() if self.anchor else None,
         }
 
 
+def atomic_write_text(path: Path, text: str) -> None:
+    """
+    先写同目录下的临时文件并落盘，再原子替换目标文件；写到一半断电时原文件保持完整
+
+    Raises:
+        OSError: 写入或替换失败（临时文件已清理）
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(REPLACE_RETRIES):
+            try:
+                os.replace(tmp, path)
+                break
+            except PermissionError:
+                if attempt == REPLACE_RETRIES - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+
+
 class ConfigManager:
-    def __init__(self, path: Path) -> None:
+    """
+    配置文件读写
+
+    save() 在调用线程中只生成配置的快照，由后台写入线程合并短时间内的多次保存后写一次，
+    内容与上次写入的相同时跳过。写入先写同目录下的临时文件并 fsync，再替换配置文件，
+    写到一半时崩溃或断电不会留下不完整的 JSON。程序退出前调用 close() 写入尚未写入的保存。
+    """
+
+    def __init__(self, path: Path, debounce_ms: float = SAVE_DEBOUNCE_MS) -> None:
         self.path = path
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.debounce_ms = debounce_ms
+        self._cond = threading.Condition()
+        self._pending: Optional[Dict] = None
+        self._first_pending = 0.0
+        self._last_save = 0.0
+        self._writing = False
+        self._last_written: Optional[str] = None
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
 
     def load(self) -> AppConfig:
         if not self.path.exists():
             config = AppConfig.default()
-            self.save(config)
+            self._write(self._serialize(config.to_dict()))
             return config
         try:
-            data = json.loads(self.path.read_text(encoding="utf-8"))
-            return AppConfig.from_dict(data)
-        except Exception:
+            text = self.path.read_text(encoding="utf-8")
+            config = AppConfig.from_dict(json.loads(text))
+            self._last_written = text
+            return config
+        except Exception as e:
+            # 保留无法解析的配置文件，便于人工恢复，再以默认配置启动
+            backup = self.path.with_name(f"{self.path.name}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}")
+            logger.error(f"配置文件 {self.path} 无法解析（{e}），已另存为 {backup.name} 并使用默认配置")
+            try:
+                os.replace(self.path, backup)
+            except OSError:
+                pass
             config = AppConfig.default()
-            self.save(config)
+            self._write(self._serialize(config.to_dict()))
             return config
 
     def save(self, config: AppConfig) -> None:
-        serialized = json.dumps(config.to_dict(), ensure_ascii=False, indent=2)
-        self.path.write_text(serialized, encoding="utf-8")
-
-
-
+        """记录待写入的配置（可在任意线程中调用，不等待写入完成）"""
+        snapshot = config.to_dict()
+        with self._cond:
+            if self._closed:
+                self._write(self._serialize(snapshot))
+                return
+            now = time.monotonic()
+            if self._pending is None:
+                self._first_pending = now
+            self._pending = snapshot
+            self._last_save = now
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name="config-writer", daemon=True)
+                self._writer.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """立即写入尚未写入的保存并等待完成，返回是否已全部写入"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # 让写入线程不再等待合并
+            self._first_pending = self._last_save = float("-inf")
+            self._cond.notify_all()
+            while self._pending is not None or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if self._writer is None or not self._writer.is_alive():
+                    snapshot, self._pending = self._pending, None
+                    if snapshot is not None:
+                        self._write(self._serialize(snapshot))
+                    continue
+                self._cond.wait(remaining)
+        return True
+
+    def close(self) -> None:
+        """写入尚未写入的保存并停止写入线程；之后的 save() 同步写入"""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _due(self) -> float:
+        debounce = self.debounce_ms / 1000.0
+        return min(self._last_save + debounce, self._first_pending + max(debounce, SAVE_MAX_DELAY_MS / 1000.0))
+
+    def _write_loop(self) -> None:
+        with self._cond:
+            while True:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                delay = self._due() - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                snapshot, self._pending = self._pending, None
+                self._writing = True
+                self._cond.release()
+                try:
+                    self._write(self._serialize(snapshot))
+                finally:
+                    self._cond.acquire()
+                    self._writing = False
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _serialize(data: Dict) -> str:
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def _write(self, text: str) -> None:
+        """原子替换配置文件；内容未变化时跳过"""
+        if text == self._last_written:
+            return
+        try:
+            atomic_write_text(self.path, text)
+            self._last_written = text
+        except OSError as e:
+            logger.error(f"保存配置文件 {self.path} 失败: {e}")
@@ -0,0 +1,628 @@
+"""
+无界面服务模式 - 自助终端和常驻部署
+
+不创建任何窗口，也不导入 tkinter：读取与界面版相同的配置文件，启动刷卡来源，
+按服务版本执行 验证 → OCR识别 → 信息绑定，日志写入文件。
+
+刷卡来源：
+- HID：配置中启用HID时监听刷卡器的键盘输入（与界面版相同的监听器）
+- BLE：--ble 指定设备名称或地址（包含匹配）时扫描并连接，接收通知中的卡号
+- 本机接口：回环地址上的文本行协议，每行一个卡号（10进制或16进制），
+  例如 echo 0012345678 | nc 127.0.0.1 47832
+
+与界面版的区别：
+- 识别完成后直接提交（没有人确认），提交失败时流程结束、不再重试
+- 识别结果只保留在内存中作为下一次刷卡的缺省值，不写回配置文件
+- 不运行后台预识别和启动时的引擎校准；使用配置中选定的引擎
+- V0.0 调试接口依赖界面，无界面模式下不处理
+
+运行：
+    python -m app --headless [--config app_settings.json] [--log-file logs/headless.log]
+Linux 下识别需要可截屏的 X 显示（例如 Xvfb）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import concurrent.futures
+import logging
+import logging.handlers
+import queue
+import signal
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config_manager import ConfigManager
+from app.roster import RosterStore
+from app.swipe_intake import SwipeIntake
+from app.swipe_pipeline import SwipePipeline, locate_layout_shift, parse_card_input
+from app.swipe_workflow import SwipeWorkflow
+from app.tracing import TRACE_FILE, TRACER, stamp_arrival
+
+DEFAULT_IPC_PORT = 47832
+LOG_FILE = "headless.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+# 调度循环等待任务的超时，用于及时响应退出信号
+_POLL_INTERVAL_S = 0.5
+
+logger = logging.getLogger("app.headless")
+
+
+class _CardLineHandler(socketserver.StreamRequestHandler):
+    """本机接口：每行一个卡号，回复 OK 或 ERROR"""
+
+    def handle(self) -> None:
+        service: HeadlessService = self.server.service  # type: ignore[attr-defined]
+        peer = self.client_address[0]
+        for raw in self.rfile:
+            line = raw.decode("utf-8", errors="replace").strip()
+            if not line:
+                continue
+            card = parse_card_input(line, f"IPC:{peer}")
+            if card is None:
+                self.wfile.write(b"ERROR empty\n")
+                continue
+            stamp_arrival(card)
+            service.dispatch(lambda card=card: service.on_card_data(card))
+            self.wfile.write(f"OK {card['dec']}\n".encode("utf-8"))
+
+
+class _CardLineServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class HeadlessService:
+    """
+    无界面刷卡服务
+
+    刷卡流程的状态变化、卡号到达等都派发到 run() 所在的调度线程中依次执行，
+    与界面版在Tk线程中执行的顺序一致。
+
+    Args:
+        config_path: 配置文件路径
+        ipc_port: 本机接口端口，0 表示不启用
+        ble_target: 要连接的BLE设备名称或地址（包含匹配），为空时不使用BLE
+        metrics_port: 本机 /metrics 端口，None 时使用配置，0 表示不启用
+        record_path: 录制刷卡会话的归档文件（见 app/session_record.py），None 表示不录制
+    """
+
+    def __init__(
+        self,
+        config_path: Path,
+        ipc_port: int = DEFAULT_IPC_PORT,
+        ble_target: str = "",
+        metrics_port: Optional[int] = None,
+        record_path: Optional[Path] = None,
+    ) -> None:
+        self.config_path = config_path
+        self.record_path = record_path
+        self.ipc_port = ipc_port
+        self.ble_target = ble_target
+        self.config = ConfigManager(config_path).load()
+        self.metrics_port = self.config.backend.metrics_port if metrics_port is None else metrics_port
+        self.rosters = RosterStore(config_path.parent / "rosters.json")
+        self.rosters.load()
+        self.rosters.seed(self.config.ocr_fields)
+        if self.config.backend.trace_swipes:
+            TRACER.configure(config_path.parent / "logs" / TRACE_FILE)
+        self._roster_candidates: Dict[int, Dict[str, str]] = {}
+        self._layout_tracker = None
+        self._layout_shift: Tuple[int, int] = (0, 0)
+        # 等待OCR引擎就绪后在调度线程执行的步骤
+        self._ocr_ready_callbacks: List[Callable[[], None]] = []
+        self.pipeline = SwipePipeline(self.config, self.rosters, self.log, layout_shift=self._update_layout_shift)
+
+        self._tasks: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.swipe_workflow = SwipeWorkflow(
+            self.executor, dispatch=self.dispatch, on_state=self._on_swipe_state, log=self.log
+        )
+        backend_cfg = self.config.backend
+        self.swipe_intake = SwipeIntake(
+            start=self._start_workflow,
+            dedupe_seconds=backend_cfg.swipe_dedupe_seconds,
+            pipeline=backend_cfg.swipe_pipeline,
+            max_active=backend_cfg.swipe_max_active,
+            log=self.log,
+        )
+
+        self.ocr_lifecycle = None
+        self.hid_listener = None
+        self.ipc_server: Optional[_CardLineServer] = None
+        self.metrics_server = None
+        self.recorder = None
+        self.manager = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def log(self, line: str) -> None:
+        logger.info(line)
+
+    def dispatch(self, fn: Callable[[], None]) -> None:
+        """在调度线程中执行（可在任意线程中调用）"""
+        self._tasks.put(fn)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    # ---- 启动与退出 ----
+
+    def start(self) -> None:
+        started = time.perf_counter()
+        self.log(f"[无界面] 启动，配置 {self.config_path}")
+        self._start_ocr()
+        self._start_hid_listener()
+        self._start_ipc_server()
+        self._start_metrics_server()
+        self._start_recording()
+        self._start_ble()
+
+        from app.ocr_engine import process_rss_mb
+
+        rss = process_rss_mb()
+        memory = f"，常驻内存 {rss:.0f} MB" if rss is not None else ""
+        self.log(f"[无界面] 启动完成，用时 {(time.perf_counter() - started) * 1000:.0f}ms{memory}")
+        if not self.config.backend.enable_service:
+            self.log("[无界面] 配置中未启用服务，刷卡只记录日志")
+
+    def run(self) -> None:
+        """调度循环：依次执行派发的任务，直到 stop()"""
+        while not self._stop_event.is_set():
+            try:
+                fn = self._tasks.get(timeout=_POLL_INTERVAL_S)
+            except queue.Empty:
+                continue
+            try:
+                fn()
+            except Exception:
+                logger.exception("[无界面] 任务执行失败")
+
+    def shutdown(self) -> None:
+        stats = self.swipe_intake.stats()
+        if stats["started"]:
+            self.log(
+                f"[刷卡] 共处理 {stats['started']} 张，去重 {stats['duplicates']} 次，最大排队 {stats['max_depth']} 张，"
+                f"平均等待 {stats['avg_wait_ms']:.0f}ms，最长等待 {stats['max_wait_ms']:.0f}ms"
+            )
+        self.swipe_workflow.cancel(reason="程序退出")
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.ipc_server is not None:
+            self.ipc_server.shutdown()
+            self.ipc_server.server_close()
+        if self.hid_listener is not None:
+            self.hid_listener.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.stop()
+        try:
+            from app.ocr_engine import close_ocr_engine
+
+            close_ocr_engine()
+        except Exception:
+            pass
+        if self.loop is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(self.manager.disconnect(), self.loop).result(timeout=3)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+        self.log("[无界面] 已退出")
+
+    def _start_ocr(self) -> None:
+        """与界面版相同的OCR配置；模型在后台加载，不阻塞启动"""
+        from app.ocr_engine import (
+            OCR_CACHE_FILE, add_ocr_state_listener, configure_ocr_cache, configure_ocr_memory_budget,
+            configure_ocr_pool, configure_ocr_server, start_ocr_warmup,
+        )
+        from app.ocr_lifecycle import OCRLifecycle
+        from app.screen_capture import configure_screen_capture
+
+        ocr_cfg = self.config.ocr
+        configure_ocr_cache(disk_path=self.config_path.parent / OCR_CACHE_FILE if ocr_cfg.disk_cache else None)
+        try:
+            capture = configure_screen_capture(
+                ocr_cfg.capture_backend, ocr_cfg.capture_ttl_ms, ocr_cfg.capture_replay_path or None
+            )
+        except Exception as e:
+            self.log(f"[截屏] {ocr_cfg.capture_backend} 后端不可用，改为自动选择: {e}")
+            capture = configure_screen_capture("auto", ocr_cfg.capture_ttl_ms)
+        self.log(f"[截屏] 使用 {capture.backend} 后端，帧缓存 {capture.ttl_ms:.0f}ms")
+        configure_ocr_pool(ocr_cfg.engine_pool_size)
+        configure_ocr_memory_budget(ocr_cfg.memory_budget_mb)
+        configure_ocr_server(
+            ocr_cfg.use_ocr_server,
+            port=ocr_cfg.ocr_server_port,
+            workdir=self.config_path.parent,
+            call_timeout=ocr_cfg.ocr_server_timeout_ms / 1000.0,
+            preferred_engine=ocr_cfg.preferred_engine or None,
+            pool_size=ocr_cfg.engine_pool_size,
+            memory_budget_mb=ocr_cfg.memory_budget_mb,
+            disk_cache=ocr_cfg.disk_cache,
+        )
+        self.ocr_lifecycle = OCRLifecycle(
+            idle_unload_minutes=ocr_cfg.idle_unload_minutes,
+            memory_budget_mb=ocr_cfg.memory_budget_mb,
+            preferred_engine=lambda: self.config.ocr.preferred_engine or None,
+            log=self.log,
+        )
+        self.ocr_lifecycle.start()
+        add_ocr_state_listener(lambda _state: self.dispatch(self._on_ocr_state_changed))
+        if ocr_cfg.auto_calibrate and not ocr_cfg.preferred_engine:
+            self.log("[OCR] 尚未校准引擎，使用默认引擎；可在界面版中执行引擎校准")
+        start_ocr_warmup(ocr_cfg.preferred_engine or None)
+
+    def _start_hid_listener(self) -> None:
+        hid_cfg = self.config.hid
+        if not hid_cfg.enabled:
+            self.log("HID监听：功能未启用，不启动监听器")
+            return
+        from app.hid_listener_simple import SimpleHidListener
+
+        try:
+            self.hid_listener = SimpleHidListener(
+                device_keywords=hid_cfg.device_keywords,
+                digit_length=hid_cfg.digit_length,
+                require_enter=hid_cfg.require_enter,
+                callback=self._dispatch_hid_card,
+                logger=self.log,
+                on_key=self._on_hid_key,
+            )
+            self.hid_listener.start()
+        except Exception as e:
+            self.hid_listener = None
+            self.log(f"[错误] 启动HID监听器失败: {e}")
+
+    def _start_ipc_server(self) -> None:
+        if not self.ipc_port:
+            return
+        try:
+            self.ipc_server = _CardLineServer(("127.0.0.1", self.ipc_port), _CardLineHandler)
+        except OSError as e:
+            self.log(f"[无界面] 本机接口端口 {self.ipc_port} 不可用: {e}")
+            return
+        self.ipc_server.service = self  # type: ignore[attr-defined]
+        threading.Thread(target=self.ipc_server.serve_forever, name="card-ipc", daemon=True).start()
+        self.log(f"[无界面] 本机接口已启动：127.0.0.1:{self.ipc_port}，每行一个卡号")
+
+    def _start_metrics_server(self) -> None:
+        if not self.metrics_port:
+            return
+        from app.metrics import MetricsServer
+
+        server = MetricsServer(self.metrics_port)
+        try:
+            server.start()
+        except OSError as e:
+            self.log(f"[指标] 端口 {self.metrics_port} 不可用，未启动指标端点: {e}")
+            return
+        self.metrics_server = server
+        self.log(f"[指标] 指标端点 http://127.0.0.1:{self.metrics_port}/metrics")
+
+    def _start_recording(self) -> None:
+        if self.record_path is None:
+            return
+        from app.session_record import SessionRecorder
+
+        recorder = SessionRecorder(self.record_path, self.config, self.config_path.parent, log=self.log)
+        try:
+            recorder.start()
+        except OSError as e:
+            self.log(f"[录制] 无法创建会话归档 {self.record_path}: {e}")
+            return
+        self.pipeline.http = recorder.transport(self.pipeline.http)
+        self.recorder = recorder
+
+    def _start_ble(self) -> None:
+        if not self.ble_target:
+            return
+        try:
+            from app.ble.ble_manager import BleManager
+        except Exception as e:
+            self.log(f"[BLE] 无法加载BLE模块，跳过: {e}")
+            return
+        self.manager = BleManager()
+        self.manager.set_callbacks(
+            on_log=self.log,
+            on_device_event=lambda event, _device: self.dispatch(
+                lambda: self._notify_ocr_activity("设备连接") if event == "connected" else None
+            ),
+            on_card_data=self._dispatch_ble_card,
+        )
+        self.loop = asyncio.new_event_loop()
+        self.manager.assign_loop(self.loop)
+        threading.Thread(target=self.loop.run_forever, name="ble-loop", daemon=True).start()
+        asyncio.run_coroutine_threadsafe(self._connect_ble(), self.loop)
+
+    async def _connect_ble(self) -> None:
+        target = self.ble_target.lower()
+        try:
+            devices = await self.manager.scan()
+            device = next(
+                (d for d in devices if target in (d.name or "").lower() or target in d.address.lower()), None
+            )
+            if device is None:
+                self.log(f"[BLE] 未找到设备 {self.ble_target}")
+                return
+            await self.manager.connect(device)
+        except Exception as e:
+            self.log(f"[BLE] 连接失败: {e}")
+
+    # ---- 刷卡来源 ----
+
+    def _notify_ocr_activity(self, source: str) -> None:
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.notify_activity(source)
+
+    def _on_hid_key(self) -> None:
+        """在键盘钩子线程中调用，只做计数，不能阻塞"""
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.note_keystroke()
+
+    def _dispatch_ble_card(self, data: Dict[str, str]) -> None:
+        """在BLE事件循环线程中调用"""
+        stamp_arrival(data)
+        self.dispatch(lambda: self.on_card_data(data))
+
+    def _dispatch_hid_card(self, value: str, device_name: str) -> None:
+        """在键盘钩子线程中调用"""
+        arrived = time.time()
+        self.dispatch(lambda: self._on_hid_card(value, device_name, arrived))
+
+    def _on_hid_card(self, value: str, device_name: str, arrived: Optional[float] = None) -> None:
+        digit_length = self.config.hid.digit_length
+        numeric_part = "".join(filter(str.isdigit, value)) or value
+        dec_value = numeric_part[-digit_length:].zfill(digit_length)
+        try:
+            dec_int = int(dec_value)
+            hex_value = f"{dec_int & 0xFFFFFFFF:08X}"
+            dec_value = f"{dec_int:010d}"
+        except ValueError:
+            hex_value = dec_value
+        self.on_card_data(stamp_arrival({"hex": hex_value, "dec": dec_value, "source": f"HID:{device_name}"}, arrived))
+
+    def on_card_data(self, data: Dict[str, str]) -> None:
+        trace = TRACER.begin(data)
+        with trace.timed("dedupe", parent=trace.root):
+            accepted = self.swipe_intake.accept(data)
+        if self.recorder is not None:
+            self.recorder.card(data)
+        if not accepted:
+            TRACER.end(trace, "duplicate")
+            return
+        self._notify_ocr_activity("刷卡")
+        self.log(f"捕获卡号 8H={data['hex']} 10D={data['dec']} 来源={data['source']} 关联ID={trace.trace_id}")
+        if not self.config.backend.enable_service:
+            TRACER.end(trace, "service_disabled")
+            return
+        if self.config.service.selected_version == "v0":
+            self.log("[无界面] V0.0 调试接口需要界面，已忽略本次刷卡")
+            TRACER.end(trace, "v0_debug")
+            return
+        self.swipe_intake.submit(data)
+
+    # ---- 刷卡流程 ----
+
+    def _layout_anchor_tracker(self):
+        if self.config.anchor is None:
+            return None
+        if self._layout_tracker is None:
+            from app.layout_anchor import AnchorTracker
+
+            self._layout_tracker = AnchorTracker.from_config(self.config.anchor, self.config_path.parent)
+        return self._layout_tracker
+
+    def _update_layout_shift(self) -> Tuple[int, int]:
+        self._layout_shift = locate_layout_shift(self._layout_anchor_tracker(), self._layout_shift, self.log)
+        return self._layout_shift
+
+    def _start_workflow(self, card: Dict[str, str], preempt: bool = True) -> None:
+        from app.ocr_engine import STATE_READY, get_ocr_state
+        from app.swipe_workflow import STATE_VERIFYING
+
+        run = self.swipe_workflow.start(
+            card, self.config.ocr_fields, preempt=preempt,
+            anchor=self._layout_anchor_tracker(), layout_shift=self._layout_shift,
+        )
+        service = self.config.service
+        if service.selected_version == "v2":
+            if not service.enable_verification:
+                self._start_swipe_recognition(run)
+                return
+            payload = self.pipeline.build_payload(card, fields={})
+            self.swipe_workflow.transition(run, STATE_VERIFYING)
+            speculation = None
+            # 模型未加载完成时不提前识别，避免占用线程等待加载
+            if service.speculative_ocr and get_ocr_state() == STATE_READY:
+                speculation = self.swipe_workflow.speculate(run, self.pipeline.recognize_swipe, name="recognize")
+            verify_url = service.get_selected_version().verify_url
+            self.swipe_workflow.run_step(
+                run,
+                lambda _run: self.pipeline.get_json(verify_url, payload),
+                on_done=lambda run, outcome: self._after_v2_verify(run, outcome, speculation),
+                name="verify",
+            )
+            return
+        missing = self.pipeline.missing_fields()
+        if missing:
+            self.log(f"字段缺失，已使用空值：{', '.join(missing)}")
+        payload = self.pipeline.build_payload(card)
+        if not service.enable_verification:
+            self._submit(run, payload)
+            return
+        self.swipe_workflow.transition(run, STATE_VERIFYING)
+        verify_url = service.get_selected_version().verify_url
+        self.swipe_workflow.run_step(
+            run,
+            lambda _run: self.pipeline.post_json(verify_url, payload),
+            on_done=lambda run, outcome: self._after_verify(run, outcome, payload),
+            name="verify",
+        )
+
+    def _after_verify(self, run, outcome: Tuple[bool, Dict], payload: Dict) -> None:
+        ok, response = outcome
+        if not ok:
+            msg = response.get("error") if isinstance(response, dict) else response
+            self.log(f"洗消验证失败: {msg}")
+            self.swipe_workflow.fail(run, str(msg))
+            return
+        text = response.get("message") if isinstance(response, dict) else str(response)
+        self.log(f"洗消验证成功: {text}")
+        self._submit(run, payload)
+
+    def _after_v2_verify(self, run, outcome: Tuple[bool, Dict], speculation=None) -> None:
+        from app.swipe_workflow import STATE_RECOGNIZING
+
+        msg = self.pipeline.v2_verify_failure(*outcome)
+        if msg is not None:
+            if speculation is not None:
+                self.log("[V2版本] 验证未通过，丢弃预先识别的结果")
+            self.swipe_workflow.fail(run, msg)
+        elif speculation is not None:
+            self.log("[V2版本] 验证状态：可用，使用预先识别的结果...")
+            if self.swipe_workflow.transition(run, STATE_RECOGNIZING):
+                self.swipe_workflow.attach(
+                    run, speculation, on_done=self._on_swipe_recognized, on_error=self._on_swipe_recognition_error
+                )
+        else:
+            self.log("[V2版本] 验证状态：可用，开始执行OCR识别...")
+            self._start_swipe_recognition(run)
+
+    def _start_swipe_recognition(self, run) -> None:
+        from app.swipe_workflow import STATE_RECOGNIZING
+
+        if not self.swipe_workflow.transition(run, STATE_RECOGNIZING):
+            return
+        self._run_when_ocr_ready(
+            lambda: self.swipe_workflow.run_step(
+                run,
+                self.pipeline.recognize_swipe,
+                on_done=self._on_swipe_recognized,
+                on_error=self._on_swipe_recognition_error,
+            )
+        )
+
+    def _run_when_ocr_ready(self, callback: Callable[[], None]) -> None:
+        """OCR引擎就绪后在调度线程执行回调；模型仍在加载时登记后由状态回调执行，不占用线程池"""
+        from app.ocr_engine import STATE_FAILED, STATE_READY, get_ocr_state, start_ocr_warmup
+
+        if get_ocr_state() in (STATE_READY, STATE_FAILED):
+            callback()
+            return
+        self.log("[OCR] 引擎尚未就绪，就绪后继续识别...")
+        self._ocr_ready_callbacks.append(callback)
+        start_ocr_warmup(self.config.ocr.preferred_engine or None)
+
+    def _on_ocr_state_changed(self) -> None:
+        from app.ocr_engine import STATE_FAILED, STATE_READY, get_ocr_state
+
+        if get_ocr_state() not in (STATE_READY, STATE_FAILED):
+            return
+        callbacks, self._ocr_ready_callbacks = self._ocr_ready_callbacks, []
+        # 逐个派发，某个步骤出错不影响其余步骤
+        for callback in callbacks:
+            self.dispatch(callback)
+
+    def _on_swipe_recognized(self, run, outcome: Tuple[Dict[str, str], Dict[str, str]]) -> None:
+        values, self._roster_candidates[run.run_id] = outcome
+        if run.anchor is not None and run.anchor is self._layout_tracker:
+            self._layout_shift = run.layout_shift
+        # 只更新内存中的字段值，作为下一次刷卡的缺省值；不改写部署的配置文件
+        self.pipeline.apply_recognized(values)
+        missing = self.pipeline.missing_fields()
+        if missing:
+            self.log(f"[V2版本] 以下字段缺失，已使用空值：{', '.join(missing)}")
+        self._submit(run, self.pipeline.build_payload(run.card))
+
+    def _on_swipe_recognition_error(self, run, error: Exception) -> None:
+        self.log(f"[V2版本] OCR识别过程中出错: {error}")
+        self.swipe_workflow.fail(run, str(error))
+
+    def _submit(self, run, payload: Dict) -> None:
+        """无人确认，进入确认状态后立即提交"""
+        from app.swipe_workflow import STATE_AWAITING_CONFIRM, STATE_SUBMITTING
+
+        if not self.swipe_workflow.transition(run, STATE_AWAITING_CONFIRM):
+            return
+        if not self.swipe_workflow.transition(run, STATE_SUBMITTING):
+            return
+        self.log(f"提交信息绑定接口：{payload.get('fields', {})}")
+        bind_url = self.config.service.get_selected_version().bind_url
+        self.swipe_workflow.run_step(
+            run,
+            lambda _run: self.pipeline.post_json(bind_url, payload),
+            on_done=self._after_submit,
+            name="bind",
+        )
+
+    def _after_submit(self, run, outcome: Tuple[bool, Dict]) -> None:
+        ok, data = outcome
+        if ok:
+            msg = data.get("message") if isinstance(data, dict) else str(data)
+            self.log(f"信息绑定成功：{msg}")
+            self.pipeline.learn_roster_candidates(self._roster_candidates.pop(run.run_id, {}))
+            self.swipe_workflow.finish(run)
+        else:
+            msg = data.get("error") if isinstance(data, dict) else str(data)
+            self.log(f"信息绑定失败：{msg}")
+            self.swipe_workflow.fail(run, f"提交失败：{msg}")
+
+    def _on_swipe_state(self, run, state: str) -> None:
+        from app.swipe_workflow import FINAL_STATES
+
+        if state in FINAL_STATES:
+            self._roster_candidates.pop(run.run_id, None)
+            self.swipe_intake.release()
+
+
+def _configure_logging(log_file: Path, verbose: bool) -> None:
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    handler = logging.handlers.RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8"
+    )
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    default_config = Path(__file__).resolve().parent.parent / "app_settings.json"
+    parser = argparse.ArgumentParser(description="刷卡服务（无界面模式）")
+    parser.add_argument("--config", default=str(default_config), help="配置文件路径")
+    parser.add_argument("--log-file", default=None, help="日志文件，默认 <配置目录>/logs/headless.log")
+    parser.add_argument("--ipc-port", type=int, default=DEFAULT_IPC_PORT, help="本机接口端口，0 表示不启用")
+    parser.add_argument("--ble", default="", help="要连接的BLE设备名称或地址")
+    parser.add_argument("--metrics-port", type=int, default=None, help="本机 /metrics 端口，默认使用配置，0 表示不启用")
+    parser.add_argument("--record", default=None, help="把刷卡会话录制到该 zip 归档，用 scripts/replay_session.py 回放")
+    parser.add_argument("--verbose", action="store_true", help="记录调试日志")
+    args = parser.parse_args(argv)
+
+    config_path = Path(args.config).resolve()
+    log_file = Path(args.log_file) if args.log_file else config_path.parent / "logs" / LOG_FILE
+    _configure_logging(log_file, args.verbose)
+
+    service = HeadlessService(
+        config_path, ipc_port=args.ipc_port, ble_target=args.ble, metrics_port=args.metrics_port,
+        record_path=Path(args.record) if args.record else None,
+    )
+    signal.signal(signal.SIGINT, lambda *_: service.stop())
+    signal.signal(signal.SIGTERM, lambda *_: service.stop())
+    service.start()
+    try:
+        service.run()
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -109,6 +109,7 @@ class HidListener(threading.Thread):
         require_enter: bool,
         callback: Callable[[str, str], None],
         logger: Optional[Callable[[str], None]] = None,
+        on_key: Optional[Callable[[], None]] = None,
     ) -> None:
         super().__init__(daemon=True)
         self._keywords = [kw.lower() for kw in (device_keywords or []) if kw]
@@ -116,6 +117,8 @@ class HidListener(threading.Thread):
         self._require_enter = require_enter
         self._callback = callback
         self._logger = logger or (lambda _msg: None)
+        # 每收到一个数字键调用一次，用于在卡号输入完成前提前准备OCR引擎
+        self._on_key = on_key
         self._running = threading.Event()
         self._hwnd: Optional[int] = None
         self._wndproc_ref: Optional[WNDPROCTYPE] = None
@@ -267,6 +270,8 @@ class HidListener(threading.Thread):
             self._logger(f"HID调试: 非数字按键 - VKey={keyboard.VKey}")
             return
         self._buffer += char
+        if self._on_key:
+            self._on_key()
         self._logger(f"HID调试: 按键输入 - 字符='{char}', 当前缓冲区='{self._buffer}'")
         if not self._require_enter and len(self._buffer) >= self._digit_length:
             self._logger(f"HID调试: 达到数字长度限制，准备发射缓冲区")
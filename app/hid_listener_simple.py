@@ -29,13 +29,15 @@ class SimpleHidListener:
         require_enter: bool = False,
         callback: Optional[Callable[[str, str], None]] = None,
         logger: Optional[Callable[[str], None]] = None,
-        simplified: bool = False  # 兼容性参数，忽略
+        simplified: bool = False,  # 兼容性参数，忽略
+        on_key: Optional[Callable[[], None]] = None,
     ):
         self.device_keywords = device_keywords or []
         self.digit_length = digit_length
         self.require_enter = require_enter
         self.callback = callback
         self.logger_func = logger or self._default_logger
+        self.on_key = on_key  # 每收到一个数字键调用一次
         
         self._running = False
         self._thread = None
@@ -152,6 +154,8 @@ class SimpleHidListener:
         # 添加到缓冲区
         self._buffer += char
         self._last_key_time = current_time
+        if self.on_key:
+            self.on_key()
         
         self._log(f"添加字符 '{char}' 到缓冲区，当前缓冲区: '{self._buffer}'")
         
@@ -0,0 +1,260 @@
+"""
+版面锚点跟踪 - HIS 窗口移动或滚动后，识别区域随锚点一起偏移
+
+定位字段时额外框选一小块版面上位置固定、内容不变的区域（如窗口标题、表单标签）
+作为锚点，保存为参考图。每次刷卡识别前，只在锚点原位置周围的有限范围内截屏，
+用归一化互相关（NCC）做由粗到细的模板匹配：先在金字塔最粗一层用 FFT 计算全部
+位置的相关系数找到大致位置，再逐层放大、只在上一层结果附近逐像素细化。所有字段区域按
+测得的位移平移。搜索范围与屏幕分辨率无关，1080p/4K 下都只需几毫秒。
+"""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    import numpy as np
+    import PIL.Image
+    ANCHOR_AVAILABLE = True
+except ImportError:
+    ANCHOR_AVAILABLE = False
+
+from app.screen_capture import grab as grab_screen
+
+# 参考图灰度标准差低于该值时内容过于单一，无法可靠定位
+MIN_ANCHOR_CONTRAST = 4.0
+
+# 锚点参考图在最粗一层缩小后的最小边长（像素）
+COARSE_MIN_SIDE = 8
+
+# 图像金字塔的最大层数（每层缩小一半）
+MAX_PYRAMID_LEVELS = 2
+
+# 每一层细化时在上一层结果（放大两倍后）周围搜索的半径（像素）
+REFINE_RADIUS = 1
+
+# 最粗一层保留的候选位置数：缩小后奇数像素的位移会让真实位置的系数下降，只取最大值可能选错
+COARSE_CANDIDATES = 3
+
+# 细化后的系数达到该值即认为找到，不再细化其余候选
+EXACT_SCORE = 0.98
+
+
+@dataclass
+class AnchorMatch:
+    """锚点相对于定位时位置的位移"""
+    dx: int = 0
+    dy: int = 0
+    score: float = 0.0
+    found: bool = False
+    elapsed_ms: float = 0.0
+
+    @property
+    def shift(self) -> Tuple[int, int]:
+        return (self.dx, self.dy) if self.found else (0, 0)
+
+
+def _half(image: "np.ndarray") -> "np.ndarray":
+    """2x2 块求均值缩小一半"""
+    h, w = image.shape[0] // 2 * 2, image.shape[1] // 2 * 2
+    return (image[0:h:2, 0:w:2] + image[1:h:2, 0:w:2] + image[0:h:2, 1:w:2] + image[1:h:2, 1:w:2]) * 0.25
+
+
+def pyramid_levels(template: "np.ndarray") -> int:
+    """最粗一层的参考图仍不小于 COARSE_MIN_SIDE 时可用的层数"""
+    levels = 0
+    side = min(template.shape)
+    while levels < MAX_PYRAMID_LEVELS and side // 2 >= COARSE_MIN_SIDE:
+        side //= 2
+        levels += 1
+    return levels
+
+
+def build_pyramid(image: "np.ndarray", levels: int) -> list:
+    """[原图, 1/2, 1/4, ...]"""
+    pyramid = [image]
+    for _ in range(levels):
+        pyramid.append(_half(pyramid[-1]))
+    return pyramid
+
+
+def _fast_length(n: int) -> int:
+    """不小于 n 的 2^a * 3^b * 5^c，FFT 在这类长度上最快"""
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            p235 = p35
+            while p235 < n:
+                p235 *= 2
+            best = min(best, p235)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def _window_sums(image: "np.ndarray", h: int, w: int) -> "np.ndarray":
+    """每个 h x w 窗口内像素之和（积分图）"""
+    integral = np.zeros((image.shape[0] + 1, image.shape[1] + 1), dtype=np.float64)
+    np.cumsum(np.cumsum(image, axis=0), axis=1, out=integral[1:, 1:])
+    return integral[h:, w:] - integral[:-h, w:] - integral[h:, :-w] + integral[:-h, :-w]
+
+
+def match_template(image: "np.ndarray", template: "np.ndarray") -> "np.ndarray":
+    """
+    全部有效位置的归一化互相关系数，结果形状为 (H - h + 1, W - w + 1)
+
+    互相关用 FFT 计算，窗口均值和方差用积分图计算；内容单一（方差为0）的窗口记为0。
+    """
+    h, w = template.shape
+    H, W = image.shape
+    centered = template - template.mean()
+    template_norm = float(np.sqrt((centered ** 2).sum()))
+    if template_norm == 0:
+        return np.zeros((H - h + 1, W - w + 1))
+    shape = (_fast_length(H + h - 1), _fast_length(W + w - 1))
+    spectrum = np.fft.rfft2(image, shape) * np.fft.rfft2(centered[::-1, ::-1], shape)
+    corr = np.fft.irfft2(spectrum, shape)[h - 1:H, w - 1:W]
+    n = h * w
+    sums = _window_sums(image, h, w)
+    variance = _window_sums(image * image, h, w) - sums * sums / n
+    denom = np.sqrt(np.maximum(variance, 0)) * template_norm
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(denom > 1e-6, corr / denom, 0.0)
+    return scores
+
+
+def _refine(image: "np.ndarray", template: "np.ndarray", x: int, y: int, radius: int) -> Tuple[int, int, float]:
+    """在 (x, y) 周围 radius 像素内逐位置计算 NCC，返回最佳位置和系数"""
+    h, w = template.shape
+    x0, y0 = max(0, x - radius), max(0, y - radius)
+    x1 = min(image.shape[1] - w, x + radius)
+    y1 = min(image.shape[0] - h, y + radius)
+    if x1 < x0 or y1 < y0:
+        return x, y, 0.0
+    # 候选位置很少，直接对这几个窗口做点积比 FFT 快
+    sub = image[y0:y1 + h, x0:x1 + w]
+    centered = template - template.mean()
+    template_norm = float(np.sqrt((centered ** 2).sum()))
+    windows = np.lib.stride_tricks.sliding_window_view(sub, (h, w))
+    corr = np.einsum("ijkl,kl->ij", windows, centered)
+    sums = _window_sums(sub, h, w)
+    variance = _window_sums(sub * sub, h, w) - sums * sums / (h * w)
+    denom = np.sqrt(np.maximum(variance, 0)) * template_norm
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scores = np.where(denom > 1e-6, corr / denom, 0.0)
+    iy, ix = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return x0 + int(ix), y0 + int(iy), float(scores[iy, ix])
+
+
+def _peaks(scores: "np.ndarray", template_shape: Tuple[int, int], count: int) -> list:
+    """相关系数最高的几个位置，相邻半个参考图范围内只取一个"""
+    scores = scores.copy()
+    ry, rx = max(1, template_shape[0] // 2), max(1, template_shape[1] // 2)
+    peaks = []
+    for _ in range(count):
+        iy, ix = np.unravel_index(int(np.argmax(scores)), scores.shape)
+        if scores[iy, ix] <= 0:
+            break
+        peaks.append((int(ix), int(iy)))
+        scores[max(0, iy - ry):iy + ry + 1, max(0, ix - rx):ix + rx + 1] = -1
+    return peaks or [(0, 0)]
+
+
+def locate_in(image: "np.ndarray", template: "np.ndarray") -> Tuple[int, int, float]:
+    """由粗到细在 image 中查找 template，返回左上角位置和相关系数"""
+    levels = pyramid_levels(template)
+    images = build_pyramid(image, levels)
+    templates = build_pyramid(template, levels)
+    coarse = match_template(images[-1], templates[-1])
+    if coarse.size == 0:
+        return 0, 0, 0.0
+    best = (0, 0, 0.0)
+    for cx, cy in _peaks(coarse, templates[-1].shape, COARSE_CANDIDATES):
+        x, y, score = cx, cy, float(coarse[cy, cx])
+        for level in range(levels - 1, -1, -1):
+            x, y, score = _refine(images[level], templates[level], x * 2, y * 2, REFINE_RADIUS)
+        if score > best[2]:
+            best = (x, y, score)
+        if score >= EXACT_SCORE:
+            break
+    return best
+
+
+def _to_gray(image: "PIL.Image.Image") -> "np.ndarray":
+    return np.asarray(image.convert("L"), dtype=np.float32)
+
+
+class AnchorTracker:
+    """
+    锚点跟踪器
+
+    搜索范围以上一次找到的位置为中心，窗口逐次漂移也能持续跟上；在该范围内找不到时
+    再回到定位时的原位置附近搜索一次。
+    """
+
+    def __init__(
+        self,
+        template: "PIL.Image.Image",
+        origin: Tuple[int, int],
+        search_margin: int = 200,
+        min_score: float = 0.8,
+    ) -> None:
+        self.template = _to_gray(template)
+        self.origin = origin
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.last = AnchorMatch(found=True)
+
+    @classmethod
+    def from_config(cls, anchor, base_dir: Path) -> Optional["AnchorTracker"]:
+        """由 config_manager.LayoutAnchor 构建，参考图缺失或依赖不可用时返回 None"""
+        if not ANCHOR_AVAILABLE or anchor is None:
+            return None
+        path = Path(anchor.image_file)
+        if not path.is_absolute():
+            path = base_dir / path
+        try:
+            with PIL.Image.open(path) as image:
+                template = image.copy()
+        except Exception as e:
+            print(f"读取锚点参考图失败: {e}")
+            return None
+        return cls(template, (anchor.rect.x, anchor.rect.y), anchor.search_margin, anchor.min_score)
+
+    def _search(self, dx: int, dy: int) -> AnchorMatch:
+        h, w = self.template.shape
+        left = max(0, self.origin[0] + dx - self.search_margin)
+        top = max(0, self.origin[1] + dy - self.search_margin)
+        right = self.origin[0] + dx + w + self.search_margin
+        bottom = self.origin[1] + dy + h + self.search_margin
+        frame = _to_gray(grab_screen((left, top, right, bottom)))
+        if frame.shape[0] < h or frame.shape[1] < w:
+            return AnchorMatch()
+        x, y, score = locate_in(frame, self.template)
+        return AnchorMatch(
+            dx=left + x - self.origin[0],
+            dy=top + y - self.origin[1],
+            score=score,
+            found=score >= self.min_score,
+        )
+
+    def locate(self) -> AnchorMatch:
+        """在有限范围内截屏并查找锚点"""
+        start = time.perf_counter()
+        match = self._search(self.last.dx, self.last.dy)
+        if not match.found and (self.last.dx, self.last.dy) != (0, 0):
+            match = self._search(0, 0)
+        match.elapsed_ms = (time.perf_counter() - start) * 1000
+        if match.found:
+            self.last = match
+        return match
+
+
+def anchor_contrast(image: "PIL.Image.Image") -> float:
+    """参考图的灰度标准差，过低说明内容单一，不适合作为锚点"""
+    return float(_to_gray(image).std())
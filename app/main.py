@@ -1,19 +1,20 @@
 from __future__ import annotations
 
 import asyncio
+import collections
 import concurrent.futures
-import datetime as dt
-import json
 import os
+import re
 import sys
 import threading
+import time
 import tkinter as tk
 import uuid
 import logging
 import platform
 from pathlib import Path
 from tkinter import messagebox, simpledialog, ttk
-from typing import Dict, List, Optional
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 # 配置基本日志
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,14 +24,18 @@ logger.debug(f"Python版本: {platform.python_version()}")
 logger.debug(f"操作系统: {platform.system()} {platform.release()}")
 logger.debug(f"当前工作目录: {os.getcwd()}")
 
-import requests
 from bleak.backends.device import BLEDevice
 
 try:
     logger.debug("尝试导入BleManager等模块...")
     from app.ble.ble_manager import BleManager  # type: ignore
-    from app.config_manager import AppConfig, ConfigManager, OCRField, Rect, ServiceVersionConfig
+    from app.config_manager import AppConfig, ConfigManager, LayoutAnchor, OCRField, Rect, ServiceVersionConfig
     from app.hid_listener_simple import SimpleHidListener as HidListener  # type: ignore
+    from app.roster import RosterStore
+    from app.swipe_intake import SwipeIntake
+    from app.swipe_pipeline import SwipePipeline, human_now, locate_layout_shift, parse_card_input
+    from app.swipe_workflow import SwipeWorkflow
+    from app.tracing import TRACE_FILE, TRACER, stamp_arrival
     
     from app.system_devices import ConnectedDevice  # type: ignore
     logger.debug("成功导入所有模块")
@@ -39,8 +44,13 @@ except Exception as e:
     try:
         logger.debug("尝试相对导入...")
         from .ble.ble_manager import BleManager  # type: ignore
-        from .config_manager import AppConfig, ConfigManager, OCRField, Rect, ServiceVersionConfig  # type: ignore
+        from .config_manager import AppConfig, ConfigManager, LayoutAnchor, OCRField, Rect, ServiceVersionConfig  # type: ignore
         from .hid_listener_simple import SimpleHidListener as HidListener  # type: ignore
+        from .roster import RosterStore  # type: ignore
+        from .swipe_intake import SwipeIntake  # type: ignore
+        from .swipe_pipeline import SwipePipeline, human_now, locate_layout_shift, parse_card_input  # type: ignore
+        from .swipe_workflow import SwipeWorkflow  # type: ignore
+        from .tracing import TRACE_FILE, TRACER, stamp_arrival  # type: ignore
         
         from .system_devices import ConnectedDevice  # type: ignore
         logger.debug("成功相对导入所有模块")
@@ -49,8 +59,8 @@ except Exception as e:
         raise
 
 
-def _human_now() -> str:
-    return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+# OCR常驻内存显示的刷新间隔（毫秒）
+OCR_MEMORY_REFRESH_MS = 5000
 
 
 def _startup_command() -> str:
@@ -91,16 +101,33 @@ class FieldDialog(simpledialog.Dialog):
         ttk.Label(master, text="参数名").grid(row=1, column=0, sticky="e", padx=4, pady=4)
         ttk.Label(master, text="默认值").grid(row=2, column=0, sticky="e", padx=4, pady=4)
         ttk.Label(master, text="识别示例").grid(row=3, column=0, sticky="e", padx=4, pady=4)
+        ttk.Label(master, text="预处理").grid(row=4, column=0, sticky="e", padx=4, pady=4)
+        ttk.Label(master, text="校验规则").grid(row=5, column=0, sticky="e", padx=4, pady=4)
+        ttk.Label(master, text="名单匹配").grid(row=6, column=0, sticky="e", padx=4, pady=4)
 
         self.name_var = tk.StringVar(value=self._field.name if self._field else "")
         self.param_var = tk.StringVar(value=self._field.param_name if self._field else "")
         self.default_var = tk.StringVar(value=self._field.default_value if self._field else "")
         self.sample_var = tk.StringVar(value=self._field.sample_value if self._field else "")
+        self.profile_var = tk.StringVar(value=self._field.preprocess_profile if self._field else "")
+        self.validator_var = tk.StringVar(value=self._field.validator if self._field else "")
+        self.roster_var = tk.BooleanVar(value=self._field.use_roster if self._field else False)
 
         ttk.Entry(master, textvariable=self.name_var).grid(row=0, column=1, pady=4, sticky="ew")
         ttk.Entry(master, textvariable=self.param_var).grid(row=1, column=1, pady=4, sticky="ew")
         ttk.Entry(master, textvariable=self.default_var).grid(row=2, column=1, pady=4, sticky="ew")
         ttk.Entry(master, textvariable=self.sample_var).grid(row=3, column=1, pady=4, sticky="ew")
+        # 可选预设名称，也可直接输入完整方案，如 grayscale;stretch;binarize=otsu;height;pad=8
+        from app.ocr_preprocess import PRESET_LABELS
+
+        ttk.Combobox(master, textvariable=self.profile_var, values=[name for name in PRESET_LABELS if name]).grid(
+            row=4, column=1, pady=4, sticky="ew"
+        )
+        # 正则表达式，识别结果（去掉空白后）中能搜索到才算通过，否则按置信度判断
+        ttk.Entry(master, textvariable=self.validator_var).grid(row=5, column=1, pady=4, sticky="ew")
+        ttk.Checkbutton(master, text="识别结果吸附到名单中最接近的值", variable=self.roster_var).grid(
+            row=6, column=1, pady=4, sticky="w"
+        )
 
         master.columnconfigure(1, weight=1)
         return master
@@ -112,6 +139,18 @@ class FieldDialog(simpledialog.Dialog):
         if not self.param_var.get().strip():
             messagebox.showerror("提示", "参数名不能为空")
             return False
+        from app.ocr_preprocess import parse_profile
+
+        try:
+            parse_profile(self.profile_var.get().strip())
+        except ValueError as e:
+            messagebox.showerror("提示", f"预处理方案无效：{e}")
+            return False
+        try:
+            re.compile(self.validator_var.get().strip())
+        except re.error as e:
+            messagebox.showerror("提示", f"校验规则无效：{e}")
+            return False
         return True
 
     def apply(self) -> None:
@@ -120,6 +159,9 @@ class FieldDialog(simpledialog.Dialog):
             "param_name": self.param_var.get().strip(),
             "default_value": self.default_var.get().strip(),
             "sample_value": self.sample_var.get().strip(),
+            "preprocess_profile": self.profile_var.get().strip(),
+            "validator": self.validator_var.get().strip(),
+            "use_roster": self.roster_var.get(),
         }
 
 
@@ -227,7 +269,7 @@ class FloatInputWindow(tk.Toplevel):
 
 
 class App:
-    def __init__(self, root: tk.Tk) -> None:
+    def __init__(self, root: tk.Tk, record_path: Optional[Path] = None) -> None:
         self.root = root
         self.root.title("BLE 蓝牙工具 (Windows)")
         self.root.geometry("1024x680")
@@ -237,15 +279,48 @@ class App:
         self.config_path = Path(__file__).resolve().parent.parent / "app_settings.json"
         self.config_manager = ConfigManager(self.config_path)
         self.config = self.config_manager.load()
+        # 医生/护士/诊疗间等字段的名单，识别结果吸附到最近的名单项
+        self.rosters = RosterStore(self.config_path.parent / "rosters.json")
+        self.rosters.load()
+        self.rosters.seed(self.config.ocr_fields)
+        if self.config.backend.trace_swipes:
+            TRACER.configure(self.config_path.parent / "logs" / TRACE_FILE)
+        # 刷卡流程 run_id -> 提交成功后学习的 {param_name: 值}
+        self._roster_candidates: Dict[int, Dict[str, str]] = {}
+        # 版面锚点：字段区域按锚点相对定位时位置的位移平移
+        self._layout_tracker = None
+        self._layout_shift: Tuple[int, int] = (0, 0)
+        # 验证、识别、提交中与界面无关的部分，与无界面服务共用
+        self.pipeline = SwipePipeline(self.config, self.rosters, self.append_log, layout_shift=self._update_layout_shift)
 
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        # 刷卡流程状态机：验证、识别、提交在线程池中执行，状态变化派发回界面线程
+        self.swipe_workflow = SwipeWorkflow(
+            self.executor,
+            dispatch=lambda fn: self.root.after(0, fn),
+            on_state=self._on_swipe_state,
+            log=self.append_log,
+        )
+        self._confirm_run = None  # 绑定对话框对应的刷卡流程
+        # 识别完成、等待前一个绑定对话框关闭的 (流程, payload)
+        self._confirm_waiting: Deque[Tuple[object, Dict]] = collections.deque()
+        # 刷卡入口：跨来源去重，流水线模式下排队
+        backend_cfg = self.config.backend
+        self.swipe_intake = SwipeIntake(
+            start=self._start_workflow,
+            dedupe_seconds=backend_cfg.swipe_dedupe_seconds,
+            pipeline=backend_cfg.swipe_pipeline,
+            max_active=backend_cfg.swipe_max_active,
+            log=self.append_log,
+        )
 
         self.manager = BleManager()
         self.manager.set_callbacks(
             on_log=self.append_log,
             on_devices_updated=self.on_devices_updated,
             on_device_event=self.on_device_event,
-            on_card_data=self.on_card_data,
+            # BLE通知在事件循环线程中到达，卡号交给界面线程处理
+            on_card_data=lambda data: self.root.after(0, self.on_card_data, stamp_arrival(data)),
         )
 
         self.loop = asyncio.new_event_loop()
@@ -259,6 +334,12 @@ class App:
         self.binding_dialog: Optional[BindingDialog] = None
         self.float_window: Optional[FloatInputWindow] = None
         self.hid_listener: Optional[HidListener] = None
+        self.ocr_lifecycle = None
+        self.metrics_server = None
+        self.recorder = None
+        self.screen_watcher = None
+        self._ocr_calibrating = False  # 启动校准期间不加载默认引擎
+        self._ocr_ready_callbacks: List[Callable[[], None]] = []  # 等待引擎就绪后在UI线程执行的回调
 
         self.hid_accepting: bool = True
         self.bound_hid_device: Optional[str] = None
@@ -266,6 +347,7 @@ class App:
 
         self.status_var = tk.StringVar(value="未连接")
         self.card_var = tk.StringVar(value="未检测到刷卡")
+        self.swipe_state_var = tk.StringVar(value="")
 
         self._build_layout()
         self._refresh_ocr_tree()
@@ -276,6 +358,9 @@ class App:
         
         # 应用程序初始化完成后自动启动HID监听器
         self._restart_hid_listener()
+        self._restart_screen_watcher()
+        self._start_metrics_server()
+        self._start_recording(record_path)
 
     def _run_loop(self) -> None:
         asyncio.set_event_loop(self.loop)
@@ -332,7 +417,8 @@ class App:
         self.disconnect_button.pack(side="left", padx=6)
 
         ttk.Label(self.tab_ble, textvariable=self.status_var, foreground="#1d8348").pack(anchor="w", pady=(8, 4))
-        ttk.Label(self.tab_ble, textvariable=self.card_var, foreground="#2874a6").pack(anchor="w", pady=(0, 8))
+        ttk.Label(self.tab_ble, textvariable=self.card_var, foreground="#2874a6").pack(anchor="w", pady=(0, 2))
+        ttk.Label(self.tab_ble, textvariable=self.swipe_state_var, foreground="#7b7d7d").pack(anchor="w", pady=(0, 8))
 
         list_frame = ttk.Frame(self.tab_ble)
         list_frame.pack(fill="both", expand=True)
@@ -371,8 +457,20 @@ class App:
         ttk.Button(btn_frame, text="编辑", command=self.edit_field).pack(side="left", padx=4)
         ttk.Button(btn_frame, text="启用/禁用", command=self.toggle_field).pack(side="left", padx=4)
         ttk.Button(btn_frame, text="定位", command=self.set_field_rect).pack(side="left", padx=4)
-        ttk.Button(btn_frame, text="识别", command=self.recognize_field).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="识别", command=lambda: self._run_when_ocr_ready(self.recognize_field)).pack(side="left", padx=4)
         ttk.Button(btn_frame, text="删除", command=self.delete_field).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="导入名单", command=self.import_field_roster).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="设置锚点", command=self.set_layout_anchor).pack(side="left", padx=4)
+        ttk.Button(btn_frame, text="清除锚点", command=self.clear_layout_anchor).pack(side="left", padx=4)
+        self.ocr_watch_var = tk.BooleanVar(value=self.config.ocr.enable_screen_watcher)
+        ttk.Checkbutton(btn_frame, text="屏幕变化时后台预识别", variable=self.ocr_watch_var,
+                        command=self._on_ocr_watch_change).pack(side="right", padx=4)
+        self.ocr_server_var = tk.BooleanVar(value=self.config.ocr.use_ocr_server)
+        ttk.Checkbutton(btn_frame, text="独立进程运行OCR", variable=self.ocr_server_var,
+                        command=self._on_ocr_server_change).pack(side="right", padx=4)
+        self.ocr_form_var = tk.BooleanVar(value=self.config.ocr.form_recognition)
+        ttk.Checkbutton(btn_frame, text="整页识别", variable=self.ocr_form_var,
+                        command=self._on_ocr_form_change).pack(side="right", padx=4)
 
         tips = (
             "tips: 无法通过OCR识别获取的字段，可自定义默认值；多选项字段以 ';' 分隔，"
@@ -381,11 +479,20 @@ class App:
         ttk.Label(self.tab_ocr, text=tips, wraplength=900, foreground="#7b7d7d").pack(anchor="w", pady=(4, 0))
         
         # OCR引擎状态显示
-        self.ocr_status_label = ttk.Label(self.tab_ocr, text="正在检测OCR引擎...", foreground="#007acc")
-        self.ocr_status_label.pack(anchor="w", pady=(4, 0))
+        status_frame = ttk.Frame(self.tab_ocr)
+        status_frame.pack(fill="x", pady=(4, 0))
+        self.ocr_status_label = ttk.Label(status_frame, text="正在检测OCR引擎...", foreground="#007acc")
+        self.ocr_status_label.pack(side="left", anchor="n")
+        ttk.Button(status_frame, text="引擎校准", command=self._start_ocr_calibration).pack(side="left", padx=8, anchor="n")
+        self.ocr_calibration_label = ttk.Label(
+            status_frame, text=self.config.ocr.calibration_summary, foreground="#7b7d7d", justify="left"
+        )
+        self.ocr_calibration_label.pack(side="left", anchor="n")
+        self.ocr_memory_label = ttk.Label(status_frame, text="", foreground="#7b7d7d")
+        self.ocr_memory_label.pack(side="right", anchor="n")
         
-        # 延迟显示OCR引擎状态，避免初始化时阻塞
-        self.root.after(1000, self._update_ocr_status)
+        # OCR引擎在后台线程加载和预热，状态变化时刷新显示，避免初始化时阻塞
+        self._start_ocr_warmup()
         
         # 右侧预览区域 - 放大尺寸以更好显示截图和按钮
         preview_frame = ttk.LabelFrame(self.tab_ocr, text="截图预览", width=280, height=450)
@@ -430,7 +537,7 @@ class App:
                 ttk.Label(block, text="调试URL:").grid(row=0, column=1, sticky="w", padx=6, pady=2)
                 ttk.Entry(block, textvariable=debug_var, width=50).grid(row=0, column=2, sticky="ew", padx=6, pady=2)
                 ttk.Button(block, text="保存", command=lambda v=version, var=debug_var: self._update_service_url(v, "debug", var)).grid(row=0, column=3, sticky="e", padx=2, pady=2)
-                ttk.Button(block, text="调试", command=self._debug_v0_system).grid(row=0, column=4, sticky="e", padx=6, pady=2)
+                ttk.Button(block, text="调试", command=lambda: self._run_when_ocr_ready(self._debug_v0_system)).grid(row=0, column=4, sticky="e", padx=6, pady=2)
                 block.columnconfigure(2, weight=1)
             else:
                 ttk.Label(block, text="洗消验证接口:").grid(row=0, column=1, sticky="w", padx=6, pady=2)
@@ -454,6 +561,9 @@ class App:
         self.popup_failure_var = tk.BooleanVar(value=self.config.service.popup_failure)
         ttk.Checkbutton(verify_frame, text="弹窗显示洗消失败结果", variable=self.popup_failure_var,
                         command=self._save_service_config).grid(row=1, column=1, sticky="w", padx=20)
+        self.speculative_ocr_var = tk.BooleanVar(value=self.config.service.speculative_ocr)
+        ttk.Checkbutton(verify_frame, text="V2：验证的同时预先识别字段", variable=self.speculative_ocr_var,
+                        command=self._save_service_config).grid(row=2, column=0, sticky="w", padx=6, pady=(2, 6))
 
         note = (
             "本工具需兼容新/老系统。刷卡后若启用验证，将调用选定版本的洗消验证接口，再依据结果决定是否提交绑定接口；"
@@ -491,6 +601,9 @@ class App:
         self.service_var = tk.BooleanVar(value=self.config.backend.enable_service)
         ttk.Checkbutton(option_frame, text="开启服务（自动串联扫描/验证/绑定）", variable=self.service_var,
                         command=self._on_backend_change).grid(row=2, column=0, sticky="w", padx=6, pady=4)
+        self.swipe_pipeline_var = tk.BooleanVar(value=self.config.backend.swipe_pipeline)
+        ttk.Checkbutton(option_frame, text="流水线式刷卡（新卡排队，不打断正在确认的卡）", variable=self.swipe_pipeline_var,
+                        command=self._on_backend_change).grid(row=3, column=0, sticky="w", padx=6, pady=4)
 
         hid_frame = ttk.LabelFrame(self.tab_backend, text="HID 监听配置（键盘模式刷卡器）")
         hid_frame.pack(fill="x", pady=6)
@@ -536,12 +649,275 @@ class App:
                 ),
             )
 
+    def _start_ocr_warmup(self) -> None:
+        """在后台加载并预热OCR引擎"""
+        try:
+            from app.ocr_engine import (
+                OCR_CACHE_FILE, add_ocr_state_listener, configure_ocr_cache, configure_ocr_memory_budget,
+                configure_ocr_pool, configure_ocr_server, start_ocr_warmup,
+            )
+            
+            ocr_cfg = self.config.ocr
+            # 识别结果缓存的磁盘层（可选）与配置文件放在同一目录，重启后依然有效
+            configure_ocr_cache(disk_path=self.config_path.parent / OCR_CACHE_FILE if ocr_cfg.disk_cache else None)
+            self._configure_screen_capture()
+            configure_ocr_pool(ocr_cfg.engine_pool_size)
+            configure_ocr_memory_budget(ocr_cfg.memory_budget_mb)
+            configure_ocr_server(
+                ocr_cfg.use_ocr_server,
+                port=ocr_cfg.ocr_server_port,
+                workdir=self.config_path.parent,
+                call_timeout=ocr_cfg.ocr_server_timeout_ms / 1000.0,
+                preferred_engine=ocr_cfg.preferred_engine or None,
+                pool_size=ocr_cfg.engine_pool_size,
+                memory_budget_mb=ocr_cfg.memory_budget_mb,
+                disk_cache=ocr_cfg.disk_cache,
+            )
+            add_ocr_state_listener(lambda _state: self.root.after(0, self._on_ocr_state_changed))
+            self._start_ocr_lifecycle()
+            if ocr_cfg.auto_calibrate and not ocr_cfg.preferred_engine:
+                # 首次启动尚未选定引擎：先校准，再按校准结果加载
+                self._ocr_calibrating = True
+                self.executor.submit(self._calibrate_on_startup)
+            else:
+                start_ocr_warmup(ocr_cfg.preferred_engine or None)
+        except Exception as e:
+            self.ocr_status_label.config(text=f"OCR引擎检测失败: {e}", foreground="#dc3545")
+    
+    def _start_ocr_lifecycle(self) -> None:
+        """空闲卸载和内存预算：在后台检查，有刷卡活动时重新加载模型"""
+        from app.ocr_lifecycle import OCRLifecycle
+
+        ocr_cfg = self.config.ocr
+        self.ocr_lifecycle = OCRLifecycle(
+            idle_unload_minutes=ocr_cfg.idle_unload_minutes,
+            memory_budget_mb=ocr_cfg.memory_budget_mb,
+            preferred_engine=lambda: self.config.ocr.preferred_engine or None,
+            on_change=lambda: self.root.after(0, self._update_ocr_memory),
+            log=self.append_log,
+        )
+        self.ocr_lifecycle.start()
+        self.root.after(OCR_MEMORY_REFRESH_MS, self._refresh_ocr_memory)
+
+    def _refresh_ocr_memory(self) -> None:
+        """定期刷新常驻内存（检查本身在后台线程中进行，这里只读取一次内存占用）"""
+        if self.ocr_lifecycle is None:
+            return
+
+        def _worker():
+            from app.ocr_engine import ocr_resident_memory_mb
+
+            self.ocr_lifecycle.resident_mb = ocr_resident_memory_mb()
+            self.root.after(0, self._update_ocr_memory)
+
+        self.executor.submit(_worker)
+        self.root.after(OCR_MEMORY_REFRESH_MS, self._refresh_ocr_memory)
+
+    def _update_ocr_memory(self) -> None:
+        if self.ocr_lifecycle is None:
+            return
+        stats = self.ocr_lifecycle.stats()
+        resident = stats["resident_mb"]
+        parts = [f"常驻内存 {resident:.0f} MB" if resident is not None else "常驻内存 未知"]
+        if stats["budget_mb"]:
+            parts[0] += f" / 预算 {stats['budget_mb']} MB"
+        parts.append(f"加载 {stats['loads']} 次 · 卸载 {stats['unloads']} 次")
+        if stats["idle_s"] >= 60:
+            parts.append(f"空闲 {stats['idle_s'] / 60:.0f} 分钟")
+        self.ocr_memory_label.config(text=" · ".join(parts))
+
+    def _notify_ocr_activity(self, source: str) -> None:
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.notify_activity(source)
+
+    def _on_hid_key(self) -> None:
+        """在键盘钩子线程中调用，只做计数，不能阻塞"""
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.note_keystroke()
+
+    def _configure_swipe_intake(self) -> None:
+        backend_cfg = self.config.backend
+        self.swipe_intake.configure(
+            backend_cfg.swipe_dedupe_seconds, backend_cfg.swipe_pipeline, backend_cfg.swipe_max_active
+        )
+
+    def _start_metrics_server(self) -> None:
+        """配置了端口时在本机回环地址上提供 Prometheus /metrics"""
+        port = self.config.backend.metrics_port
+        if not port:
+            return
+        from app.metrics import MetricsServer
+
+        server = MetricsServer(port)
+        try:
+            server.start()
+        except OSError as e:
+            self.append_log(f"[指标] 端口 {port} 不可用，未启动指标端点: {e}")
+            return
+        self.metrics_server = server
+        self.append_log(f"[指标] 指标端点 http://127.0.0.1:{port}/metrics")
+
+    def _start_recording(self, path: Optional[Path]) -> None:
+        """--record 指定归档时录制刷卡会话，之后用 scripts/replay_session.py 离线回放"""
+        if path is None:
+            return
+        from app.session_record import SessionRecorder
+
+        recorder = SessionRecorder(path, self.config, self.config_path.parent, log=self.append_log)
+        try:
+            recorder.start()
+        except OSError as e:
+            self.append_log(f"[录制] 无法创建会话归档 {path}: {e}")
+            return
+        self.pipeline.http = recorder.transport(self.pipeline.http)
+        self.recorder = recorder
+
+    def _configure_screen_capture(self) -> None:
+        """按配置选择截屏后端，后端不可用时回退到自动选择"""
+        from app.screen_capture import configure_screen_capture
+        
+        ocr_cfg = self.config.ocr
+        try:
+            capture = configure_screen_capture(
+                ocr_cfg.capture_backend, ocr_cfg.capture_ttl_ms, ocr_cfg.capture_replay_path or None
+            )
+        except Exception as e:
+            self.append_log(f"[截屏] {ocr_cfg.capture_backend} 后端不可用，改为自动选择: {e}")
+            capture = configure_screen_capture("auto", ocr_cfg.capture_ttl_ms)
+        self.append_log(f"[截屏] 使用 {capture.backend} 后端，帧缓存 {capture.ttl_ms:.0f}ms")
+    
+    def _calibration_samples(self):
+        from app.ocr_calibration import collect_samples
+
+        screenshots_dir = Path(__file__).resolve().parent.parent / "screenshots"
+        return collect_samples(self.config.ocr_fields, screenshots_dir)
+
+    def _calibrate(self):
+        """在后台线程中执行引擎校准，返回校准报告"""
+        from app.ocr_calibration import run_calibration
+
+        return run_calibration(
+            self._calibration_samples(),
+            accuracy_floor=self.config.ocr.calibration_accuracy_floor,
+            progress=lambda msg: self.root.after(0, self.append_log, msg),
+        )
+
+    def _calibrate_on_startup(self) -> None:
+        from app.ocr_engine import OCR_ENGINES, discover_engines, start_ocr_warmup
+
+        report = None
+        try:
+            discover_engines()
+            available = sum(1 for info in OCR_ENGINES.values() if info["available"])
+            # 只有一个可选引擎或没有参考样本时无需校准
+            if available > 1 and self._calibration_samples():
+                self.root.after(0, lambda: self.ocr_calibration_label.config(text="正在校准OCR引擎..."))
+                report = self._calibrate()
+        except Exception as e:
+            self.root.after(0, self.append_log, f"[校准] 启动校准失败: {e}")
+        finally:
+            self._ocr_calibrating = False
+        start_ocr_warmup(report.chosen if report and report.chosen else None)
+        if report is not None:
+            self.root.after(0, self._apply_calibration_report, report, False)
+
+    def _start_ocr_calibration(self) -> None:
+        """引擎校准按钮：后台测量各引擎，选出后立即切换"""
+        samples = self._calibration_samples()
+        if not samples:
+            messagebox.showinfo("引擎校准", "没有可用的参考样本：请先定位字段并确认识别示例")
+            return
+        self.ocr_calibration_label.config(text="正在校准OCR引擎...")
+        self.append_log(f"[校准] 开始引擎校准，参考样本 {len(samples)} 个")
+
+        def _worker():
+            try:
+                report = self._calibrate()
+            except Exception as e:
+                self.root.after(0, self.append_log, f"[校准] 校准失败: {e}")
+                self.root.after(0, lambda: self.ocr_calibration_label.config(text=self.config.ocr.calibration_summary))
+                return
+            self.root.after(0, self._apply_calibration_report, report, True)
+
+        self.executor.submit(_worker)
+
+    def _apply_calibration_report(self, report, reload_engine: bool) -> None:
+        """显示并保存校准结果（UI线程）"""
+        summary = report.summary()
+        self.ocr_calibration_label.config(text=summary)
+        for line in summary.splitlines():
+            self.append_log(f"[校准] {line}")
+        self.config.ocr.calibration_summary = summary
+        if report.chosen:
+            self.config.ocr.preferred_engine = report.chosen
+        self._save_config()
+
+        if reload_engine and report.chosen:
+            # 重新加载要等待引擎锁，独立进程模式下还要等旧工作进程退出，不能在UI线程进行
+            self.executor.submit(self._switch_ocr_engine, report.chosen)
+
+    def _switch_ocr_engine(self, chosen: str) -> None:
+        """校准选出的引擎与当前引擎不同时在后台重新加载（后台线程）"""
+        from app.ocr_engine import get_ocr_engine, get_ocr_state, reload_ocr_engine, STATE_READY
+
+        current = get_ocr_engine().engine_name if get_ocr_state() == STATE_READY else None
+        if current == chosen:
+            return
+        self.append_log(f"[校准] 切换OCR引擎: {current} -> {chosen}")
+        try:
+            reload_ocr_engine(chosen)
+        except Exception as e:
+            self.append_log(f"[校准] 切换OCR引擎失败: {e}")
+
+    def _run_when_ocr_ready(self, callback) -> None:
+        """OCR引擎就绪后在UI线程执行回调；预热期间到达的请求登记后由状态回调执行，不占用后台线程"""
+        from app.ocr_engine import STATE_FAILED, STATE_LABELS, STATE_READY, get_ocr_state, start_ocr_warmup
+        
+        state = get_ocr_state()
+        if state in (STATE_READY, STATE_FAILED):
+            callback()
+            return
+        
+        self.append_log(f"[OCR] 引擎{STATE_LABELS.get(state, state)}，就绪后继续识别...")
+        self._ocr_ready_callbacks.append(callback)
+        if not self._ocr_calibrating:
+            start_ocr_warmup(self.config.ocr.preferred_engine or None)
+    
+    def _on_ocr_state_changed(self) -> None:
+        """OCR引擎状态变化（UI线程）：更新状态显示，加载结束后执行等待中的回调"""
+        from app.ocr_engine import STATE_FAILED, STATE_READY, get_ocr_state
+        
+        self._update_ocr_status()
+        # 按当前状态判断：回调派发到UI线程期间状态可能又变化了
+        if get_ocr_state() not in (STATE_READY, STATE_FAILED):
+            return
+        callbacks, self._ocr_ready_callbacks = self._ocr_ready_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                self.append_log(f"[OCR] 就绪后执行失败: {e}")
+    
     def _update_ocr_status(self) -> None:
         """更新OCR引擎状态显示"""
         try:
-            from app.ocr_engine import get_ocr_engine, get_available_engines
+            from app.ocr_engine import (
+                STATE_FAILED, STATE_LABELS, STATE_READY, STATE_UNLOADED, get_available_engines, get_ocr_engine,
+                get_ocr_error, get_ocr_state,
+            )
             
-            # 获取当前引擎信息
+            state = get_ocr_state()
+            if state == STATE_FAILED:
+                self.ocr_status_label.config(text=f"OCR引擎加载失败: {get_ocr_error()}", foreground="#dc3545")
+                return
+            if state == STATE_UNLOADED:
+                self.ocr_status_label.config(text="OCR引擎已卸载（空闲），刷卡时自动重新加载", foreground="#7b7d7d")
+                return
+            if state != STATE_READY:
+                self.ocr_status_label.config(text=f"OCR引擎{STATE_LABELS.get(state, state)}...", foreground="#007acc")
+                return
+            
+            # 获取当前引擎信息（已就绪，不会阻塞）
             engine = get_ocr_engine()
             engine_info = engine.get_engine_info()
             
@@ -735,6 +1111,9 @@ class App:
             param_name=dialog.result["param_name"],
             default_value=dialog.result["default_value"],
             sample_value=dialog.result["sample_value"],
+            preprocess_profile=dialog.result["preprocess_profile"],
+            validator=dialog.result["validator"],
+            use_roster=dialog.result["use_roster"],
         )
         self.config.ocr_fields.append(field)
         self._save_config()
@@ -751,6 +1130,12 @@ class App:
         field.param_name = dialog.result["param_name"]
         field.default_value = dialog.result["default_value"]
         field.sample_value = dialog.result["sample_value"]
+        field.preprocess_profile = dialog.result["preprocess_profile"]
+        field.validator = dialog.result["validator"]
+        field.use_roster = dialog.result["use_roster"]
+        # 人工填写的识别示例是确认过的值，加入名单
+        if field.use_roster and field.sample_value and self.rosters.learn(field.param_name, field.sample_value):
+            self.rosters.save()
         self._save_config()
         self._refresh_ocr_tree()
 
@@ -777,12 +1162,12 @@ class App:
                 x, y, w, h = area
                 from app.config_manager import Rect
                 
-                field.recognition_area = Rect(x=x, y=y, width=w, height=h)
+                field.recognition_area = self._anchored_rect(x, y, w, h)
                 self._save_config()
                 self.append_log(f"[OCR] 已设置 {field.name} 区域：({x},{y},{w},{h})")
                 
                 # 自动进行OCR识别并保存截图
-                self._auto_recognize_and_save(field, x, y, w, h)
+                self._run_when_ocr_ready(lambda: self._auto_recognize_and_save(field, x, y, w, h))
                 
                 # messagebox.showinfo("成功", f"识别区域已设置：{w}x{h} 位于 ({x},{y})")
             else:
@@ -795,42 +1180,13 @@ class App:
             messagebox.showerror("错误", f"屏幕截图选择器出错：{e}\n将使用手动输入方式")
             self._set_field_rect_manual(field)
     
-    def _recognize_with_retry(self, x: int, y: int, w: int, h: int, max_retries: int = 2) -> str:
-        """带重试机制的OCR识别"""
-        from app.ocr_engine import recognize_screen_area
-        import time
-        
-        for attempt in range(max_retries):
-            try:
-                # 第一次尝试直接识别
-                if attempt == 0:
-                    result = recognize_screen_area(x, y, w, h)
-                    if result.strip():
-                        return result
-                
-                # 第二次尝试稍微调整区域大小
-                elif attempt == 1:
-                    # 稍微扩大区域（增加5像素边距）
-                    adjusted_x = max(0, x - 5)
-                    adjusted_y = max(0, y - 5)
-                    adjusted_w = w + 10
-                    adjusted_h = h + 10
-                    
-                    result = recognize_screen_area(adjusted_x, adjusted_y, adjusted_w, adjusted_h)
-                    if result.strip():
-                        self.append_log(f"[OCR] 使用调整后的区域识别成功：({adjusted_x},{adjusted_y},{adjusted_w},{adjusted_h})")
-                        return result
-                
-                # 如果还有重试次数，等待一小段时间
-                if attempt < max_retries - 1:
-                    time.sleep(0.1)  # 短暂等待
-                    
-            except Exception as e:
-                self.append_log(f"[OCR] 识别尝试 {attempt + 1} 失败: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(0.1)
-        
-        return ""
+    def _recognize_fields(self, fields: List[OCRField]) -> Dict[str, str]:
+        """批量识别多个字段，返回 field_id -> 识别文字"""
+        return {field_id: result.text for field_id, result in self._recognize_fields_detailed(fields).items()}
+    
+    def _recognize_fields_detailed(self, fields, run=None):
+        """批量识别多个字段，返回 field_id -> 结构化识别结果（见 SwipePipeline.recognize_fields_detailed）"""
+        return self.pipeline.recognize_fields_detailed(fields, run)
     
     def _show_ocr_tooltip(self, message: str) -> None:
         """显示OCR相关的工具提示"""
@@ -887,14 +1243,14 @@ class App:
     def _auto_recognize_and_save(self, field, x: int, y: int, w: int, h: int) -> None:
         """自动进行OCR识别并保存截图"""
         try:
-            from app.ocr_engine import recognize_screen_area, save_area_screenshot
+            from app.ocr_engine import save_area_screenshot
             import os
             from datetime import datetime
             
             self.append_log(f"[OCR] 开始自动识别：{field.name}，区域：({x},{y},{w},{h})")
             
             # 进行OCR文字识别，带重试机制
-            recognized_text = self._recognize_with_retry(x, y, w, h, max_retries=2)
+            recognized_text = self._recognize_fields([field]).get(field.field_id, "")
             
             if recognized_text:
                 field.recognized_value = recognized_text
@@ -952,7 +1308,7 @@ class App:
             x, y, w, h = [int(part.strip()) for part in answer.split(",")]
             from app.config_manager import Rect
 
-            field.recognition_area = Rect(x=x, y=y, width=w, height=h)
+            field.recognition_area = self._anchored_rect(x, y, w, h)
             self._save_config()
             self.append_log(f"[OCR] 已设置 {field.name} 区域：({x},{y},{w},{h})")
             # 重新选中之前操作的字段，保持选中状态
@@ -973,8 +1329,6 @@ class App:
             
         # 如果有识图坐标，自动进行OCR识别
         try:
-            from app.ocr_engine import recognize_screen_area
-            
             x = field.recognition_area.x
             y = field.recognition_area.y
             w = field.recognition_area.width
@@ -983,19 +1337,10 @@ class App:
             self.append_log(f"[OCR] 开始识别字段：{field.name}，区域：({x},{y},{w},{h})")
             
             # 进行OCR文字识别，带重试机制
-            recognized_text = self._recognize_with_retry(x, y, w, h, max_retries=2)
+            recognized_text = self._recognize_fields([field]).get(field.field_id, "")
             
             if recognized_text:
-                # 特殊处理：年龄字段只保留数字
-                if field.name == "年龄":
-                    import re
-                    # 提取所有数字，去掉汉字如"岁"、"月"等
-                    numbers = re.findall(r'\d+', recognized_text)
-                    if numbers:
-                        cleaned_text = ''.join(numbers)
-                        self.append_log(f"[OCR] 年龄字段清理：'{recognized_text}' → '{cleaned_text}'")
-                        recognized_text = cleaned_text
-                
+                recognized_text = self.pipeline.clean_recognized_value(field, recognized_text)
                 field.recognized_value = recognized_text
                 # 识别结果应该显示在"识别示例"列
                 field.sample_value = recognized_text
@@ -1039,6 +1384,117 @@ class App:
         self._save_config()
         self._refresh_ocr_tree()
 
+    def import_field_roster(self) -> None:
+        field = self._get_selected_field()
+        if not field:
+            messagebox.showinfo("提示", "请先选择字段")
+            return
+        from tkinter import filedialog
+        
+        path = filedialog.askopenfilename(
+            title=f"导入 {field.name} 名单（每行一项）",
+            filetypes=[("文本/CSV", "*.txt *.csv"), ("所有文件", "*.*")],
+        )
+        if not path:
+            return
+        try:
+            added = self.rosters.import_file(field.param_name, Path(path))
+            self.rosters.save()
+        except Exception as e:
+            messagebox.showerror("错误", f"导入名单失败：{e}")
+            return
+        if not field.use_roster:
+            field.use_roster = True
+            self._save_config()
+        total = len(self.rosters.get(field.param_name))
+        self.append_log(f"[名单] {field.name} 导入 {added} 项，共 {total} 项")
+
+    # --- layout anchor
+    def _layout_anchor_tracker(self):
+        if self.config.anchor is None:
+            return None
+        if self._layout_tracker is None:
+            from app.layout_anchor import AnchorTracker
+            
+            self._layout_tracker = AnchorTracker.from_config(self.config.anchor, self.config_path.parent)
+        return self._layout_tracker
+
+    def _update_layout_shift(self) -> Tuple[int, int]:
+        """识别前在锚点原位置附近查找锚点，更新并返回字段区域的平移量；未设置锚点时为 (0, 0)"""
+        shift = locate_layout_shift(self._layout_anchor_tracker(), self._layout_shift, self.append_log)
+        self._apply_layout_shift(shift)
+        return shift
+
+    def _apply_layout_shift(self, shift: Tuple[int, int]) -> None:
+        """采用新的版面平移（界面线程），预识别的区域随之平移"""
+        if shift != self._layout_shift:
+            self._layout_shift = shift
+            if self.screen_watcher:
+                self.screen_watcher.set_regions(self._watch_regions())
+
+    def _shifted_rect(self, rect: Rect) -> Tuple[int, int, int, int]:
+        """字段区域加上当前版面平移后的屏幕坐标"""
+        dx, dy = self._layout_shift
+        return rect.x + dx, rect.y + dy, rect.width, rect.height
+
+    def _anchored_rect(self, x: int, y: int, w: int, h: int) -> Rect:
+        """把当前屏幕坐标换算为相对于锚点定位时位置的坐标保存"""
+        dx, dy = self._update_layout_shift()
+        return Rect(x=x - dx, y=y - dy, width=w, height=h)
+
+    def _bake_layout_shift(self, shift: Tuple[int, int]) -> None:
+        """更换或清除锚点前，把当前平移量写入各字段区域"""
+        dx, dy = shift
+        if (dx, dy) == (0, 0):
+            return
+        for f in self.config.ocr_fields:
+            if f.recognition_area:
+                f.recognition_area = Rect(
+                    x=f.recognition_area.x + dx,
+                    y=f.recognition_area.y + dy,
+                    width=f.recognition_area.width,
+                    height=f.recognition_area.height,
+                )
+
+    def set_layout_anchor(self) -> None:
+        from app.layout_anchor import ANCHOR_AVAILABLE, MIN_ANCHOR_CONTRAST, anchor_contrast
+        from app.screenshot_selector import ScreenshotSelector
+        
+        if not ANCHOR_AVAILABLE:
+            messagebox.showerror("错误", "版面锚点需要安装 numpy 和 pillow")
+            return
+        # 框选前先按旧锚点测出当前位移，换锚点后字段区域保持在屏幕上的实际位置
+        shift = self._update_layout_shift()
+        selection = ScreenshotSelector(self.root).select_patch()
+        if not selection:
+            return
+        (x, y, w, h), patch = selection
+        if anchor_contrast(patch) < MIN_ANCHOR_CONTRAST:
+            messagebox.showerror("提示", "所选区域内容过于单一，请选择带文字或图标、位置固定的区域作为锚点")
+            return
+        anchor_path = self.config_path.parent / "layout_anchor.png"
+        try:
+            patch.save(anchor_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"保存锚点参考图失败：{e}")
+            return
+        self._bake_layout_shift(shift)
+        self.config.anchor = LayoutAnchor(rect=Rect(x=x, y=y, width=w, height=h), image_file=anchor_path.name)
+        self._layout_tracker = None
+        self._layout_shift = (0, 0)
+        self._save_config()
+        self.append_log(f"[锚点] 已设置锚点：({x},{y},{w},{h})，识别前将按锚点位移平移字段区域")
+
+    def clear_layout_anchor(self) -> None:
+        if self.config.anchor is None:
+            return
+        self._bake_layout_shift(self._update_layout_shift())
+        self.config.anchor = None
+        self._layout_tracker = None
+        self._layout_shift = (0, 0)
+        self._save_config()
+        self.append_log("[锚点] 已清除锚点")
+
     # --- service config helper
     def _update_service_url(self, version: str, field_name: str, var: tk.StringVar) -> None:
         value = var.get().strip()
@@ -1062,6 +1518,7 @@ class App:
         self.config.service.enable_verification = self.verify_enabled_var.get()
         self.config.service.popup_success = self.popup_success_var.get()
         self.config.service.popup_failure = self.popup_failure_var.get()
+        self.config.service.speculative_ocr = self.speculative_ocr_var.get()
         self._save_config()
 
     def _refresh_service_form(self) -> None:
@@ -1069,6 +1526,7 @@ class App:
         self.verify_enabled_var.set(self.config.service.enable_verification)
         self.popup_success_var.set(self.config.service.popup_success)
         self.popup_failure_var.set(self.config.service.popup_failure)
+        self.speculative_ocr_var.set(self.config.service.speculative_ocr)
 
     # --- backend config helper
     def _refresh_backend_form(self) -> None:
@@ -1077,6 +1535,7 @@ class App:
         self.startup_var.set(self.config.backend.enable_startup)
         self.float_var.set(self.config.backend.enable_float_input)
         self.service_var.set(self.config.backend.enable_service)
+        self.swipe_pipeline_var.set(self.config.backend.swipe_pipeline)
         if hasattr(self, "hid_enabled_var"):
             self.hid_enabled_var.set(self.config.hid.enabled)
         if hasattr(self, "hid_keywords_var"):
@@ -1092,7 +1551,9 @@ class App:
         self.config.backend.enable_startup = self.startup_var.get()
         self.config.backend.enable_float_input = self.float_var.get()
         self.config.backend.enable_service = self.service_var.get()
+        self.config.backend.swipe_pipeline = self.swipe_pipeline_var.get()
         self._save_config()
+        self._configure_swipe_intake()
         set_startup(self.config.backend.enable_startup)
         if self.config.backend.enable_float_input:
             self._ensure_float_window(show=True)
@@ -1119,7 +1580,7 @@ class App:
     # --- BLE actions
     def append_log(self, line: str) -> None:
         def _append() -> None:
-            self.log_text.insert(tk.END, f"[{_human_now()}] {line}\n")
+            self.log_text.insert(tk.END, f"[{human_now()}] {line}\n")
             self.log_text.see(tk.END)
         self.root.after(0, _append)
 
@@ -1144,6 +1605,7 @@ class App:
             self.status_var.set(f"已连接：{device.name or '未知'} | {device.address}")
             self.root.after(0, lambda: self.disconnect_button.configure(state=tk.NORMAL))
             label = (device.name or device.address) if device else "BLE 设备"
+            self._notify_ocr_activity("设备连接")
             self._enable_hid_capture(label)
         elif event == "disconnected":
             self.status_var.set("已断开")
@@ -1200,6 +1662,7 @@ class App:
         status = "已连接" if device.is_connected else ("已配对" if device.is_paired else "未连接")
         self.status_var.set(f"已选择：{display_name}（{status}）")
         self.append_log(f"已选择设备：{display_name}，开始通过BLE接收数据。")
+        self._notify_ocr_activity("设备连接")
         self.root.after(0, lambda: self.disconnect_button.configure(state=tk.NORMAL))
 
     def on_disconnect(self) -> None:
@@ -1214,19 +1677,32 @@ class App:
         # 记录接收到的数据
         self.append_log(f"[调试] on_card_data接收到数据: {data}")
         
+        # 每个卡号事件一个关联ID，各环节的耗时记录到追踪文件
+        trace = TRACER.begin(data)
+        
+        # 同一次刷卡可能经 BLE、HID 和转交HID监听器多次到达，去重窗口内只处理一次
+        with trace.timed("dedupe", parent=trace.root):
+            accepted = self.swipe_intake.accept(data)
+        if self.recorder is not None:
+            self.recorder.card(data)
+        if not accepted:
+            TRACER.end(trace, "duplicate")
+            return
+        
         # 特别标记Bluetooth Keyboard设备的数据
         if "Bluetooth Keyboard" in data['source']:
             self.append_log(f"[调试] 处理Bluetooth Keyboard设备数据")
         
         self.latest_card = data
         self.append_log(f"[调试] 更新latest_card变量")
+        self._notify_ocr_activity("刷卡")
         
         # 更新UI显示
         self.card_var.set(f"监听到卡号：8H {data['hex']} / 10D {data['dec']} (来源 {data['source']})")
         self.append_log(f"[调试] 更新UI显示")
         
         # 记录标准日志
-        self.append_log(f"捕获卡号 8H={data['hex']} 10D={data['dec']} 来源={data['source']}")
+        self.append_log(f"捕获卡号 8H={data['hex']} 10D={data['dec']} 来源={data['source']} 关联ID={trace.trace_id}")
         
         # 避免循环调用：优化判断条件
         # 1. 检查数据来源，如果已经是BLE来源则不传递给HID监听器
@@ -1255,19 +1731,16 @@ class App:
             self.append_log(f"[调试] 服务版本: {self.config.service.selected_version}")
             if self.config.service.selected_version == "v0":
                 self.append_log("检测到V0.0版本，自动执行调试功能...")
-                self._debug_v0_system(auto_mode=True)
+                TRACER.end(trace, "v0_debug")
+                self._run_when_ocr_ready(lambda: self._debug_v0_system(auto_mode=True))
             else:
                 self.append_log(f"[调试] 启动工作流处理")
-                self._start_workflow(data)
-
-    def _collect_field_values(self) -> Dict[str, str]:
-        payload: Dict[str, str] = {}
-        for field in self.config.ocr_fields:
-            if not field.enabled:
-                continue
-            value = field.recognized_value or field.default_value
-            payload[field.param_name] = value
-        return payload
+                if not self.swipe_intake.submit(data) and self.swipe_workflow.current:
+                    # 排队时刷新队列深度显示
+                    current = self.swipe_workflow.current
+                    self._update_swipe_state(current, current.state)
+        else:
+            TRACER.end(trace, "service_disabled")
 
     def _debug_v0_system(self, auto_mode: bool = False) -> None:
         """V0.0 第三套系统调试接口 - 重新进行OCR识图
@@ -1296,7 +1769,7 @@ class App:
             
             # 获取OCR引擎
             try:
-                from app.ocr_engine import get_ocr_engine
+                from app.ocr_engine import get_ocr_engine, use_ocr_engine
                 ocr_engine = get_ocr_engine()
                 self.append_log(f"OCR引擎初始化成功: {type(ocr_engine).__name__}")
             except Exception as e:
@@ -1312,6 +1785,27 @@ class App:
             processed_fields = 0
             valid_params = 0
             
+            # 先对所有需要识图的字段一次截屏、一次批量推理
+            ocr_targets = [
+                f for f in self.config.ocr_fields
+                if f.enabled and f.name not in excluded_fields and f.recognition_area
+            ]
+            ocr_results: Dict[str, str] = {}
+            ocr_errors: Dict[str, str] = {}
+            if ocr_targets:
+                self.append_log(f"批量识别 {len(ocr_targets)} 个字段...")
+                try:
+                    self._update_layout_shift()
+                    with use_ocr_engine() as engine:
+                        texts = engine.recognize_regions(
+                            [self._shifted_rect(f.recognition_area) for f in ocr_targets],
+                            [f.preprocess_profile for f in ocr_targets],
+                        )
+                    for f, text in zip(ocr_targets, texts):
+                        ocr_results[f.field_id] = text
+                except Exception as e:
+                    ocr_errors = {f.field_id: str(e) for f in ocr_targets}
+            
             self.append_log(f"开始遍历OCR字段，总共 {len(self.config.ocr_fields)} 个字段")
             
             for field in self.config.ocr_fields:
@@ -1356,13 +1850,21 @@ class App:
                         
                         self.append_log(f"  正在识别字段 '{field.name}' 坐标: ({x}, {y}, {w}, {h})")
                         
-                        # 从屏幕指定区域识别文字
-                        recognized_text = ocr_engine.recognize_from_screen_area(x, y, w, h)
+                        # 取批量识别的结果
+                        if field.field_id in ocr_errors:
+                            raise RuntimeError(ocr_errors[field.field_id])
+                        recognized_text = ocr_results.get(field.field_id, "")
                         self.append_log(f"  原始识别结果: '{recognized_text}'")
                         
                         if recognized_text.strip():
                             value = recognized_text.strip()
                             
+                            if field.use_roster:
+                                match = self.rosters.get(field.param_name).match(value)
+                                if match:
+                                    self.append_log(f"  名单匹配: '{value}' → '{match.entry}'（距离 {match.distance}）")
+                                    value = match.entry
+                            
                             # 特殊处理：年龄字段只保留数字
                             if field.name == "年龄":
                                 import re
@@ -1436,7 +1938,17 @@ class App:
             if not auto_mode:
                 messagebox.showerror("错误", error_msg)
 
-    def _start_workflow(self, card: Dict[str, str]) -> None:
+    def _start_workflow(self, card: Dict[str, str], preempt: bool = True) -> None:
+        """按服务版本开始新的刷卡流程；preempt 时取消仍在进行的旧流程（由刷卡入口调用）"""
+        from app.ocr_engine import STATE_READY, get_ocr_state
+        from app.swipe_workflow import STATE_VERIFYING
+        
+        # 后台步骤只读取刷卡时的字段配置快照和锚点定位器
+        run = self.swipe_workflow.start(
+            card, self.config.ocr_fields, preempt=preempt,
+            anchor=self._layout_anchor_tracker(), layout_shift=self._layout_shift,
+        )
+        
         # V2版本特殊处理：先不执行OCR，直接将10D卡号拼接到URL后面发送GET请求
         if self.config.service.selected_version == "v2":
             self.append_log("[V2版本] 开始处理，先不执行OCR识别...")
@@ -1452,197 +1964,220 @@ class App:
                 payload = {
                     "card_hex": card.get("hex"),
                     "card_dec": card_dec,
-                    "timestamp": _human_now(),
+                    "timestamp": human_now(),
                     "fields": {},  # 先不包含OCR字段
                 }
                 
                 # V2版本使用GET请求
-                self._get_request(
-                    selected_version.verify_url,
-                    payload,
-                    on_success=lambda data: self._after_v2_verify(True, data, card),
-                    on_error=lambda err: self._after_v2_verify(False, err, card),
+                self.swipe_workflow.transition(run, STATE_VERIFYING)
+                speculation = None
+                # 启动校准期间引擎尚未选定、模型未加载完成时不提前识别，避免占用线程等待加载
+                if (
+                    self.config.service.speculative_ocr
+                    and not self._ocr_calibrating
+                    and get_ocr_state() == STATE_READY
+                ):
+                    # 验证请求期间同时识别字段，结果保留到验证返回后再决定使用或丢弃
+                    self.append_log("[V2版本] 验证的同时预先识别字段...")
+                    speculation = self.swipe_workflow.speculate(run, self._recognize_swipe, name="recognize")
+                self.swipe_workflow.run_step(
+                    run,
+                    lambda _run: self.pipeline.get_json(selected_version.verify_url, payload),
+                    on_done=lambda run, outcome: self._after_v2_verify(run, outcome, speculation),
+                    name="verify",
                 )
             else:
                 # 如果未启用验证，直接执行OCR
                 self.append_log("[V2版本] 未启用验证，直接执行OCR识别...")
-                self._perform_ocr_and_continue(card)
+                self._start_swipe_recognition(run)
         else:
             # 其他版本保持原有逻辑
-            field_values = self._collect_field_values()
-            missing = [f.name for f in self.config.ocr_fields if f.enabled and not (f.recognized_value or f.default_value)]
+            missing = self.pipeline.missing_fields()
             if missing:
                 messagebox.showwarning("字段缺失", f"以下字段缺失，已使用空值：{', '.join(missing)}")
-            payload = {
-                "card_hex": card.get("hex"),
-                "card_dec": card.get("dec"),
-                "timestamp": _human_now(),
-                "fields": field_values,
-            }
+            payload = self.pipeline.build_payload(card)
             if self.config.service.enable_verification:
                 self.append_log("开始调用洗消验证接口...")
                 selected_version = self.config.service.get_selected_version()
                 # 其他版本使用POST请求
-                self._post_request(
-                    selected_version.verify_url,
-                    payload,
-                    on_success=lambda data: self._after_verify(True, data, payload),
-                    on_error=lambda err: self._after_verify(False, err, payload),
+                self.swipe_workflow.transition(run, STATE_VERIFYING)
+                self.swipe_workflow.run_step(
+                    run,
+                    lambda _run: self.pipeline.post_json(selected_version.verify_url, payload),
+                    on_done=lambda run, outcome: self._after_verify(run, outcome, payload),
+                    name="verify",
                 )
             else:
-                self._open_binding_dialog(payload)
+                self._open_binding_dialog(run, payload)
 
-    def _after_v2_verify(self, ok: bool, response: Dict, card: Dict[str, str]) -> None:
-        """V2版本验证后的处理"""
-        # 记录完整响应内容以便调试
-        self.append_log(f"[V2版本] 洗消验证响应内容: {response}")
+    def _after_v2_verify(self, run, outcome: Tuple[bool, Dict], speculation=None) -> None:
+        """V2版本验证后的处理；speculation 为验证期间预先开始的识别"""
+        from app.swipe_workflow import STATE_RECOGNIZING
         
-        if ok:
-            # 确保response是字典类型
-            if isinstance(response, dict):
-                # 获取状态码
-                code = response.get("code")
-                self.append_log(f"[V2版本] 洗消验证接口返回状态码: {code}")
-                
-                if code == 200:
-                    self.append_log(f"[V2版本] 洗消验证接口返回成功 (code=200)")
-                    
-                    # 检查返回内容的 "data.status.first" 是否等于 "可用"
-                    data = response.get("data", {})
-                    if data and isinstance(data, dict):
-                        status = data.get("status", {})
-                        if status and isinstance(status, dict):
-                            first_status = status.get("first")
-                            if first_status == "可用":
-                                self.append_log("[V2版本] 验证状态：可用，开始执行OCR识别...")
-                                
-                                # 验证合格后执行OCR识别
-                                self._perform_ocr_and_continue(card)
-                                return
-                        
-                    # 如果没有 "data.status.first" 或不等于 "可用"，检查是否有 "msg" 字段
-                    if "msg" in response:
-                        msg = response.get("msg", "验证失败")
-                        self.append_log(f"[V2版本] 验证失败：{msg}")
-                        if self.config.service.popup_failure:
-                            messagebox.showerror("洗消验证", f"验证失败：{msg}")
-                    else:
-                        # 其他情况
-                        self.append_log("[V2版本] 验证失败：返回内容格式不符合要求")
-                        if self.config.service.popup_failure:
-                            messagebox.showerror("洗消验证", "验证失败：返回内容格式不符合要求")
-                else:
-                    # 响应状态码不是200，检查是否有 "msg" 字段
-                    if "msg" in response:
-                        msg = response.get("msg", "验证失败")
-                        self.append_log(f"[V2版本] 验证失败：{msg}")
-                        if self.config.service.popup_failure:
-                            messagebox.showerror("洗消验证", f"验证失败：{msg}")
-                    else:
-                        # 其他情况
-                        text = response.get("message", "验证失败")
-                        self.append_log(f"[V2版本] 验证失败: {text}")
-                        if self.config.service.popup_failure:
-                            messagebox.showerror("洗消验证", f"验证失败：{text}")
-            else:
-                # response不是字典类型
-                text = str(response)
-                self.append_log(f"[V2版本] 验证失败: {text}")
-                if self.config.service.popup_failure:
-                    messagebox.showerror("洗消验证", f"验证失败：{text}")
-        else:
-            # 请求失败的情况
-            if isinstance(response, dict):
-                # 检查是否有 "error" 或 "msg" 字段
-                if "error" in response:
-                    msg = response.get("error", "验证失败")
-                elif "msg" in response:
-                    msg = response.get("msg", "验证失败")
-                else:
-                    msg = "验证失败"
-            else:
-                msg = str(response)
-                
-            self.append_log(f"[V2版本] 洗消验证失败: {msg}")
-            if self.config.service.popup_failure:
-                messagebox.showerror("洗消验证", f"验证失败：{msg}")
+        msg = self.pipeline.v2_verify_failure(*outcome)
+        if msg is None and speculation is not None:
+            self.append_log("[V2版本] 验证状态：可用，使用预先识别的结果...")
+            if self.swipe_workflow.transition(run, STATE_RECOGNIZING):
+                self.swipe_workflow.attach(
+                    run, speculation, on_done=self._on_speculative_recognized, on_error=self._on_swipe_recognition_error
+                )
+            return
+        if msg is None:
+            # 验证合格后执行OCR识别
+            self.append_log("[V2版本] 验证状态：可用，开始执行OCR识别...")
+            self._start_swipe_recognition(run)
+            return
+        if speculation is not None:
+            # 流程失败后预识别在下一个检查点退出，结果不会写回配置
+            self.append_log("[V2版本] 验证未通过，丢弃预先识别的结果")
+        self.swipe_workflow.fail(run, msg)
+        if self.config.service.popup_failure:
+            messagebox.showerror("洗消验证", f"验证失败：{msg}")
     
-    def _perform_ocr_and_continue(self, card: Dict[str, str]) -> None:
-        """执行OCR识别并继续后续流程"""
+    def _start_swipe_recognition(self, run) -> None:
+        """OCR引擎就绪后在后台识别当前刷卡流程的字段"""
+        from app.swipe_workflow import STATE_RECOGNIZING
+        
+        if not self.swipe_workflow.transition(run, STATE_RECOGNIZING):
+            return
+        self._run_when_ocr_ready(
+            lambda: self.swipe_workflow.run_step(
+                run, self._recognize_swipe, on_done=self._on_swipe_recognized, on_error=self._on_swipe_recognition_error
+            )
+        )
+    
+    def _recognize_swipe(self, run) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        在后台线程中识别字段快照，返回 (field_id -> 清理后的识别结果, 名单学习候选)
+        
+        不修改配置，结果由 _on_swipe_recognized 在界面线程写回。
+        """
+        # 刷卡识别期间暂停后台预识别，让出OCR引擎；预识别过且像素未变化的字段会直接命中结果缓存
+        if self.screen_watcher:
+            self.screen_watcher.pause()
         try:
-            # 执行OCR识别所有字段
-            for field in self.config.ocr_fields:
-                if field.enabled and field.recognition_area:
-                    x = field.recognition_area.x
-                    y = field.recognition_area.y
-                    w = field.recognition_area.width
-                    h = field.recognition_area.height
-                    
-                    self.append_log(f"[OCR] 开始识别字段：{field.name}，区域：({x},{y},{w},{h})")
-                    
-                    # 进行OCR文字识别，带重试机制
-                    recognized_text = self._recognize_with_retry(x, y, w, h, max_retries=2)
-                    
-                    if recognized_text:
-                        # 特殊处理：年龄字段只保留数字
-                        if field.name == "年龄":
-                            import re
-                            # 提取所有数字，去掉汉字如"岁"、"月"等
-                            numbers = re.findall(r'\d+', recognized_text)
-                            if numbers:
-                                cleaned_text = ''.join(numbers)
-                                self.append_log(f"[OCR] 年龄字段清理：'{recognized_text}' → '{cleaned_text}'")
-                                recognized_text = cleaned_text
-                        
-                        field.recognized_value = recognized_text
-                        self.append_log(f"[OCR] 识别成功：{field.name} = {recognized_text}")
-                    else:
-                        self.append_log(f"[OCR] 未识别到文字：{field.name}")
-            
-            # 保存OCR结果
-            self._save_config()
-            self._refresh_ocr_tree()
-            
-            # 收集OCR识别结果
-            field_values = self._collect_field_values()
-            missing = [f.name for f in self.config.ocr_fields if f.enabled and not (f.recognized_value or f.default_value)]
-            if missing:
-                self.append_log(f"[V2版本] 以下字段缺失，已使用空值：{', '.join(missing)}")
-            
-            # 构建完整payload
-            payload = {
-                "card_hex": card.get("hex"),
-                "card_dec": card.get("dec"),
-                "timestamp": _human_now(),
-                "fields": field_values,
-            }
-            
-            # 继续后续流程
-            self.append_log("[V2版本] OCR识别完成，打开绑定对话框...")
-            self._open_binding_dialog(payload)
-            
-        except Exception as e:
-            self.append_log(f"[V2版本] OCR识别过程中出错: {e}")
-            messagebox.showerror("OCR识别错误", f"OCR识别过程中发生错误：{e}")
+            return self.pipeline.recognize_swipe(run)
+        finally:
+            if self.screen_watcher:
+                self.screen_watcher.resume()
+    
+    def _on_speculative_recognized(self, run, outcome: Tuple[Dict[str, str], Dict[str, str]]) -> None:
+        """预先识别的结果：记录与串行执行相比节省的时间后照常写回"""
+        from app.swipe_workflow import STATE_VERIFYING
+        
+        verify_ms = run.timings.get("verify", 0.0)
+        ocr_ms = run.timings.get("recognize", 0.0)
+        # 验证和识别都从进入验证状态时开始，串行执行需要两者之和
+        parallel_ms = run.elapsed_ms() - (run.entered_ms(STATE_VERIFYING) or 0.0)
+        self.append_log(
+            f"[V2版本] 预识别：验证 {verify_ms:.0f}ms，识别 {ocr_ms:.0f}ms，并行用时 {parallel_ms:.0f}ms，"
+            f"节省 {max(0.0, verify_ms + ocr_ms - parallel_ms):.0f}ms"
+        )
+        self._on_swipe_recognized(run, outcome)
     
-    def _after_verify(self, ok: bool, response: Dict, payload: Dict) -> None:
+    def _on_swipe_recognized(self, run, outcome: Tuple[Dict[str, str], Dict[str, str]]) -> None:
+        """识别完成（界面线程）：写回识别结果和版面平移并打开绑定对话框"""
+        values, self._roster_candidates[run.run_id] = outcome
+        # 识别期间更换或清除了锚点时，旧锚点测得的平移不再适用
+        if run.anchor is not None and run.anchor is self._layout_tracker:
+            self._apply_layout_shift(run.layout_shift)
+        self.pipeline.apply_recognized(values)
+        
+        # 保存OCR结果
+        self._save_config()
+        self._refresh_ocr_tree()
+        
+        # 收集OCR识别结果
+        missing = self.pipeline.missing_fields()
+        if missing:
+            self.append_log(f"[V2版本] 以下字段缺失，已使用空值：{', '.join(missing)}")
+        
+        # 构建完整payload
+        payload = self.pipeline.build_payload(run.card)
+        
+        # 继续后续流程
+        self.append_log("[V2版本] OCR识别完成，打开绑定对话框...")
+        self._open_binding_dialog(run, payload)
+    
+    def _on_swipe_recognition_error(self, run, error: Exception) -> None:
+        self.append_log(f"[V2版本] OCR识别过程中出错: {error}")
+        self.swipe_workflow.fail(run, str(error))
+        messagebox.showerror("OCR识别错误", f"OCR识别过程中发生错误：{error}")
+    
+    def _after_verify(self, run, outcome: Tuple[bool, Dict], payload: Dict) -> None:
+        ok, response = outcome
         if ok:
             text = response.get("message") if isinstance(response, dict) else str(response)
             self.append_log(f"洗消验证成功: {text}")
             if self.config.service.popup_success:
                 messagebox.showinfo("洗消验证", f"验证通过：{text}")
-            self._open_binding_dialog(payload)
+            self._open_binding_dialog(run, payload)
         else:
             msg = response.get("error") if isinstance(response, dict) else response
             self.append_log(f"洗消验证失败: {msg}")
+            self.swipe_workflow.fail(run, str(msg))
             if self.config.service.popup_failure:
                 messagebox.showerror("洗消验证", f"验证失败：{msg}")
 
-    def _open_binding_dialog(self, payload: Dict) -> None:
+    def _on_swipe_state(self, run, state: str) -> None:
+        """刷卡流程状态变化（界面线程）"""
+        from app.swipe_workflow import FINAL_STATES, STATE_CANCELLED, STATE_FAILED, STATE_LABELS
+        
+        if state in FINAL_STATES:
+            # 流程结束，刷卡入口开始处理排队的下一张卡
+            self._roster_candidates.pop(run.run_id, None)
+            self.swipe_intake.release()
+        # 被新卡取代的流程：关闭它仍打开的确认对话框
+        if state == STATE_CANCELLED and run is self._confirm_run:
+            if self.binding_dialog:
+                self.binding_dialog.destroy()
+            self._clear_binding_dialog()
+        self._update_swipe_state(run, state)
+    
+    def _update_swipe_state(self, run, state: str) -> None:
+        from app.swipe_workflow import STATE_FAILED, STATE_LABELS
+        
+        if run is not self.swipe_workflow.current:
+            return
+        label = STATE_LABELS.get(state, state)
+        if state == STATE_FAILED and run.error:
+            label = f"{label}：{run.error}"
+        text = f"刷卡流程 #{run.run_id}：{label}"
+        stats = self.swipe_intake.stats()
+        if stats["depth"] or self._confirm_waiting:
+            text += f" · 排队 {stats['depth'] + len(self._confirm_waiting)} 张"
+        if stats["duplicates"]:
+            text += f" · 已去重 {stats['duplicates']} 次"
+        if stats["max_wait_ms"]:
+            text += f" · 平均等待 {stats['avg_wait_ms'] / 1000:.1f}s"
+        self.swipe_state_var.set(text)
+
+    def _open_binding_dialog(self, run, payload: Dict) -> None:
+        from app.swipe_workflow import STATE_AWAITING_CONFIRM
+        
+        if not self.swipe_workflow.transition(run, STATE_AWAITING_CONFIRM):
+            return
+        if self.binding_dialog and self._confirm_run is not None and self._confirm_run is not run:
+            # 流水线模式：不覆盖正在确认的对话框，关闭后依次弹出
+            self._confirm_waiting.append((run, payload))
+            self.append_log(
+                f"[刷卡] #{run.run_id} 已就绪，等待前一张卡确认（等待确认 {len(self._confirm_waiting)} 张）"
+            )
+            return
+        self._show_binding_dialog(run, payload)
+
+    def _show_next_binding_dialog(self) -> None:
+        while self._confirm_waiting and not self.binding_dialog:
+            run, payload = self._confirm_waiting.popleft()
+            if self.swipe_workflow.is_current(run):
+                self._show_binding_dialog(run, payload)
+
+    def _show_binding_dialog(self, run, payload: Dict) -> None:
+        self._confirm_run = run
         self.pending_binding_payload = payload
         if self.binding_dialog:
             self.binding_dialog.destroy()
-        source = (self.latest_card or {}).get("source", "BLE")
+        source = run.card.get("source", "BLE")
         card_info = {"hex": payload.get("card_hex", ""), "dec": payload.get("card_dec", ""), "source": source}
         auto = self.config.backend.submission_mode == "auto"
         seconds = self.config.backend.auto_delay_seconds
@@ -1656,157 +2191,112 @@ class App:
             on_cancel=self._cancel_binding_dialog,
         )
 
-    def _cancel_binding_dialog(self) -> None:
+    def _clear_binding_dialog(self) -> None:
         self.binding_dialog = None
         self.pending_binding_payload = None
+        self._confirm_run = None
+        if self._confirm_waiting:
+            self.root.after(0, self._show_next_binding_dialog)
+
+    def _cancel_binding_dialog(self) -> None:
+        run = self._confirm_run
+        self._clear_binding_dialog()
+        if run is not None:
+            self.swipe_workflow.cancel(run, "用户取消绑定")
 
     def _submit_binding_payload(self) -> None:
-        if not self.pending_binding_payload:
+        from app.swipe_workflow import STATE_SUBMITTING
+        
+        run = self._confirm_run
+        if not self.pending_binding_payload or run is None:
+            return
+        if not self.swipe_workflow.transition(run, STATE_SUBMITTING):
             return
         if self.binding_dialog:
             self.binding_dialog.show_result("提交中...")
         version = self.config.service.get_selected_version()
+        payload = self.pending_binding_payload
         self.append_log("提交信息绑定接口...")
-        self._post_request(
-            version.bind_url,
-            self.pending_binding_payload,
-            on_success=self._on_binding_success,
-            on_error=self._on_binding_error,
+        self.swipe_workflow.run_step(
+            run,
+            lambda _run: self.pipeline.post_json(version.bind_url, payload),
+            on_done=lambda run, outcome: (
+                self._on_binding_success(run, outcome[1]) if outcome[0] else self._on_binding_error(run, outcome[1])
+            ),
+            name="bind",
         )
 
-    def _on_binding_success(self, data: Dict) -> None:
+    def _on_binding_success(self, run, data: Dict) -> None:
         msg = data.get("message") if isinstance(data, dict) else str(data)
         self.append_log(f"信息绑定成功：{msg}")
+        self.pipeline.learn_roster_candidates(self._roster_candidates.pop(run.run_id, {}))
+        self.swipe_workflow.finish(run)
         if self.binding_dialog:
             self.binding_dialog.show_result("提交成功")
             self.binding_dialog.destroy()
-            self.binding_dialog = None
+        self._clear_binding_dialog()
         messagebox.showinfo("信息绑定", f"提交成功：{msg}")
 
-    def _on_binding_error(self, data: Dict) -> None:
+    def _on_binding_error(self, run, data: Dict) -> None:
+        from app.swipe_workflow import STATE_AWAITING_CONFIRM
+        
         msg = data.get("error") if isinstance(data, dict) else str(data)
         self.append_log(f"信息绑定失败：{msg}")
+        # 回到确认状态，可以再次提交
+        self.swipe_workflow.transition(run, STATE_AWAITING_CONFIRM)
         if self.binding_dialog:
             self.binding_dialog.show_result(f"提交失败：{msg}")
             self.binding_dialog.submit_btn.configure(state=tk.NORMAL)
         messagebox.showerror("信息绑定", f"提交失败：{msg}")
 
-    def _post_request(self, url: str, payload: Dict, on_success, on_error) -> None:
-        if not url:
-            on_error({"error": "未配置接口地址"})
-            return
-
-        def _request():
-            try:
-                resp = requests.post(url, json=payload, timeout=10)
-                resp.raise_for_status()
-                try:
-                    return True, resp.json()
-                except json.JSONDecodeError:
-                    return True, {"message": resp.text}
-            except Exception as exc:
-                return False, {"error": str(exc)}
-
-        future = self.executor.submit(_request)
+    def _save_config(self) -> None:
+        self.config_manager.save(self.config)
+        if self.screen_watcher:
+            self.screen_watcher.set_regions(self._watch_regions())
+
+    # --- screen watcher
+    def _watch_regions(self) -> List[Tuple[str, Tuple[int, int, int, int], str]]:
+        # 带上字段的预处理方案，使预识别结果的缓存键与刷卡时的识别一致
+        return [
+            (f.field_id, self._shifted_rect(f.recognition_area), f.preprocess_profile)
+            for f in self.config.ocr_fields
+            if f.enabled and f.recognition_area
+        ]
+
+    def _on_ocr_watch_change(self) -> None:
+        self.config.ocr.enable_screen_watcher = self.ocr_watch_var.get()
+        self._save_config()
+        self._restart_screen_watcher()
 
-        def _callback(fut):
-            ok, result = fut.result()
-            self.root.after(0, lambda: (on_success(result) if ok else on_error(result)))
+    def _on_ocr_server_change(self) -> None:
+        self.config.ocr.use_ocr_server = self.ocr_server_var.get()
+        self._save_config()
+        self.append_log("[OCR] 独立进程设置已保存，重启程序后生效")
 
-        future.add_done_callback(_callback)
+    def _on_ocr_form_change(self) -> None:
+        self.config.ocr.form_recognition = self.ocr_form_var.get()
+        self._save_config()
 
-    def _get_request(self, url: str, payload: Dict, on_success, on_error) -> None:
-        if not url:
-            on_error({"error": "未配置接口地址"})
+    def _restart_screen_watcher(self) -> None:
+        """根据配置启动/停止屏幕变化监视器"""
+        if self.screen_watcher:
+            self.screen_watcher.stop()
+            self.screen_watcher = None
+        if not self.config.ocr.enable_screen_watcher:
             return
+        try:
+            from app.screen_watcher import ScreenChangeWatcher
 
-        def _request():
-            try:
-                # 构建GET请求URL
-                import urllib.parse
-                
-                # V2版本特殊处理：将10位数卡号删除前面4个0，保留后6位，然后拼接到URL后面
-                if self.config.service.selected_version == "v2":
-                    card_dec = payload.get("card_dec", "")
-                    
-                    # 处理卡号：删除前面4个0，保留后6位
-                    if len(card_dec) == 10 and card_dec.startswith("0000"):
-                        processed_card = card_dec[4:]
-                        self.append_log(f"[V2] 卡号处理：{card_dec} → {processed_card}")
-                    else:
-                        # 如果不是10位或不以前4个0开头，使用原始卡号
-                        processed_card = card_dec
-                        self.append_log(f"[V2] 卡号未处理：{processed_card}")
-                    
-                    # 确保URL和卡号之间没有多余的分隔符
-                    if url.endswith("/"):
-                        full_url = f"{url}{processed_card}"
-                    else:
-                        full_url = f"{url}{processed_card}"
-                    
-                    self.append_log(f"[V2] 发送GET请求: {full_url}")
-                    
-                    resp = requests.get(full_url, timeout=10)
-                    resp.raise_for_status()
-                    
-                    self.append_log(f"[V2] 响应状态码: {resp.status_code}")
-                    self.append_log(f"[V2] 响应内容: {resp.text}")
-                    
-                    try:
-                        return True, resp.json()
-                    except json.JSONDecodeError:
-                        return True, {"message": resp.text}
-                else:
-                    # 其他版本使用标准GET参数
-                    params = {}
-                    
-                    # 提取需要的参数
-                    if payload.get("card_hex"):
-                        params["card_hex"] = payload["card_hex"]
-                    if payload.get("card_dec"):
-                        params["card_dec"] = payload["card_dec"]
-                    
-                    # 添加fields中的参数
-                    for field_name, field_value in payload.get("fields", {}).items():
-                        params[field_name] = field_value
-                    
-                    # 构建完整URL
-                    if "?" in url:
-                        if url.endswith("?"):
-                            full_url = url + urllib.parse.urlencode(params)
-                        else:
-                            full_url = url + "&" + urllib.parse.urlencode(params)
-                    else:
-                        full_url = url + "?" + urllib.parse.urlencode(params)
-                    
-                    self.append_log(f"[GET] 发送请求: {full_url}")
-                    
-                    resp = requests.get(full_url, timeout=10)
-                    resp.raise_for_status()
-                    
-                    self.append_log(f"[GET] 响应状态码: {resp.status_code}")
-                    self.append_log(f"[GET] 响应内容: {resp.text}")
-                    
-                    try:
-                        return True, resp.json()
-                    except json.JSONDecodeError:
-                        return True, {"message": resp.text}
-            except Exception as exc:
-                error_msg = str(exc)
-                self.append_log(f"[V2] 请求失败: {error_msg}")
-                return False, {"error": error_msg}
-
-        future = self.executor.submit(_request)
-
-        def _callback(fut):
-            ok, result = fut.result()
-            self.root.after(0, lambda: (on_success(result) if ok else on_error(result)))
-
-        future.add_done_callback(_callback)
-
-    # --- other helpers
-    def _save_config(self) -> None:
-        self.config_manager.save(self.config)
+            watcher = ScreenChangeWatcher(
+                interval=self.config.ocr.watcher_interval_ms / 1000.0,
+                settle_ticks=self.config.ocr.watcher_settle_ticks,
+                logger=self.append_log,
+            )
+            watcher.set_regions(self._watch_regions())
+            if watcher.start():
+                self.screen_watcher = watcher
+        except Exception as e:
+            self.append_log(f"[预识别] 启动屏幕变化监视失败: {e}")
 
     def _ensure_float_window(self, show: bool = False) -> None:
         if self.float_window is None or not self.float_window.winfo_exists():
@@ -1815,27 +2305,9 @@ class App:
             self.float_window.deiconify()
 
     def _on_manual_card_input(self, value: str) -> None:
-        clean = value.strip().replace(" ", "")
-        hex_value = ""
-        dec_value = ""
-        if not clean:
-            return
-        if clean.isdigit():
-            dec_value = clean
-            try:
-                hex_value = f"{int(clean):08X}"
-            except Exception:
-                hex_value = clean
-        else:
-            hex_candidate = clean.upper()
-            try:
-                dec_value = f"{int(hex_candidate, 16):010d}"
-                hex_value = f"{int(hex_candidate, 16):08X}"
-            except Exception:
-                hex_value = hex_candidate
-                dec_value = hex_candidate
-        card = {"hex": hex_value, "dec": dec_value, "source": "浮球"}
-        self.on_card_data(card)
+        card = parse_card_input(value, "浮球")
+        if card is not None:
+            self.on_card_data(stamp_arrival(card))
 
     def _restart_hid_listener(self) -> None:
         """重启HID监听器 - 在HID功能启用时启动，无需BLE设备连接"""
@@ -1868,6 +2340,7 @@ class App:
                 require_enter=self.config.hid.require_enter,
                 callback=self._on_hid_card,
                 logger=self.append_log,
+                on_key=self._on_hid_key,
             )
             self.append_log(f"[调试] HID监听器实例创建成功")
             start_result = self.hid_listener.start()
@@ -1907,6 +2380,8 @@ class App:
 
     def _on_hid_card(self, value: str, device_name: str) -> None:
         """处理蓝牙设备发送的卡号数据"""
+        arrived = time.time()
+
         def _handle() -> None:
             # 添加详细调试日志
             self.append_log(f"[调试] HID监听器收到数据: 值={value}, 设备名={device_name}")
@@ -1976,7 +2451,7 @@ class App:
                 hex_value = dec_value
                 
             # 使用当前连接的蓝牙设备作为来源
-            card = {"hex": hex_value, "dec": dec_value, "source": f"BLE:{device_name}"}
+            card = stamp_arrival({"hex": hex_value, "dec": dec_value, "source": f"BLE:{device_name}"}, arrived)
             self.append_log(f"蓝牙刷卡：10D={dec_value} 来自 {device_name}")
             
             # 调用on_card_data处理数据
@@ -1988,7 +2463,30 @@ class App:
         self.root.after(0, _handle)
 
     def _on_close(self) -> None:
+        stats = self.swipe_intake.stats()
+        if stats["started"]:
+            self.append_log(
+                f"[刷卡] 共处理 {stats['started']} 张，去重 {stats['duplicates']} 次，最大排队 {stats['max_depth']} 张，"
+                f"平均等待 {stats['avg_wait_ms']:.0f}ms，最长等待 {stats['max_wait_ms']:.0f}ms"
+            )
+        self.swipe_workflow.cancel(reason="程序退出")
+        # 写入尚未写入的配置保存
+        self.config_manager.close()
         self._stop_hid_listener()
+        if self.ocr_lifecycle is not None:
+            self.ocr_lifecycle.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.screen_watcher:
+            self.screen_watcher.stop()
+        try:
+            from app.ocr_engine import close_ocr_engine
+
+            close_ocr_engine()
+        except Exception:
+            pass
         if self.float_window and self.float_window.winfo_exists():
             self.float_window.destroy()
         try:
@@ -2001,8 +2499,27 @@ class App:
 
 
 def main() -> None:
+    if "--ocr-server" in sys.argv[1:]:
+        # 打包后的exe以该参数重新启动自身，作为OCR工作进程运行
+        from app.ocr_server import serve_main
+
+        serve_main([arg for arg in sys.argv[1:] if arg != "--ocr-server"])
+        return
+    if "--headless" in sys.argv[1:]:
+        # 打包后的exe以该参数运行无界面服务
+        from app.headless import main as headless_main
+
+        headless_main([arg for arg in sys.argv[1:] if arg != "--headless"])
+        return
+    record_path = None
+    if "--record" in sys.argv[1:]:
+        # 录制刷卡会话：python -m app --record logs/session.zip
+        index = sys.argv.index("--record")
+        record_path = Path(sys.argv[index + 1]) if index + 1 < len(sys.argv) else None
+        if record_path is None or record_path.suffix.lower() != ".zip":
+            record_path = Path("logs") / f"session-{time.strftime('%Y%m%d-%H%M%S')}.zip"
     root = tk.Tk()
-    App(root)
+    App(root, record_path=record_path)
     root.mainloop()
 
 
@@ -0,0 +1,221 @@
+"""
+OCR引擎校准 - 按实测延迟和准确率选择引擎
+
+用 screenshots/ 中各字段最近一次定位时保存的截图作为参考样本，以字段已确认的
+识别示例（sample_value）作为期望值，在每个可用引擎上测量单字段识别延迟
+（p50/p95）和完全匹配率；在满足准确率下限的引擎中选择延迟最低的一个。
+"""
+
+from __future__ import annotations
+
+import gc
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import PIL.Image
+
+from app.ocr_engine import ENGINE_PRIORITY, OCR_ENGINES, create_backend, discover_engines
+
+DEFAULT_ACCURACY_FLOOR = 0.8
+
+
+@dataclass
+class CalibrationSample:
+    field_name: str
+    image_path: Path
+    expected: str
+    profile: str = ""
+
+
+@dataclass
+class EngineBenchmark:
+    engine: str
+    samples: int = 0
+    exact_matches: int = 0
+    load_ms: float = 0.0
+    p50_ms: float = 0.0
+    p95_ms: float = 0.0
+    error: str = ""
+    mismatches: List[str] = field(default_factory=list)
+
+    @property
+    def accuracy(self) -> float:
+        return self.exact_matches / self.samples if self.samples else 0.0
+
+
+@dataclass
+class CalibrationReport:
+    results: List[EngineBenchmark]
+    chosen: Optional[str]
+    accuracy_floor: float
+    meets_floor: bool
+    created_at: float = field(default_factory=time.time)
+
+    def summary(self) -> str:
+        """一行一个引擎的文字报告，用于界面显示"""
+        if not self.results:
+            return "引擎校准: 没有可用的引擎或参考样本"
+        lines = []
+        for r in self.results:
+            if r.error:
+                lines.append(f"{r.engine}: 失败 ({r.error})")
+                continue
+            lines.append(
+                f"{r.engine}: 准确率 {r.accuracy:.0%} ({r.exact_matches}/{r.samples})  "
+                f"p50 {r.p50_ms:.0f}ms  p95 {r.p95_ms:.0f}ms  加载 {r.load_ms:.0f}ms"
+            )
+        stamp = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.created_at))
+        if self.chosen:
+            note = "" if self.meets_floor else f"（均未达到准确率下限 {self.accuracy_floor:.0%}，按准确率选择）"
+            lines.insert(0, f"引擎校准 {stamp}: 选用 {self.chosen}{note}")
+        else:
+            lines.insert(0, f"引擎校准 {stamp}: 没有引擎能完成识别")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        for item, result in zip(data["results"], self.results):
+            item["accuracy"] = result.accuracy
+        return data
+
+
+def normalize_text(text: str) -> str:
+    """比较前去掉所有空白字符"""
+    return "".join((text or "").split())
+
+
+def collect_samples(fields: Sequence, screenshots_dir: Path) -> List[CalibrationSample]:
+    """
+    为每个已启用且有识别示例的字段取最近一次的定位截图作为参考样本
+
+    Args:
+        fields: OCRField 列表
+        screenshots_dir: 截图目录，文件名格式为 <字段名>_<时间戳>.png
+    """
+    samples = []
+    for f in fields:
+        expected = normalize_text(f.sample_value)
+        if not f.enabled or not expected:
+            continue
+        shots = list(screenshots_dir.glob(f"{f.name}_*.png"))
+        if not shots:
+            continue
+        latest = max(shots, key=lambda p: p.stat().st_mtime)
+        samples.append(
+            CalibrationSample(field_name=f.name, image_path=latest, expected=expected, profile=f.preprocess_profile)
+        )
+    return samples
+
+
+def _percentile(sorted_values: Sequence[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def benchmark_engine(
+    engine_type: str,
+    samples: Sequence[CalibrationSample],
+    images: Sequence[PIL.Image.Image],
+    repeat: int = 3,
+) -> EngineBenchmark:
+    """加载一个引擎并逐字段测量识别延迟和完全匹配数（绕过识别结果缓存）"""
+    result = EngineBenchmark(engine=engine_type, samples=len(samples))
+    start = time.perf_counter()
+    try:
+        backend = create_backend(engine_type)
+    except Exception as e:
+        result.error = str(e)
+        return result
+    result.load_ms = (time.perf_counter() - start) * 1000
+
+    try:
+        # 第一次推理承担延迟初始化，不计入耗时
+        backend.recognize_batch_detailed(images[:1], [samples[0].profile])
+        latencies = []
+        for sample, image in zip(samples, images):
+            text = ""
+            for _ in range(max(1, repeat)):
+                t0 = time.perf_counter()
+                text = backend.recognize_batch_detailed([image], [sample.profile])[0].text
+                latencies.append((time.perf_counter() - t0) * 1000)
+            if normalize_text(text) == sample.expected:
+                result.exact_matches += 1
+            else:
+                result.mismatches.append(f"{sample.field_name}: {text!r} != {sample.expected!r}")
+        latencies.sort()
+        result.p50_ms = statistics.median(latencies)
+        result.p95_ms = _percentile(latencies, 0.95)
+    except Exception as e:
+        result.error = str(e)
+    finally:
+        # 逐个引擎释放模型，避免多个模型同时驻留内存
+        del backend
+        gc.collect()
+    return result
+
+
+def choose_engine(results: Sequence[EngineBenchmark], accuracy_floor: float) -> Optional[EngineBenchmark]:
+    """在达到准确率下限的引擎中选延迟最低的；都未达到时选准确率最高的"""
+    usable = [r for r in results if not r.error and r.samples]
+    if not usable:
+        return None
+    qualified = [r for r in usable if r.accuracy >= accuracy_floor]
+    if qualified:
+        return min(qualified, key=lambda r: r.p50_ms)
+    return max(usable, key=lambda r: (r.accuracy, -r.p50_ms))
+
+
+def run_calibration(
+    samples: Sequence[CalibrationSample],
+    engines: Optional[Sequence[str]] = None,
+    accuracy_floor: float = DEFAULT_ACCURACY_FLOOR,
+    repeat: int = 3,
+    progress: Optional[Callable[[str], None]] = None,
+) -> CalibrationReport:
+    """
+    在各可用引擎上跑参考样本并选出引擎
+
+    Args:
+        samples: collect_samples() 得到的参考样本
+        engines: 参与校准的引擎类型，为None时使用所有已安装的引擎
+        accuracy_floor: 完全匹配率下限
+        repeat: 每个样本重复识别次数
+        progress: 进度回调
+    """
+    log = progress or (lambda _msg: None)
+    discover_engines()
+    if engines is None:
+        engines = [t for t in ENGINE_PRIORITY if OCR_ENGINES.get(t, {}).get("available")]
+
+    images = []
+    usable_samples = []
+    for sample in samples:
+        try:
+            with PIL.Image.open(sample.image_path) as img:
+                images.append(img.convert("RGB"))
+            usable_samples.append(sample)
+        except Exception as e:
+            log(f"[校准] 跳过无法读取的截图 {sample.image_path.name}: {e}")
+
+    results: List[EngineBenchmark] = []
+    if usable_samples:
+        for engine_type in engines:
+            log(f"[校准] 正在测试 {engine_type}（{len(usable_samples)} 个样本）...")
+            result = benchmark_engine(engine_type, usable_samples, images, repeat=repeat)
+            results.append(result)
+            if result.error:
+                log(f"[校准] {engine_type} 失败: {result.error}")
+            else:
+                log(f"[校准] {engine_type}: 准确率 {result.accuracy:.0%}，p50 {result.p50_ms:.0f}ms，p95 {result.p95_ms:.0f}ms")
+
+    best = choose_engine(results, accuracy_floor)
+    return CalibrationReport(
+        results=results,
+        chosen=best.engine if best else None,
+        accuracy_floor=accuracy_floor,
+        meets_floor=bool(best and best.accuracy >= accuracy_floor),
+    )
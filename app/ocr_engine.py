@@ -6,69 +6,376 @@ OCR文字识别引擎模块 - 智能选择版本
 
 from __future__ import annotations
 
-import tempfile
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Callable, Dict, Any, List, Sequence, Tuple, Union
 import warnings
 
-# 尝试导入各种OCR库，按优先级排序
+# 各OCR库的可用性，按优先级排序；由 discover_engines() 通过模块查找填充，不在导入时加载任何模型库
 OCR_ENGINES = {}
 CURRENT_ENGINE = None
 
-# 尝试PaddleOCR
-try:
-    from paddleocr import PaddleOCR
-    OCR_ENGINES['paddle'] = {
-        'available': True,
-        'engine': 'PaddleOCR',
-        'description': '百度PaddleOCR - 中文优化，轻量级'
-    }
-except ImportError:
-    pass
+# OCR引擎就绪状态
+STATE_DISCOVERING = "discovering"
+STATE_LOADING = "loading"
+STATE_WARMING = "warming"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+STATE_UNLOADED = "unloaded"
 
-# 尝试EasyOCR
-try:
-    import easyocr
-    OCR_ENGINES['easyocr'] = {
-        'available': True,
-        'engine': 'EasyOCR',
-        'description': '基于PyTorch的OCR库 - 支持多语言'
-    }
-    print("✓ EasyOCR 可用")
-except Exception as e:
-    print(f"✗ EasyOCR 不可用: {e}")
-    OCR_ENGINES['easyocr'] = {
-        'available': False,
-        'engine': 'EasyOCR',
-        'description': f'不可用: {e}'
-    }
+STATE_LABELS = {
+    STATE_DISCOVERING: "检测中",
+    STATE_LOADING: "加载中",
+    STATE_WARMING: "预热中",
+    STATE_READY: "已就绪",
+    STATE_FAILED: "加载失败",
+    STATE_UNLOADED: "已卸载（空闲）",
+}
+
+_discover_lock = threading.Lock()
+_engines_discovered = False
+
+
+def _module_available(module_name: str) -> bool:
+    """只查找模块是否已安装，不执行导入"""
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def discover_engines() -> Dict[str, Dict[str, Any]]:
+    """检测已安装的OCR库（只做模块查找，耗时在毫秒级），结果缓存在 OCR_ENGINES 中"""
+    global _engines_discovered
+    with _discover_lock:
+        if _engines_discovered:
+            return OCR_ENGINES
+        
+        # 尝试PaddleOCR
+        if _module_available('paddleocr'):
+            OCR_ENGINES['paddle'] = {
+                'available': True,
+                'engine': 'PaddleOCR',
+                'description': '百度PaddleOCR - 中文优化，轻量级'
+            }
+        
+        # 尝试EasyOCR
+        if _module_available('easyocr'):
+            OCR_ENGINES['easyocr'] = {
+                'available': True,
+                'engine': 'EasyOCR',
+                'description': '基于PyTorch的OCR库 - 支持多语言'
+            }
+            print("✓ EasyOCR 可用")
+        else:
+            print("✗ EasyOCR 不可用: 未安装easyocr")
+            OCR_ENGINES['easyocr'] = {
+                'available': False,
+                'engine': 'EasyOCR',
+                'description': '不可用: 未安装easyocr'
+            }
+        
+        # 尝试Tesseract
+        if _module_available('pytesseract'):
+            OCR_ENGINES['tesseract'] = {
+                'available': True,
+                'engine': 'Tesseract',
+                'description': 'Google Tesseract - 传统OCR引擎'
+            }
+        
+        _engines_discovered = True
+        return OCR_ENGINES
+
+
+def _engine_available(engine_type: str) -> bool:
+    return bool(discover_engines().get(engine_type, {}).get('available'))
 
-# 尝试Tesseract
-try:
-    import pytesseract
-    OCR_ENGINES['tesseract'] = {
-        'available': True,
-        'engine': 'Tesseract',
-        'description': 'Google Tesseract - 传统OCR引擎'
-    }
-except ImportError:
-    pass
 
 # 检查Pillow是否可用
 try:
     import PIL.Image
-    import PIL.ImageGrab
+    import PIL.ImageDraw
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
 
+from app.screen_capture import grab as grab_screen
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# 屏幕区域: (x, y, width, height) 元组，或带 x/y/width/height 属性的对象（如 config_manager.Rect）
+Region = Union[Tuple[int, int, int, int], Any]
+
+# 拼接识别时各区域之间的留白高度（像素），避免相邻字段的文字被检测为同一行
+STITCH_GAP = 24
+
+
+def _region_bbox(region: Region) -> Tuple[int, int, int, int]:
+    """将区域转换为 (left, top, right, bottom)"""
+    if isinstance(region, (list, tuple)):
+        x, y, w, h = region
+    elif isinstance(region, dict):
+        x, y = region.get('x', 0), region.get('y', 0)
+        w, h = region.get('width', 0), region.get('height', 0)
+    else:
+        x, y, w, h = region.x, region.y, region.width, region.height
+    x, y, w, h = int(x), int(y), int(w), int(h)
+    return x, y, x + max(0, w), y + max(0, h)
+
+
+def grab_regions(regions: Sequence[Region]) -> List[Optional[PIL.Image.Image]]:
+    """截取多个屏幕区域：只对所有区域的外接矩形截屏一次，再在内存中裁剪
+
+    Returns:
+        与 regions 顺序一致的图片列表，宽或高为0的区域对应 None
+    """
+    boxes = [_region_bbox(r) for r in regions]
+    valid = [b for b in boxes if b[2] > b[0] and b[3] > b[1]]
+    if not valid:
+        return [None] * len(boxes)
+
+    union = (
+        min(b[0] for b in valid),
+        min(b[1] for b in valid),
+        max(b[2] for b in valid),
+        max(b[3] for b in valid),
+    )
+    frame = grab_screen(union)
+
+    crops: List[Optional[PIL.Image.Image]] = []
+    for left, top, right, bottom in boxes:
+        if right <= left or bottom <= top:
+            crops.append(None)
+            continue
+        crops.append(frame.crop((left - union[0], top - union[1], right - union[0], bottom - union[1])))
+    return crops
+
+
+def image_to_array(image: Union[PIL.Image.Image, "np.ndarray"], channel_order: str = 'RGB') -> "np.ndarray":
+    """
+    将图片转换为OCR引擎可直接使用的 uint8 数组 (H, W, 3)，不经过临时文件
+    
+    PIL图片直接从像素缓冲区按目标通道顺序解包，只产生一次拷贝；
+    传入的 ndarray 视为 RGB，通道顺序一致时原样返回，不再拷贝。
+    
+    Args:
+        image: PIL图片或 RGB 排列的 ndarray
+        channel_order: 'RGB'（EasyOCR）或 'BGR'（PaddleOCR，与 cv2.imread 一致）
+    """
+    if isinstance(image, np.ndarray):
+        if channel_order == 'RGB' or image.ndim != 3:
+            return image
+        return np.ascontiguousarray(image[:, :, ::-1])
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if channel_order == 'RGB':
+        return np.asarray(image)
+    # raw 编码器可直接按 BGR 顺序输出，省去先转 RGB 数组再翻转通道的额外拷贝
+    buffer = image.tobytes('raw', 'BGR')
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(image.height, image.width, 3)
+
+
+def _stitch_vertical(images: Sequence[PIL.Image.Image], gap: int = STITCH_GAP) -> Tuple[PIL.Image.Image, List[Tuple[int, int]]]:
+    """将多张图片纵向拼接为一张，返回拼接图和每张图片所在的纵向区间 [top, bottom)"""
+    width = max(img.width for img in images)
+    height = sum(img.height for img in images) + gap * (len(images) + 1)
+    canvas = PIL.Image.new('RGB', (width, height), (255, 255, 255))
+
+    bands: List[Tuple[int, int]] = []
+    top = gap
+    for img in images:
+        canvas.paste(img.convert('RGB') if img.mode != 'RGB' else img, (0, top))
+        bands.append((top, top + img.height))
+        top += img.height + gap
+    return canvas, bands
+
+
+def _band_index(center_y: float, bands: Sequence[Tuple[int, int]]) -> int:
+    """根据文本框中心纵坐标找到所属的拼接区间（落在留白中时取最近的区间）"""
+    for idx, (top, bottom) in enumerate(bands):
+        if top <= center_y < bottom:
+            return idx
+    return min(
+        range(len(bands)),
+        key=lambda i: min(abs(center_y - bands[i][0]), abs(center_y - bands[i][1])),
+    )
+
+
+# 识别结果中低于该置信度的文本不计入结果
+MIN_TOKEN_CONFIDENCE = 0.3
+
+
+@dataclass
+class OCRToken:
+    """引擎识别出的一段文字"""
+    text: str
+    confidence: float
+    # 文本框顶点，坐标相对于输入的字段截图（已换算回预处理缩放前的像素）
+    box: List[Tuple[float, float]] = field(default_factory=list)
+
+
+@dataclass
+class OCRResult:
+    """
+    单个字段的结构化识别结果
+    
+    timings 为各阶段耗时（毫秒）：capture 截屏、preprocess 预处理、inference 推理、
+    postprocess 结果整理、cache 缓存查询；批量识别时预处理/推理/整理为整批的耗时，
+    batch_size 记录同批字段数。
+    """
+    text: str = ""
+    tokens: List[OCRToken] = field(default_factory=list)
+    engine: str = ""
+    timings: Dict[str, float] = field(default_factory=dict)
+    batch_size: int = 1
+    cached: bool = False
+    
+    @property
+    def confidence(self) -> float:
+        """整体置信度：取各段文字中的最低值，没有文字时为0"""
+        if not self.tokens:
+            return 0.0
+        return min(token.confidence for token in self.tokens)
+    
+    @property
+    def total_ms(self) -> float:
+        return sum(self.timings.values())
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "tokens": [{"text": t.text, "confidence": t.confidence, "box": [list(p) for p in t.box]} for t in self.tokens],
+            "engine": self.engine,
+            "timings": dict(self.timings),
+            "batch_size": self.batch_size,
+            "cached": self.cached,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "OCRResult":
+        return cls(
+            text=data.get("text", ""),
+            tokens=[
+                OCRToken(t.get("text", ""), float(t.get("confidence", 0.0)), [tuple(p) for p in t.get("box", [])])
+                for t in data.get("tokens", [])
+            ],
+            engine=data.get("engine", ""),
+            timings=dict(data.get("timings", {})),
+            batch_size=int(data.get("batch_size", 1)),
+            cached=bool(data.get("cached", False)),
+        )
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+def _scaled_box(
+    box: Sequence[Sequence[float]], scale: float, top: float = 0.0, pad: float = 0.0
+) -> List[Tuple[float, float]]:
+    """将预处理后（可能经过留白、拼接和缩放）的文本框坐标换算回原始字段截图坐标"""
+    return [((float(x) - pad) / scale, (float(y) - top - pad) / scale) for x, y in box]
+
+
+def _join_tokens(tokens: Sequence[OCRToken]) -> str:
+    return ' '.join(token.text for token in tokens).strip()
+
+
+def _build_results(
+    tokens_per_image: Sequence[List[OCRToken]],
+    engine_type: str,
+    preprocess_ms: float,
+    inference_ms: float,
+    postprocess_ms: float,
+    join: Callable[[Sequence[OCRToken]], str] = _join_tokens,
+) -> List[OCRResult]:
+    return [
+        OCRResult(
+            text=join(tokens),
+            tokens=tokens,
+            engine=engine_type,
+            timings={"preprocess": preprocess_ms, "inference": inference_ms, "postprocess": postprocess_ms},
+            batch_size=len(tokens_per_image),
+        )
+        for tokens in tokens_per_image
+    ]
+
 
 class BaseOCREngine:
     """OCR引擎基类"""
     
+    # 引擎类型名称，与 OCR_ENGINES 的键一致
+    engine_type = "base"
+    
+    # 识别模型期望的文字行高度（像素），预处理的 height 步骤缺省归一到该高度
+    target_height = 48
+    
+    def pipeline(self, profile: Optional[str] = None):
+        """字段预处理方案对应的流水线，profile 为空时使用默认预设"""
+        from app.ocr_preprocess import get_pipeline
+        
+        return get_pipeline(profile, self.target_height)
+    
+    def profile_id(self, profile: Optional[str] = None) -> str:
+        """预处理方案的规范化标识，参与识别结果缓存的键"""
+        return self.pipeline(profile).profile_id
+    
+    def _preprocess(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]]
+    ) -> Tuple[List[PIL.Image.Image], List[Tuple[float, float]]]:
+        """按各自的方案预处理，返回处理后的图片和 (缩放比例, 留白) 几何信息"""
+        processed, geometry = [], []
+        for image, profile in zip(images, profiles or [None] * len(images)):
+            if isinstance(image, str):
+                image = PIL.Image.open(image)
+            pipeline = self.pipeline(profile)
+            processed.append(pipeline.run(image))
+            geometry.append(pipeline.geometry(image.height))
+        return processed, geometry
+    
     def recognize_from_image(self, image) -> str:
         """从图片中识别文字"""
-        raise NotImplementedError
+        return self.recognize_batch_detailed([image])[0].text
+    
+    def recognize_batch(self, images: Sequence[PIL.Image.Image]) -> List[str]:
+        """批量识别多张图片，返回文字列表"""
+        return [result.text for result in self.recognize_batch_detailed(images)]
+    
+    def recognize_batch_detailed(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """
+        批量识别多张图片，返回结构化结果；子类应覆盖为一次批量推理
+        
+        默认实现逐张调用 recognize_from_image（不做预处理），只有文字和推理耗时。
+        子类至少需要覆盖 recognize_from_image 和本方法中的一个。
+        
+        Args:
+            images: 字段截图
+            profiles: 与 images 对应的预处理方案（预设名称或步骤字符串），为None时使用默认预设
+        """
+        results = []
+        for image in images:
+            start = time.perf_counter()
+            text = self.recognize_from_image(image)
+            results.append(OCRResult(text=text, engine=self.engine_type, timings={"inference": _elapsed_ms(start)}))
+        return results
     
     def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
         """从屏幕指定区域识别文字"""
@@ -82,77 +389,75 @@ class BaseOCREngine:
 class PaddleOCREngine(BaseOCREngine):
     """PaddleOCR引擎"""
     
+    engine_type = "paddle"
+    # PP-OCR 识别模型输入高度
+    target_height = 48
+    
+    # 单次识别中一个批次最多送入识别模型的文本行数，批量识别多个字段时所有行可一次推理完成
+    REC_BATCH_NUM = 16
+    
     def __init__(self):
         try:
-            self.ocr = PaddleOCR(use_angle_cls=True, lang='ch', use_gpu=False, show_log=False)
+            from paddleocr import PaddleOCR
+            
+            self.ocr = PaddleOCR(
+                use_angle_cls=True,
+                lang='ch',
+                use_gpu=False,
+                show_log=False,
+                rec_batch_num=self.REC_BATCH_NUM,
+            )
         except Exception as e:
             raise RuntimeError(f"PaddleOCR初始化失败: {e}")
     
     def recognize_from_image(self, image: Union[PIL.Image.Image, str]) -> str:
-        """从图片中识别文字，包含图像预处理"""
-        # 如果传入的是文件路径，先加载图片
-        if isinstance(image, str):
-            image = PIL.Image.open(image)
-        
+        """从图片（或图片路径）中识别文字，包含图像预处理"""
+        return self.recognize_batch_detailed([image])[0].text
+    
+    def recognize_batch_detailed(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """批量识别：预处理后纵向拼接为一张图，一次检测，所有文本行按 rec_batch_num 批量识别"""
+        if not images:
+            return []
+        start = time.perf_counter()
         # 图像预处理以提高识别准确率
-        processed_image = self._preprocess_image(image)
+        processed, geometry = self._preprocess(images, profiles)
+        if len(processed) == 1:
+            canvas, bands = processed[0], [(0, processed[0].height)]
+        else:
+            canvas, bands = _stitch_vertical(processed)
+        preprocess_ms = _elapsed_ms(start)
         
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            processed_image.save(tmp_file.name)
-            tmp_path = tmp_file.name
+        start = time.perf_counter()
+        lines = self._run_ocr(canvas)
+        inference_ms = _elapsed_ms(start)
         
-        try:
-            results = self.ocr.ocr(tmp_path, cls=True)
-            text_parts = []
-            if results and results[0]:
-                for line in results[0]:
-                    text = line[1][0]
-                    confidence = line[1][1]
-                    if confidence > 0.3:  # 降低置信度阈值以提高识别率
-                        text_parts.append(text.strip())
-            
-            # 合并文本，移除多余的空白
-            result_text = ' '.join(text_parts).strip()
-            return result_text
-        finally:
-            Path(tmp_path).unlink(missing_ok=True)
+        start = time.perf_counter()
+        tokens: List[List[OCRToken]] = [[] for _ in images]
+        for box, text, confidence in lines:
+            if confidence > MIN_TOKEN_CONFIDENCE:  # 降低置信度阈值以提高识别率
+                center_y = sum(point[1] for point in box) / len(box)
+                idx = _band_index(center_y, bands)
+                scale, pad = geometry[idx]
+                tokens[idx].append(OCRToken(text.strip(), float(confidence), _scaled_box(box, scale, bands[idx][0], pad)))
+        return _build_results(tokens, self.engine_type, preprocess_ms, inference_ms, _elapsed_ms(start))
     
-    def _preprocess_image(self, image: PIL.Image.Image) -> PIL.Image.Image:
-        """图像预处理以提高OCR识别率"""
-        try:
-            from PIL import ImageEnhance, ImageFilter
-            
-            # 转换为RGB模式（如果不是）
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 1. 增强对比度
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.5)  # 适度增强对比度
-            
-            # 2. 增强锐度
-            enhancer = ImageEnhance.Sharpness(image)
-            image = enhancer.enhance(1.2)  # 适度锐化
-            
-            # 3. 如果图像太小，稍微放大
-            if image.width < 100 or image.height < 30:
-                new_width = max(image.width * 2, 100)
-                new_height = max(image.height * 2, 30)
-                image = image.resize((new_width, new_height), PIL.Image.LANCZOS)
-            
-            return image
-            
-        except Exception as e:
-            print(f"图像预处理失败: {e}，使用原图")
-            return image
+    def _run_ocr(self, image: PIL.Image.Image) -> List[Tuple[Any, str, float]]:
+        """对预处理后的图片执行检测+识别，返回 (文本框, 文本, 置信度) 列表"""
+        # 直接传入内存中的 BGR 数组，避免 PNG 编码/写盘/解码
+        results = self.ocr.ocr(image_to_array(image, 'BGR'), cls=True)
+        if not results or not results[0]:
+            return []
+        return [(line[0], line[1][0], line[1][1]) for line in results[0]]
     
     def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
-        screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+        screenshot = grab_screen((x, y, x + width, y + height))
         return self.recognize_from_image(screenshot)
     
     def save_area_screenshot(self, x: int, y: int, width: int, height: int, save_path: str) -> bool:
         try:
-            screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+            screenshot = grab_screen((x, y, x + width, y + height))
             screenshot.save(save_path)
             return True
         except Exception as e:
@@ -163,75 +468,71 @@ class PaddleOCREngine(BaseOCREngine):
 class EasyOCREngine(BaseOCREngine):
     """EasyOCR引擎"""
     
+    engine_type = "easyocr"
+    # EasyOCR 识别模型输入高度
+    target_height = 64
+    
     def __init__(self):
         try:
+            import easyocr
+            
             self.reader = easyocr.Reader(['ch_sim', 'en'], gpu=False)
         except Exception as e:
             raise RuntimeError(f"EasyOCR初始化失败: {e}")
     
     def recognize_from_image(self, image: Union[PIL.Image.Image, str]) -> str:
-        """从图片中识别文字，包含图像预处理"""
-        # 如果传入的是文件路径，先加载图片
-        if isinstance(image, str):
-            image = PIL.Image.open(image)
+        """从图片（或图片路径）中识别文字，包含图像预处理"""
+        return self.recognize_batch_detailed([image])[0].text
+    
+    def recognize_batch_detailed(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """批量识别：各图片填充到相同尺寸后交给 readtext_batched 一次推理"""
+        if not images:
+            return []
         
+        start = time.perf_counter()
         # 图像预处理以提高识别准确率
-        processed_image = self._preprocess_image(image)
+        processed, geometry = self._preprocess(images, profiles)
+        if len(processed) == 1:
+            # 直接传入内存中的 RGB 数组（与 readtext 读取文件后的排列一致），避免 PNG 编码/写盘/解码
+            batch = [image_to_array(processed[0], 'RGB')]
+        else:
+            # readtext_batched 要求所有图片尺寸一致，用白色在右侧/下方填充而不是缩放，避免文字变形
+            width = max(img.width for img in processed)
+            height = max(img.height for img in processed)
+            batch = []
+            for img in processed:
+                canvas = PIL.Image.new('RGB', (width, height), (255, 255, 255))
+                canvas.paste(img, (0, 0))
+                batch.append(image_to_array(canvas, 'RGB'))
+        preprocess_ms = _elapsed_ms(start)
         
-        with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-            processed_image.save(tmp_file.name)
-            tmp_path = tmp_file.name
+        start = time.perf_counter()
+        if len(batch) == 1:
+            results = [self.reader.readtext(batch[0])]
+        else:
+            results = self.reader.readtext_batched(batch, batch_size=len(batch))
+        inference_ms = _elapsed_ms(start)
         
-        try:
-            results = self.reader.readtext(tmp_path)
-            text_parts = []
-            for (bbox, text, confidence) in results:
-                # 过滤低置信度的结果
-                if confidence > 0.3:  # 降低置信度阈值
-                    text_parts.append(text.strip())
-            
-            # 合并文本，移除多余的空白
-            result_text = ' '.join(text_parts).strip()
-            return result_text
-        finally:
-            Path(tmp_path).unlink(missing_ok=True)
-    
-    def _preprocess_image(self, image: PIL.Image.Image) -> PIL.Image.Image:
-        """图像预处理以提高OCR识别率"""
-        try:
-            from PIL import ImageEnhance, ImageFilter
-            
-            # 转换为RGB模式（如果不是）
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 1. 增强对比度
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.5)  # 适度增强对比度
-            
-            # 2. 增强锐度
-            enhancer = ImageEnhance.Sharpness(image)
-            image = enhancer.enhance(1.2)  # 适度锐化
-            
-            # 3. 如果图像太小，稍微放大
-            if image.width < 100 or image.height < 30:
-                new_width = max(image.width * 2, 100)
-                new_height = max(image.height * 2, 30)
-                image = image.resize((new_width, new_height), PIL.Image.LANCZOS)
-            
-            return image
-            
-        except Exception as e:
-            print(f"图像预处理失败: {e}，使用原图")
-            return image
+        start = time.perf_counter()
+        tokens: List[List[OCRToken]] = []
+        for image_results, (scale, pad) in zip(results, geometry):
+            # 过滤低置信度的结果
+            tokens.append([
+                OCRToken(text.strip(), float(confidence), _scaled_box(bbox, scale, 0.0, pad))
+                for (bbox, text, confidence) in image_results
+                if confidence > MIN_TOKEN_CONFIDENCE
+            ])
+        return _build_results(tokens, self.engine_type, preprocess_ms, inference_ms, _elapsed_ms(start))
     
     def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
-        screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+        screenshot = grab_screen((x, y, x + width, y + height))
         return self.recognize_from_image(screenshot)
     
     def save_area_screenshot(self, x: int, y: int, width: int, height: int, save_path: str) -> bool:
         try:
-            screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+            screenshot = grab_screen((x, y, x + width, y + height))
             screenshot.save(save_path)
             return True
         except Exception as e:
@@ -239,29 +540,77 @@ class EasyOCREngine(BaseOCREngine):
             return False
 
 
+def _join_words(tokens: Sequence[OCRToken]) -> str:
+    """Tesseract 按词输出，中文常被拆成单字：只在两侧都是ASCII字母数字时保留空格"""
+    text = ""
+    for token in tokens:
+        if text and text[-1].isascii() and text[-1].isalnum() and token.text[:1].isascii() and token.text[:1].isalnum():
+            text += " "
+        text += token.text
+    return text.strip()
+
+
 class TesseractEngine(BaseOCREngine):
     """Tesseract引擎"""
     
+    engine_type = "tesseract"
+    # LSTM 模型在字高约 30px 以上时效果较好
+    target_height = 48
+    
     def __init__(self):
         try:
+            import pytesseract
+            
             pytesseract.get_tesseract_version()
         except:
             raise RuntimeError("Tesseract-OCR引擎未安装或未配置")
+        self.pytesseract = pytesseract
     
     def recognize_from_image(self, image: PIL.Image.Image) -> str:
+        return self.recognize_batch_detailed([image])[0].text
+    
+    def recognize_batch_detailed(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """批量识别：纵向拼接为一张图只调用一次 Tesseract，再按单词位置分回各区域"""
+        if not images:
+            return []
+        start = time.perf_counter()
+        processed, geometry = self._preprocess(images, profiles)
+        if len(processed) == 1:
+            canvas, bands = processed[0], [(0, processed[0].height)]
+        else:
+            canvas, bands = _stitch_vertical(processed)
+        preprocess_ms = _elapsed_ms(start)
+        
+        start = time.perf_counter()
         try:
-            text = pytesseract.image_to_string(image, lang='chi_sim+eng')
-            return text.strip()
+            data = self.pytesseract.image_to_data(canvas, lang='chi_sim+eng', output_type=self.pytesseract.Output.DICT)
         except Exception as e:
             raise RuntimeError(f"OCR识别失败: {e}")
+        inference_ms = _elapsed_ms(start)
+        
+        start = time.perf_counter()
+        tokens: List[List[OCRToken]] = [[] for _ in images]
+        for text, conf, left, top, width, height in zip(
+            data['text'], data['conf'], data['left'], data['top'], data['width'], data['height']
+        ):
+            if not text or not text.strip():
+                continue
+            idx = _band_index(top + height / 2, bands)
+            scale, pad = geometry[idx]
+            box = [(left, top), (left + width, top), (left + width, top + height), (left, top + height)]
+            # Tesseract 置信度为 0-100，非文字块为 -1
+            tokens[idx].append(OCRToken(text.strip(), max(0.0, float(conf)) / 100, _scaled_box(box, scale, bands[idx][0], pad)))
+        return _build_results(tokens, self.engine_type, preprocess_ms, inference_ms, _elapsed_ms(start), join=_join_words)
     
     def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
-        screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+        screenshot = grab_screen((x, y, x + width, y + height))
         return self.recognize_from_image(screenshot)
     
     def save_area_screenshot(self, x: int, y: int, width: int, height: int, save_path: str) -> bool:
         try:
-            screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+            screenshot = grab_screen((x, y, x + width, y + height))
             screenshot.save(save_path)
             return True
         except Exception as e:
@@ -269,6 +618,677 @@ class TesseractEngine(BaseOCREngine):
             return False
 
 
+# 引擎类型 -> 实现类，自动选择时按 ENGINE_PRIORITY 的顺序尝试
+ENGINE_CLASSES = {
+    'paddle': PaddleOCREngine,
+    'easyocr': EasyOCREngine,
+    'tesseract': TesseractEngine,
+}
+ENGINE_PRIORITY = ['paddle', 'easyocr', 'tesseract']
+
+
+def create_backend(engine_type: str) -> BaseOCREngine:
+    """创建指定类型的底层引擎实例（会加载模型），未知类型抛出 ValueError"""
+    if engine_type not in ENGINE_CLASSES:
+        raise ValueError(f"未知的OCR引擎类型: {engine_type}")
+    return ENGINE_CLASSES[engine_type]()
+
+
+# 单个引擎实例的大致内存占用（MB），用于按可用内存限制引擎池大小
+ENGINE_MEMORY_MB = {
+    'paddle': 600,
+    'easyocr': 900,
+    'tesseract': 60,
+}
+
+
+def available_memory_mb() -> Optional[int]:
+    """当前可用物理内存（MB），无法获取时返回None"""
+    try:
+        import psutil  # type: ignore
+        return int(psutil.virtual_memory().available // (1024 * 1024))
+    except ImportError:
+        pass
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+            
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return int(status.ullAvailPhys // (1024 * 1024))
+            return None
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except Exception:
+        pass
+    return None
+
+
+def process_rss_mb() -> Optional[float]:
+    """当前进程的常驻内存（MB），无法获取时返回None"""
+    try:
+        import psutil  # type: ignore
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+            from ctypes import wintypes
+            
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [
+                    ('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t),
+                ]
+            
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize / (1024 * 1024)
+            return None
+        with open('/proc/self/statm', encoding='ascii') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except Exception:
+        pass
+    return None
+
+
+# 引擎池扩容失败后暂停扩容的秒数，连续失败时加倍，不超过上限
+POOL_GROW_BACKOFF_S = 30.0
+POOL_GROW_BACKOFF_MAX_S = 600.0
+
+
+class OCREnginePool:
+    """
+    同一种引擎的多个实例组成的有界池
+    
+    每个底层引擎实例同一时刻只借给一个线程；空闲实例不足时由 grow_async() 在后台创建
+    新实例，借出方等待归还或新实例，识别路径上不加载模型。实例数不超过 max_size，
+    且创建前须保证剩余可用内存不低于 reserve_mb；设置了 budget_mb 时，本进程常驻内存
+    加上新实例的占用也不能超过预算。创建失败后暂停扩容一段时间再重试。
+    checkout/checkin 可在任意线程调用。
+    """
+    
+    def __init__(
+        self,
+        engine_type: str,
+        first: Optional[BaseOCREngine] = None,
+        max_size: int = 1,
+        reserve_mb: int = 1024,
+        budget_mb: int = 0,
+    ):
+        self.engine_type = engine_type
+        self.max_size = max(1, max_size)
+        self.reserve_mb = reserve_mb
+        self.budget_mb = budget_mb
+        self._cond = threading.Condition()
+        self._idle: List[BaseOCREngine] = []
+        self._size = 0
+        self._creating = 0
+        self._closed = False
+        if first is not None:
+            self._idle.append(first)
+            self._size = 1
+        
+        self.checkouts = 0
+        self.waits = 0
+        self.grow_failures = 0
+        # 连续扩容失败次数，以及在此之前不再尝试扩容的时刻
+        self._failure_streak = 0
+        self._grow_after = 0.0
+    
+    def _memory_allows_growth(self) -> bool:
+        needed = ENGINE_MEMORY_MB.get(self.engine_type, 500)
+        if self.budget_mb and self._size:
+            resident = process_rss_mb()
+            if resident is not None and resident + needed > self.budget_mb:
+                return False
+        available = available_memory_mb()
+        if available is None:
+            return True
+        return available - needed >= self.reserve_mb
+    
+    def _can_grow(self) -> bool:
+        return (
+            not self._closed
+            and self._size + self._creating < self.max_size
+            and time.monotonic() >= self._grow_after
+            and self._memory_allows_growth()
+        )
+    
+    def _create(self) -> Optional[BaseOCREngine]:
+        """创建一个新实例（调用前已占用 _creating 计数），失败时暂停扩容一段时间"""
+        try:
+            engine = create_backend(self.engine_type)
+        except Exception as e:
+            with self._cond:
+                self._creating -= 1
+                self.grow_failures += 1
+                self._failure_streak += 1
+                backoff = min(POOL_GROW_BACKOFF_MAX_S, POOL_GROW_BACKOFF_S * 2 ** (self._failure_streak - 1))
+                self._grow_after = time.monotonic() + backoff
+                self._cond.notify_all()
+            warnings.warn(f"OCR引擎池扩容失败，{backoff:.0f} 秒内不再扩容: {e}")
+            return None
+        with self._cond:
+            self._creating -= 1
+            self._size += 1
+            self._failure_streak = 0
+        print(f"OCR引擎池扩容: {self.engine_type} x{self._size}")
+        return engine
+    
+    def checkout(self, timeout: Optional[float] = None) -> BaseOCREngine:
+        """借出一个空闲实例；没有空闲实例时等待归还或后台扩容的新实例，不在当前线程加载模型"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waited = False
+            while not self._idle:
+                if self._closed:
+                    raise RuntimeError("OCR引擎已卸载")
+                if self._size == 0 and self._creating == 0:
+                    raise RuntimeError(f"OCR引擎池中没有可用的 {self.engine_type} 实例")
+                if not waited:
+                    self.waits += 1
+                    waited = True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("等待空闲OCR引擎超时")
+                self._cond.wait(remaining)
+            self.checkouts += 1
+            return self._idle.pop()
+    
+    def checkin(self, engine: BaseOCREngine) -> None:
+        """归还实例；池已关闭时直接丢弃"""
+        with self._cond:
+            if self._closed:
+                self._size = max(0, self._size - 1)
+                return
+            self._idle.append(engine)
+            self._cond.notify()
+    
+    def shrink(self, keep: int = 1, preserve: Optional[BaseOCREngine] = None) -> int:
+        """释放空闲实例直到总数不超过 keep（preserve 指定的实例保留），返回释放的实例数"""
+        released = 0
+        with self._cond:
+            for engine in list(self._idle):
+                if self._size <= keep:
+                    break
+                if engine is preserve:
+                    continue
+                self._idle.remove(engine)
+                self._size -= 1
+                released += 1
+        return released
+    
+    def close(self) -> None:
+        """卸载：释放全部空闲实例，借出的实例归还时丢弃，之后不再借出"""
+        with self._cond:
+            self._closed = True
+            self._size -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+    
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        engine = self.checkout(timeout)
+        try:
+            yield engine
+        finally:
+            self.checkin(engine)
+    
+    def grow_async(self) -> None:
+        """在后台线程中创建一个实例，创建后归还到池中，等待中的借出方可以直接使用；不阻塞当前识别"""
+        with self._cond:
+            if not self._can_grow():
+                return
+            self._creating += 1
+        
+        def _grow() -> None:
+            engine = self._create()
+            if engine is not None:
+                self.checkin(engine)
+        
+        threading.Thread(target=_grow, name="ocr-pool-grow", daemon=True).start()
+    
+    def idle_count(self) -> int:
+        with self._cond:
+            return len(self._idle)
+    
+    def in_use(self) -> int:
+        """当前借出的实例数"""
+        with self._cond:
+            return self._size - len(self._idle)
+    
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "max_size": self.max_size,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "grow_failures": self.grow_failures,
+            }
+
+
+# 引擎池的最大实例数，由 configure_ocr_pool() 设置，对之后创建的 OCREngine 生效
+_pool_max_size = 1
+
+# 引擎所在进程的常驻内存预算（MB），0 表示不限制；由 configure_ocr_memory_budget() 设置
+_memory_budget_mb = 0
+
+
+def configure_ocr_pool(max_size: int) -> None:
+    """设置每个OCREngine的引擎池最大实例数（实际上限还受可用内存限制）"""
+    global _pool_max_size
+    _pool_max_size = max(1, max_size)
+
+
+def configure_ocr_memory_budget(budget_mb: int) -> None:
+    """设置引擎所在进程的常驻内存预算，超出预算时引擎池不再扩容"""
+    global _memory_budget_mb
+    _memory_budget_mb = max(0, budget_mb)
+    engine = _ocr_engine
+    if engine is not None and getattr(engine, "pool", None) is not None:
+        engine.pool.budget_mb = _memory_budget_mb
+
+
+# 磁盘缓存文件名，位于配置目录（独立进程模式下为工作进程的 workdir），需在配置中开启
+OCR_CACHE_FILE = "ocr_cache.db"
+
+
+class OCRResultCache:
+    """
+    OCR识别结果缓存 - 以截图像素内容寻址
+    
+    键由截图原始像素的哈希、引擎名称和预处理方案组成，像素不变的字段
+    只需一次截屏和一次哈希即可得到结果。内存层为有容量上限的LRU，
+    可选的磁盘层（SQLite）在程序重启后依然有效。
+    """
+    
+    def __init__(
+        self,
+        max_entries: int = 256,
+        disk_path: Optional[Union[str, Path]] = None,
+        disk_max_entries: int = 5000,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.disk_max_entries = max(1, disk_max_entries)
+        self._memory: "OrderedDict[str, OCRResult]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self.disk_evictions = 0
+        
+        if disk_path:
+            self._open_disk(Path(disk_path))
+    
+    @staticmethod
+    def make_key(image: PIL.Image.Image, engine_name: str, profile: str) -> str:
+        """根据截图原始像素、引擎名称和预处理方案生成缓存键"""
+        digest = hashlib.blake2b(image.tobytes(), digest_size=16).hexdigest()
+        return f"{engine_name}|{profile}|{image.mode}|{image.width}x{image.height}|{digest}"
+    
+    def _open_disk(self, path: Path) -> None:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(str(path), check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_results (key TEXT PRIMARY KEY, payload TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_used ON ocr_results (last_used)")
+            db.commit()
+            self._db = db
+        except sqlite3.Error as e:
+            print(f"OCR磁盘缓存不可用: {e}")
+            self._db = None
+    
+    def _disk_failed(self, error: Exception) -> None:
+        print(f"OCR磁盘缓存读写失败，已停用磁盘缓存: {error}")
+        try:
+            self._db.close()
+        except Exception:
+            pass
+        self._db = None
+    
+    def _remember(self, key: str, result: OCRResult) -> None:
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+    
+    @staticmethod
+    def _hit(result: OCRResult) -> OCRResult:
+        """命中时返回副本：标记为缓存结果，不带原始识别的耗时"""
+        return replace(result, tokens=list(result.tokens), timings={}, cached=True)
+    
+    def get(self, key: str) -> Optional[OCRResult]:
+        """查询缓存，未命中返回 None"""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._hit(result)
+            
+            if self._db is not None:
+                try:
+                    row = self._db.execute("SELECT payload FROM ocr_results WHERE key = ?", (key,)).fetchone()
+                    if row is not None:
+                        self._db.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                        self.hits += 1
+                        self.disk_hits += 1
+                        result = OCRResult.from_dict(json.loads(row[0]))
+                        self._remember(key, result)
+                        return self._hit(result)
+                except (sqlite3.Error, ValueError) as e:
+                    self._disk_failed(e)
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, result: OCRResult) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._remember(key, replace(result, tokens=list(result.tokens), timings={}, cached=False))
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, payload, last_used) VALUES (?, ?, ?)",
+                    (key, json.dumps(result.to_dict(), ensure_ascii=False), time.time()),
+                )
+                overflow = self._db.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0] - self.disk_max_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM ocr_results WHERE key IN (SELECT key FROM ocr_results ORDER BY last_used LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.disk_evictions += overflow
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._disk_failed(e)
+    
+    def clear(self) -> None:
+        """清空内存和磁盘缓存（计数器保留）"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM ocr_results")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    self._disk_failed(e)
+    
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中/淘汰计数"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "disk_hits": self.disk_hits,
+                "disk_evictions": self.disk_evictions,
+                "entries": len(self._memory),
+            }
+
+
+_ocr_cache = OCRResultCache()
+
+
+def get_ocr_cache() -> OCRResultCache:
+    """获取全局OCR识别结果缓存"""
+    return _ocr_cache
+
+
+def configure_ocr_cache(
+    max_entries: int = 256,
+    disk_path: Optional[Union[str, Path]] = None,
+    disk_max_entries: int = 5000,
+) -> OCRResultCache:
+    """
+    重新配置全局OCR识别结果缓存
+    
+    Args:
+        max_entries: 内存LRU最多保存的条目数
+        disk_path: 磁盘缓存文件路径，为None时不启用磁盘层
+        disk_max_entries: 磁盘缓存最多保存的条目数
+    """
+    global _ocr_cache
+    old_cache = _ocr_cache
+    _ocr_cache = OCRResultCache(max_entries=max_entries, disk_path=disk_path, disk_max_entries=disk_max_entries)
+    old_cache.close()
+    return _ocr_cache
+
+
+# 整页识别使用的预处理方案：一张图里有多行不同高度的文字，不做高度归一（见 ocr_preprocess.PRESETS）
+FORM_PROFILE = "form"
+
+# 整页截图在字段外接矩形四周额外截取的像素；文本框略超出字段区域时也按该距离放宽归属判断
+FORM_MARGIN = 16
+
+# 文本框落在字段区域内的面积比例不低于该值时归入该字段
+FORM_MIN_OVERLAP = 0.5
+
+# 标签与值之间的分隔符，如“姓名：张三”
+_LABEL_SEPARATORS = ":："
+
+
+def _token_bbox(token: OCRToken) -> Tuple[float, float, float, float]:
+    xs = [p[0] for p in token.box]
+    ys = [p[1] for p in token.box]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _overlap_ratio(bbox: Tuple[float, float, float, float], rect: Tuple[int, int, int, int]) -> float:
+    """文本框落在 rect 内的面积占文本框面积的比例"""
+    left, top, right, bottom = rect
+    if right <= left or bottom <= top:
+        return 0.0
+    width = min(bbox[2], right) - max(bbox[0], left)
+    height = min(bbox[3], bottom) - max(bbox[1], top)
+    if width <= 0 or height <= 0:
+        return 0.0
+    area = (bbox[2] - bbox[0]) * (bbox[3] - bbox[1])
+    return width * height / area if area > 0 else 1.0
+
+
+def _split_label(text: str, labels: Sequence[str]) -> Tuple[Optional[int], str]:
+    """
+    识别“标签:值”形式的文字，返回 (字段序号, 值)；只有标签时值为空，不是标签时序号为None
+
+    只有紧跟分隔符或整段就是标签时才视为标签，避免把“诊疗间2”这类以标签开头的值截断。
+    """
+    best: Tuple[Optional[int], str] = (None, "")
+    best_len = 0
+    for idx, label in enumerate(labels):
+        if not label or len(label) <= best_len or not text.startswith(label):
+            continue
+        rest = text[len(label):]
+        if not rest or rest[0] in _LABEL_SEPARATORS:
+            best, best_len = (idx, rest.lstrip(_LABEL_SEPARATORS)), len(label)
+    return best
+
+
+def _reading_order(tokens: Sequence[OCRToken]) -> List[OCRToken]:
+    """按行（纵向中心相差不超过半个字高）从上到下、行内从左到右排序"""
+    lines: List[Tuple[float, List[OCRToken]]] = []
+    for token in sorted(tokens, key=lambda t: (_token_bbox(t)[1] + _token_bbox(t)[3]) / 2):
+        _, top, _, bottom = _token_bbox(token)
+        center = (top + bottom) / 2
+        if lines and abs(center - lines[-1][0]) <= max(1.0, (bottom - top) / 2):
+            lines[-1][1].append(token)
+        else:
+            lines.append((center, [token]))
+    return [token for _, line in lines for token in sorted(line, key=lambda t: _token_bbox(t)[0])]
+
+
+def assign_tokens_to_fields(
+    tokens: Sequence[OCRToken],
+    rects: Sequence[Region],
+    labels: Optional[Sequence[str]] = None,
+    tolerance: int = FORM_MARGIN,
+) -> List[List[OCRToken]]:
+    """
+    把整页识别出的文字按位置分配给各字段
+
+    依次尝试：
+    1. “标签:值”形式的文字去掉标签后归入对应字段；单独的标签只记下位置
+    2. 文本框落在某个字段区域内的面积比例最大且不低于 FORM_MIN_OVERLAP
+    3. 字段区域四周放宽 tolerance 像素后再按 2 判断
+    4. 仍没有文字的字段，取其标签右侧同一行最近的未分配文字
+
+    Args:
+        tokens: 整页识别结果，文本框坐标相对于整页截图
+        rects: 字段区域，坐标与文本框相同
+        labels: 与 rects 对应的字段标签（通常为字段名），为None时只按位置分配
+        tolerance: 放宽判断时字段区域向四周扩展的像素
+
+    Returns:
+        与 rects 顺序一致的文字列表，已按阅读顺序排列
+    """
+    boxes = [_region_bbox(rect) for rect in rects]
+    widened = [(l - tolerance, t - tolerance, r + tolerance, b + tolerance) for l, t, r, b in boxes]
+    names = ["".join(label.split()).rstrip(_LABEL_SEPARATORS) for label in labels] if labels else []
+    assigned: List[List[OCRToken]] = [[] for _ in rects]
+    label_boxes: Dict[int, Tuple[float, float, float, float]] = {}
+    leftovers: List[OCRToken] = []
+
+    for token in tokens:
+        if not token.box or not boxes:
+            continue
+        idx, value = _split_label("".join(token.text.split()), names)
+        if idx is not None:
+            if value:
+                assigned[idx].append(replace(token, text=value))
+            else:
+                label_boxes[idx] = _token_bbox(token)
+            continue
+        bbox = _token_bbox(token)
+        for candidates in (boxes, widened):
+            overlaps = [_overlap_ratio(bbox, rect) for rect in candidates]
+            best = max(range(len(overlaps)), key=overlaps.__getitem__)
+            if overlaps[best] >= FORM_MIN_OVERLAP:
+                assigned[best].append(token)
+                break
+        else:
+            leftovers.append(token)
+
+    for idx, (label_left, label_top, label_right, label_bottom) in label_boxes.items():
+        if assigned[idx] or not leftovers:
+            continue
+        center = (label_top + label_bottom) / 2
+        half_height = max(1.0, (label_bottom - label_top) / 2)
+        same_line = [
+            token for token in leftovers
+            if _token_bbox(token)[0] >= label_right - tolerance
+            and abs((_token_bbox(token)[1] + _token_bbox(token)[3]) / 2 - center) <= half_height
+        ]
+        if same_line:
+            nearest = min(same_line, key=lambda t: _token_bbox(t)[0])
+            assigned[idx].append(nearest)
+            leftovers.remove(nearest)
+
+    return [_reading_order(group) for group in assigned]
+
+
+def split_form_result(
+    page: OCRResult,
+    rects: Sequence[Region],
+    labels: Optional[Sequence[str]] = None,
+    tolerance: int = FORM_MARGIN,
+) -> List[OCRResult]:
+    """把整页识别结果拆分为各字段的结果，各字段共享整页的耗时，batch_size 为字段数"""
+    join = _join_words if page.engine == "tesseract" else _join_tokens
+    return [
+        OCRResult(
+            text=join(tokens),
+            tokens=tokens,
+            engine=page.engine,
+            timings=dict(page.timings),
+            batch_size=len(rects),
+            cached=page.cached,
+        )
+        for tokens in assign_tokens_to_fields(page.tokens, rects, labels, tolerance)
+    ]
+
+
+def recognize_form_regions(
+    engine: Any,
+    rects: Sequence[Region],
+    labels: Optional[Sequence[str]] = None,
+    margin: int = FORM_MARGIN,
+) -> List[OCRResult]:
+    """
+    整页识别：对所有字段区域的外接矩形截屏一次、检测识别一次，再按位置分配给各字段
+
+    engine 只需提供 recognize_images_detailed，OCREngine 和 RemoteOCREngine 共用本函数。
+    """
+    boxes = [_region_bbox(rect) for rect in rects]
+    valid = [b for b in boxes if b[2] > b[0] and b[3] > b[1]]
+    if not valid:
+        return [OCRResult(engine=engine.engine_name) for _ in rects]
+    union = (
+        max(0, min(b[0] for b in valid) - margin),
+        max(0, min(b[1] for b in valid) - margin),
+        max(b[2] for b in valid) + margin,
+        max(b[3] for b in valid) + margin,
+    )
+    start = time.perf_counter()
+    frame = grab_screen(union)
+    capture_ms = _elapsed_ms(start)
+
+    page = engine.recognize_images_detailed([frame], profiles=[FORM_PROFILE])[0]
+    local = [
+        (left - union[0], top - union[1], right - left, bottom - top)
+        for left, top, right, bottom in boxes
+    ]
+    results = split_form_result(page, local, labels, margin)
+    for result in results:
+        result.timings["capture"] = capture_ms
+    return results
+
+
 class OCREngine:
     """智能OCR引擎 - 自动选择最佳引擎"""
     
@@ -281,37 +1301,29 @@ class OCREngine:
         """
         self.engine = None
         self.engine_name = None
+        # 底层引擎实例不保证线程安全，推理前须从引擎池借出一个独占的实例
+        self.pool: Optional[OCREnginePool] = None
+        self._fanout_executor: Optional[ThreadPoolExecutor] = None
         
         if not PIL_AVAILABLE:
             raise RuntimeError("Pillow库不可用，OCR功能无法使用")
         
         # 如果指定了优先引擎，尝试使用它
-        if preferred_engine and preferred_engine in OCR_ENGINES:
+        if preferred_engine and _engine_available(preferred_engine):
             try:
-                if preferred_engine == 'paddle':
-                    self.engine = PaddleOCREngine()
-                elif preferred_engine == 'easyocr':
-                    self.engine = EasyOCREngine()
-                elif preferred_engine == 'tesseract':
-                    self.engine = TesseractEngine()
-                
+                self.engine = create_backend(preferred_engine)
                 self.engine_name = preferred_engine
                 print(f"使用OCR引擎: {OCR_ENGINES[preferred_engine]['description']}")
+                self._init_pool()
                 return
             except Exception as e:
                 warnings.warn(f"{OCR_ENGINES[preferred_engine]['engine']}初始化失败: {e}")
         
         # 按优先级尝试各个引擎
-        for engine_type in ['paddle', 'easyocr', 'tesseract']:
-            if engine_type in OCR_ENGINES:
+        for engine_type in ENGINE_PRIORITY:
+            if _engine_available(engine_type):
                 try:
-                    if engine_type == 'paddle':
-                        self.engine = PaddleOCREngine()
-                    elif engine_type == 'easyocr':
-                        self.engine = EasyOCREngine()
-                    elif engine_type == 'tesseract':
-                        self.engine = TesseractEngine()
-                    
+                    self.engine = create_backend(engine_type)
                     self.engine_name = engine_type
                     print(f"使用OCR引擎: {OCR_ENGINES[engine_type]['description']}")
                     break
@@ -323,25 +1335,179 @@ class OCREngine:
         if self.engine is None:
             warnings.warn("没有可用的OCR引擎，将使用空引擎（所有识别返回空字符串）")
             self.engine_name = "none"
+        else:
+            self._init_pool()
     
-    def recognize_from_image(self, image: PIL.Image.Image) -> str:
+    def _init_pool(self) -> None:
+        self.pool = OCREnginePool(
+            self.engine_name, first=self.engine, max_size=_pool_max_size, budget_mb=_memory_budget_mb
+        )
+        if self.pool.max_size > 1:
+            self._fanout_executor = ThreadPoolExecutor(
+                max_workers=self.pool.max_size, thread_name_prefix="ocr-fanout"
+            )
+    
+    def _infer(
+        self, images: Sequence[PIL.Image.Image], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """
+        对缓存未命中的图片推理
+        
+        池中有多个空闲实例时，把字段分组并行送入不同实例；需求超过空闲实例时在后台扩容，
+        扩容出的实例先归还到池中，等待中的借出方可以直接使用，本次识别不加载模型。
+        """
+        mark_ocr_activity()
+        profiles = list(profiles) if profiles else [None] * len(images)
+        workers = min(len(images), self.pool.idle_count())
+        if workers < len(images):
+            self.pool.grow_async()
+        if workers <= 1 or self._fanout_executor is None:
+            with self.pool.lease() as backend:
+                results = backend.recognize_batch_detailed(images, profiles)
+        else:
+            def _run_chunk(chunk: Tuple[Sequence[PIL.Image.Image], Sequence[Optional[str]]]) -> List[OCRResult]:
+                with self.pool.lease() as backend:
+                    return backend.recognize_batch_detailed(*chunk)
+            
+            size = -(-len(images) // workers)
+            chunks = [(images[i:i + size], profiles[i:i + size]) for i in range(0, len(images), size)]
+            results = []
+            for part in self._fanout_executor.map(_run_chunk, chunks):
+                results.extend(part)
+        for result in results:
+            result.engine = self.engine_name
+        return results
+    
+    def recognize_from_image(self, image: PIL.Image.Image, profile: Optional[str] = None) -> str:
         """从图片中识别文字"""
         if self.engine is None:
             return ""
-        return self.engine.recognize_from_image(image)
+        return self._infer([image], [profile])[0].text
     
     def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
         """从屏幕指定区域识别文字"""
         if self.engine is None:
             return ""
-        return self.engine.recognize_from_screen_area(x, y, width, height)
+        return self.recognize_regions([(x, y, width, height)])[0]
+    
+    def recognize_images(
+        self,
+        images: Sequence[PIL.Image.Image],
+        use_cache: bool = True,
+        profiles: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[str]:
+        """批量识别多张图片，结果顺序与输入一致"""
+        return [result.text for result in self.recognize_images_detailed(images, use_cache, profiles)]
+    
+    def recognize_images_detailed(
+        self,
+        images: Sequence[PIL.Image.Image],
+        use_cache: bool = True,
+        profiles: Optional[Sequence[Optional[str]]] = None,
+    ) -> List[OCRResult]:
+        """
+        批量识别多张图片，返回结构化结果，顺序与输入一致
+        
+        像素内容相同且预处理方案相同的图片直接返回缓存结果，只有未命中的图片才送入引擎批量推理。
+        
+        Args:
+            images: 字段截图
+            use_cache: 是否使用识别结果缓存
+            profiles: 与 images 对应的预处理方案（见 ocr_preprocess），为None时使用默认预设
+        """
+        if self.engine is None:
+            return [OCRResult(engine=self.engine_name) for _ in images]
+        mark_ocr_activity()
+        profiles = list(profiles) if profiles else [None] * len(images)
+        if not use_cache:
+            return self._infer(images, profiles)
+        
+        start = time.perf_counter()
+        cache = get_ocr_cache()
+        keys = [
+            cache.make_key(image, self.engine_name, self.engine.profile_id(profile))
+            for image, profile in zip(images, profiles)
+        ]
+        results: List[Optional[OCRResult]] = [cache.get(key) for key in keys]
+        lookup_ms = _elapsed_ms(start) / max(1, len(images))
+        
+        missing = [idx for idx, result in enumerate(results) if result is None]
+        fresh: List[OCRResult] = []
+        if missing:
+            fresh = self._infer([images[idx] for idx in missing], [profiles[idx] for idx in missing])
+        for idx, result in zip(missing, fresh):
+            results[idx] = result
+            cache.put(keys[idx], result)
+        for result in results:
+            result.timings["cache"] = lookup_ms
+        return results
+    
+    def recognize_regions(
+        self, rects: Sequence[Region], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[str]:
+        """
+        一次截屏、一次批量推理识别多个屏幕区域
+        
+        Args:
+            rects: 区域列表，元素为 Rect 或 (x, y, width, height)
+            profiles: 与 rects 对应的预处理方案，为None时使用默认预设
+            
+        Returns:
+            与 rects 顺序一致的识别文字列表，无效区域返回空字符串
+        """
+        return [result.text for result in self.recognize_regions_detailed(rects, profiles)]
+    
+    def recognize_regions_detailed(
+        self, rects: Sequence[Region], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[OCRResult]:
+        """一次截屏、一次批量推理识别多个屏幕区域，返回结构化结果，无效区域返回空结果"""
+        if not rects:
+            return []
+        if self.engine is None:
+            return [OCRResult(engine=self.engine_name) for _ in rects]
+        profiles = list(profiles) if profiles else [None] * len(rects)
+        
+        start = time.perf_counter()
+        crops = grab_regions(rects)
+        capture_ms = _elapsed_ms(start)
+        
+        valid = [idx for idx, crop in enumerate(crops) if crop is not None]
+        results = [OCRResult(engine=self.engine_name, timings={"capture": capture_ms}) for _ in rects]
+        if valid:
+            detailed = self.recognize_images_detailed(
+                [crops[idx] for idx in valid], profiles=[profiles[idx] for idx in valid]
+            )
+            for idx, result in zip(valid, detailed):
+                result.timings["capture"] = capture_ms
+                results[idx] = result
+        return results
+    
+    def recognize_form(
+        self, rects: Sequence[Region], labels: Optional[Sequence[str]] = None
+    ) -> List[OCRResult]:
+        """
+        整页识别多个屏幕区域：对外接矩形只做一次文字检测和识别，再按文本框位置和
+        “标签:值”关系把文字分配给各字段
+        
+        Args:
+            rects: 区域列表，元素为 Rect 或 (x, y, width, height)
+            labels: 与 rects 对应的字段标签（通常为字段名），为None时只按位置分配
+            
+        Returns:
+            与 rects 顺序一致的识别结果，没有分配到文字的字段返回空结果
+        """
+        if not rects:
+            return []
+        if self.engine is None:
+            return [OCRResult(engine=self.engine_name) for _ in rects]
+        return recognize_form_regions(self, rects, labels)
     
     def save_area_screenshot(self, x: int, y: int, width: int, height: int, save_path: str) -> bool:
         """保存屏幕指定区域的截图"""
         if self.engine is None:
             # 即使没有OCR引擎，也可以保存截图
             try:
-                screenshot = PIL.ImageGrab.grab(bbox=(x, y, x + width, y + height))
+                screenshot = grab_screen((x, y, x + width, y + height))
                 screenshot.save(save_path)
                 return True
             except Exception:
@@ -356,42 +1522,379 @@ class OCREngine:
             return OCR_ENGINES[self.engine_name].copy()
         return {}
     
+    def trim_pool(self) -> int:
+        """释放引擎池中除主实例外的空闲实例，返回释放的实例数"""
+        if self.pool is None:
+            return 0
+        return self.pool.shrink(1, preserve=self.engine)
+    
+    def release(self) -> None:
+        """卸载模型：释放全部引擎实例，正在进行的识别结束后其实例随之释放"""
+        if self._fanout_executor is not None:
+            self._fanout_executor.shutdown(wait=False)
+            self._fanout_executor = None
+        if self.pool is not None:
+            self.pool.close()
+        self.engine = None
+    
+    def warm_up(self) -> None:
+        """用一张合成的小图跑一次完整推理，让首次真实识别不再承担模型的延迟初始化"""
+        if self.engine is None:
+            return
+        image = PIL.Image.new('RGB', (160, 40), (255, 255, 255))
+        PIL.ImageDraw.Draw(image).text((8, 14), "OCR 0123", fill=(0, 0, 0))
+        with self.pool.lease() as backend:
+            backend.recognize_batch([image])
+    
     @staticmethod
     def is_available() -> bool:
         """检查OCR功能是否可用"""
-        return PIL_AVAILABLE and len(OCR_ENGINES) > 0
+        return PIL_AVAILABLE and any(info['available'] for info in discover_engines().values())
     
     @staticmethod
     def get_available_engines() -> Dict[str, Dict[str, Any]]:
         """获取所有可用引擎信息"""
-        return OCR_ENGINES.copy()
-    
-    @staticmethod
-    def is_available() -> bool:
-        """检查OCR功能是否可用"""
-        return PIL_AVAILABLE and len(OCR_ENGINES) > 0
+        return discover_engines().copy()
 
 
 # 全局OCR引擎实例
 _ocr_engine: Optional[OCREngine] = None
+_engine_lock = threading.RLock()
+# 正在使用全局引擎识别的请求数，大于0时 unload_ocr_engine 不卸载
+_engine_users = 0
+
+# 引擎就绪状态，由后台预热线程推进
+_state = STATE_DISCOVERING
+_state_error = ""
+_state_cond = threading.Condition()
+_state_listeners: List[Callable[[str], None]] = []
+_warmup_thread: Optional[threading.Thread] = None
+
+# 独立进程模式配置，为None时引擎在本进程内加载
+_server_settings: Optional[Dict[str, Any]] = None
+
+# 生命周期统计：最近一次识别请求的时刻、模型加载/卸载次数
+_last_activity = time.monotonic()
+_load_count = 0
+_unload_count = 0
+
+
+def configure_ocr_server(
+    enabled: bool,
+    port: Optional[int] = None,
+    workdir: Optional[Union[str, Path]] = None,
+    call_timeout: float = 15.0,
+    preferred_engine: Optional[str] = None,
+    pool_size: int = 1,
+    memory_budget_mb: int = 0,
+    disk_cache: bool = False,
+) -> None:
+    """
+    配置是否把OCR引擎放到常驻的独立工作进程中（需在引擎创建前调用）
+    
+    Args:
+        enabled: 是否启用独立进程
+        port: 工作进程监听的本机端口，为None时使用默认端口
+        workdir: 认证密钥、磁盘缓存和日志所在目录
+        call_timeout: 单次识别请求的截止时间（秒），超时的工作进程会被杀掉重启
+        preferred_engine: 新拉起的工作进程优先使用的引擎类型
+        pool_size: 工作进程中引擎池的最大实例数
+        memory_budget_mb: 工作进程的常驻内存预算，0 表示不限制
+        disk_cache: 工作进程的识别结果缓存是否写入 workdir 下的磁盘文件
+    """
+    global _server_settings
+    if not enabled:
+        _server_settings = None
+        return
+    from app.ocr_server import DEFAULT_PORT
+    
+    _server_settings = {
+        "port": port or DEFAULT_PORT,
+        "workdir": Path(workdir) if workdir else None,
+        "call_timeout": call_timeout,
+        "preferred_engine": preferred_engine,
+        "pool_size": pool_size,
+        "memory_budget_mb": memory_budget_mb,
+        "disk_cache": disk_cache,
+    }
+
+
+def _set_state(state: str, error: str = "") -> None:
+    global _state, _state_error
+    with _state_cond:
+        _state = state
+        _state_error = error
+        _state_cond.notify_all()
+        listeners = list(_state_listeners)
+    for listener in listeners:
+        try:
+            listener(state)
+        except Exception as e:
+            print(f"OCR状态回调失败: {e}")
+
+
+def _create_remote_engine(preferred_engine: Optional[str] = None) -> Optional[OCREngine]:
+    """连接（必要时拉起）OCR工作进程，工作进程不可用时返回None由调用方回退到进程内引擎"""
+    from app.ocr_server import RemoteOCREngine
+    
+    assert _server_settings is not None
+    remote = RemoteOCREngine(
+        port=_server_settings["port"],
+        workdir=_server_settings["workdir"],
+        call_timeout=_server_settings["call_timeout"],
+        preferred_engine=preferred_engine or _server_settings["preferred_engine"],
+        pool_size=_server_settings["pool_size"],
+        memory_budget_mb=_server_settings["memory_budget_mb"],
+        disk_cache=_server_settings["disk_cache"],
+        on_state=_set_state,
+    )
+    try:
+        remote.connect(spawn=True)
+        remote.wait_ready()
+    except Exception as e:
+        warnings.warn(f"OCR工作进程不可用，改为进程内加载: {e}")
+        remote.close()
+        return None
+    print(f"使用OCR工作进程: pid={remote.worker_pid} 引擎={remote.engine_name}")
+    return remote  # type: ignore[return-value]
+
+
+def _create_engine(preferred_engine: Optional[str] = None, warm: bool = False) -> OCREngine:
+    """依次经过 检测 → 加载 → 预热 三个阶段创建引擎，并同步更新就绪状态"""
+    _set_state(STATE_DISCOVERING)
+    if _server_settings is not None:
+        remote = _create_remote_engine(preferred_engine)
+        if remote is not None:
+            _count_load()
+            _set_state(STATE_READY)
+            return remote
+        _set_state(STATE_DISCOVERING)
+    discover_engines()
+    
+    _set_state(STATE_LOADING)
+    try:
+        engine = OCREngine(preferred_engine)
+    except Exception as e:
+        _set_state(STATE_FAILED, str(e))
+        raise
+    
+    if warm and engine.engine is not None:
+        _set_state(STATE_WARMING)
+        try:
+            engine.warm_up()
+        except Exception as e:
+            warnings.warn(f"OCR引擎预热失败: {e}")
+    
+    if engine.engine is None:
+        _set_state(STATE_FAILED, "没有可用的OCR引擎")
+    else:
+        _count_load()
+        _set_state(STATE_READY)
+    return engine
+
+
+def _count_load() -> None:
+    global _load_count
+    _load_count += 1
+    mark_ocr_activity()
 
 
 def get_ocr_engine() -> OCREngine:
     """
     获取全局OCR引擎实例
     
+    后台预热进行中时会等待预热完成；不要在UI线程上于就绪前调用，
+    应先通过 get_ocr_state()/wait_ocr_ready() 确认状态。
+    
     Returns:
         OCREngine实例
     """
     global _ocr_engine
     if _ocr_engine is None:
-        _ocr_engine = OCREngine()
+        with _engine_lock:
+            if _ocr_engine is None:
+                _ocr_engine = _create_engine()
     return _ocr_engine
 
 
+@contextmanager
+def use_ocr_engine():
+    """
+    在整个识别过程（截屏、预处理、推理）中持有全局引擎
+    
+    期间 unload_ocr_engine() 不会卸载该引擎，避免取到引擎后、识别完成前被空闲卸载。
+    
+    用法：
+        with use_ocr_engine() as engine:
+            results = engine.recognize_regions_detailed(rects)
+    """
+    global _engine_users
+    while True:
+        engine = get_ocr_engine()
+        with _engine_lock:
+            # 取到引擎后到加锁之间可能已被卸载或重新加载，此时重新获取
+            if _ocr_engine is engine:
+                _engine_users += 1
+                break
+    mark_ocr_activity()
+    try:
+        yield engine
+    finally:
+        with _engine_lock:
+            _engine_users -= 1
+
+
+def _warmup_worker(preferred_engine: Optional[str]) -> None:
+    global _ocr_engine
+    try:
+        with _engine_lock:
+            if _ocr_engine is None:
+                _ocr_engine = _create_engine(preferred_engine, warm=True)
+    except Exception as e:
+        print(f"OCR引擎后台加载失败: {e}")
+
+
+def start_ocr_warmup(preferred_engine: Optional[str] = None) -> threading.Thread:
+    """
+    在后台线程中创建并预热全局OCR引擎，重复调用返回同一线程
+    
+    Args:
+        preferred_engine: 优先使用的引擎类型，如果为None则自动选择
+    """
+    global _warmup_thread
+    with _state_cond:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(
+                target=_warmup_worker, args=(preferred_engine,), name="ocr-warmup", daemon=True
+            )
+            _warmup_thread.start()
+        return _warmup_thread
+
+
+def reload_ocr_engine(preferred_engine: Optional[str] = None) -> threading.Thread:
+    """
+    丢弃当前全局引擎并按新的优先引擎在后台重新加载（例如校准选出了新引擎）
+    
+    独立进程模式下会让旧的工作进程退出，由新进程加载指定引擎。
+    """
+    global _ocr_engine, _warmup_thread
+    with _engine_lock:
+        old_engine = _ocr_engine
+        _ocr_engine = None
+        with _state_cond:
+            _warmup_thread = None
+    shutdown_worker = getattr(old_engine, "shutdown_worker", None)
+    if shutdown_worker is not None:
+        shutdown_worker()
+    return start_ocr_warmup(preferred_engine)
+
+
+def unload_ocr_engine() -> bool:
+    """
+    卸载全局引擎以释放内存，状态变为 unloaded；之后的识别请求或 start_ocr_warmup() 会重新加载
+    
+    独立进程模式下结束工作进程。引擎正在加载、未加载或正在识别时不做任何事。
+    
+    Returns:
+        是否卸载了引擎
+    """
+    global _ocr_engine, _warmup_thread, _unload_count
+    with _engine_lock:
+        engine = _ocr_engine
+        if engine is None or _state != STATE_READY:
+            return False
+        pool = getattr(engine, "pool", None)
+        if _engine_users or (pool is not None and pool.in_use()):
+            return False
+        _ocr_engine = None
+        with _state_cond:
+            _warmup_thread = None
+    shutdown_worker = getattr(engine, "shutdown_worker", None)
+    if shutdown_worker is not None:
+        shutdown_worker()
+    else:
+        engine.release()
+    del engine
+    import gc
+    gc.collect()
+    _unload_count += 1
+    _set_state(STATE_UNLOADED)
+    return True
+
+
+def mark_ocr_activity() -> None:
+    """记录一次识别请求，用于判断引擎是否空闲"""
+    global _last_activity
+    _last_activity = time.monotonic()
+
+
+def ocr_idle_seconds() -> float:
+    """距最近一次识别请求（或引擎加载完成）的秒数"""
+    return time.monotonic() - _last_activity
+
+
+def ocr_resident_memory_mb() -> Optional[float]:
+    """
+    OCR引擎所在进程的常驻内存（MB）
+    
+    进程内模式为本进程；独立进程模式为工作进程，工作进程未运行时为0。
+    """
+    engine = _ocr_engine
+    resident = getattr(engine, "resident_memory_mb", None)
+    if resident is not None:
+        try:
+            return resident()
+        except Exception:
+            return None
+    if _server_settings is not None:
+        return 0.0
+    return process_rss_mb()
+
+
+def get_ocr_lifecycle_stats() -> Dict[str, Any]:
+    """模型加载/卸载次数和空闲时长"""
+    return {"loads": _load_count, "unloads": _unload_count, "idle_s": ocr_idle_seconds()}
+
+
+def close_ocr_engine() -> None:
+    """程序退出时释放引擎资源；独立工作进程不会被结束，供下次启动复用"""
+    engine = _ocr_engine
+    close = getattr(engine, "close", None)
+    if close is not None:
+        close()
+
+
+def get_ocr_state() -> str:
+    """获取OCR引擎就绪状态: discovering / loading / warming / ready / failed"""
+    return _state
+
+
+def get_ocr_error() -> str:
+    """获取OCR引擎加载失败的原因"""
+    return _state_error
+
+
+def wait_ocr_ready(timeout: Optional[float] = None) -> bool:
+    """
+    等待OCR引擎加载结束
+    
+    Returns:
+        引擎是否已就绪；加载失败或超时返回 False
+    """
+    with _state_cond:
+        _state_cond.wait_for(lambda: _state in (STATE_READY, STATE_FAILED), timeout=timeout)
+        return _state == STATE_READY
+
+
+def add_ocr_state_listener(listener: Callable[[str], None]) -> None:
+    """注册就绪状态变化回调，回调在状态变化所在的线程中执行"""
+    with _state_cond:
+        _state_listeners.append(listener)
+
+
 def get_available_engines() -> Dict[str, Dict[str, Any]]:
     """获取所有可用引擎信息"""
-    return OCR_ENGINES.copy()
+    return discover_engines().copy()
 
 def recognize_screen_area(x: int, y: int, width: int, height: int) -> str:
     """
@@ -407,13 +1910,67 @@ def recognize_screen_area(x: int, y: int, width: int, height: int) -> str:
         识别出的文字内容，失败时返回空字符串
     """
     try:
-        engine = get_ocr_engine()
-        return engine.recognize_from_screen_area(x, y, width, height)
+        with use_ocr_engine() as engine:
+            return engine.recognize_from_screen_area(x, y, width, height)
     except Exception as e:
         print(f"OCR识别失败: {e}")
         return ""
 
 
+def recognize_screen_regions(
+    rects: Sequence[Region], profiles: Optional[Sequence[Optional[str]]] = None
+) -> List[str]:
+    """
+    便捷的多区域批量识别函数
+    
+    Args:
+        rects: 区域列表，元素为 Rect 或 (x, y, width, height)
+        profiles: 与 rects 对应的预处理方案，为None时使用默认预设
+        
+    Returns:
+        与 rects 顺序一致的识别文字列表，失败时全部返回空字符串
+    """
+    return [result.text for result in recognize_screen_regions_detailed(rects, profiles)]
+
+
+def recognize_screen_regions_detailed(
+    rects: Sequence[Region], profiles: Optional[Sequence[Optional[str]]] = None
+) -> List[OCRResult]:
+    """
+    便捷的多区域批量识别函数，返回带置信度、文本框和各阶段耗时的结构化结果
+    
+    Args:
+        rects: 区域列表，元素为 Rect 或 (x, y, width, height)
+        profiles: 与 rects 对应的预处理方案，为None时使用默认预设
+        
+    Returns:
+        与 rects 顺序一致的识别结果列表，失败时全部返回空结果
+    """
+    try:
+        with use_ocr_engine() as engine:
+            return engine.recognize_regions_detailed(rects, profiles)
+    except Exception as e:
+        print(f"OCR识别失败: {e}")
+        return [OCRResult() for _ in rects]
+
+
+def recognize_screen_form(
+    rects: Sequence[Region], labels: Optional[Sequence[str]] = None
+) -> List[OCRResult]:
+    """
+    便捷的整页识别函数，见 OCREngine.recognize_form
+    
+    Returns:
+        与 rects 顺序一致的识别结果列表，失败时全部返回空结果
+    """
+    try:
+        with use_ocr_engine() as engine:
+            return engine.recognize_form(rects, labels)
+    except Exception as e:
+        print(f"OCR识别失败: {e}")
+        return [OCRResult() for _ in rects]
+
+
 def save_area_screenshot(x: int, y: int, width: int, height: int, save_path: str) -> bool:
     """
     便捷的屏幕区域截图保存函数
@@ -429,8 +1986,8 @@ def save_area_screenshot(x: int, y: int, width: int, height: int, save_path: str
         是否保存成功
     """
     try:
-        engine = get_ocr_engine()
-        return engine.save_area_screenshot(x, y, width, height, save_path)
+        with use_ocr_engine() as engine:
+            return engine.save_area_screenshot(x, y, width, height, save_path)
     except Exception as e:
         print(f"保存截图失败: {e}")
         return False
\ No newline at end of file
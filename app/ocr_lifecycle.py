@@ -0,0 +1,161 @@
+"""
+OCR模型生命周期 - 空闲卸载、内存预算、有活动时提前预热
+
+工具全天运行在医生工作站上，与占用内存很大的 HIS 客户端同时运行，而 EasyOCR/Paddle
+模型常驻数百 MB。生命周期管理器在后台定期检查：
+- 连续 idle_unload_minutes 分钟没有识别请求时卸载模型（独立进程模式下结束工作进程）
+- 引擎所在进程的常驻内存超过预算时，先释放引擎池中多余的实例；仍然超出且空闲时卸载模型
+- 卸载后一旦出现活动（BLE/HID 设备连接、刷卡器开始输入的一串按键），立即在后台重新
+  加载，等卡号输入完成时模型多半已经就绪
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from app.ocr_engine import (
+    STATE_READY,
+    STATE_UNLOADED,
+    get_ocr_engine,
+    get_ocr_lifecycle_stats,
+    get_ocr_state,
+    mark_ocr_activity,
+    ocr_idle_seconds,
+    ocr_resident_memory_mb,
+    start_ocr_warmup,
+    unload_ocr_engine,
+)
+from app.metrics import REGISTRY
+
+# 后台检查间隔（秒）
+CHECK_INTERVAL_S = 30.0
+
+# 超出内存预算时至少空闲这么久才卸载模型，避免连续刷卡时反复加载
+BUDGET_UNLOAD_IDLE_S = 60.0
+
+# 按键突发：KEY_BURST_WINDOW_S 秒内出现 KEY_BURST_COUNT 次按键视为开始刷卡
+KEY_BURST_COUNT = 3
+KEY_BURST_WINDOW_S = 1.0
+
+_RESIDENT_BYTES = REGISTRY.gauge("ocr_resident_memory_bytes", "OCR引擎所在进程的常驻内存")
+
+
+class OCRLifecycle:
+    """
+    全局OCR引擎的生命周期管理器
+
+    Args:
+        idle_unload_minutes: 空闲多少分钟后卸载模型，0 表示不卸载
+        memory_budget_mb: 引擎所在进程的常驻内存预算，0 表示不限制
+        preferred_engine: 返回重新加载时优先使用的引擎类型
+        on_change: 统计数据更新后的回调（在后台线程中调用）
+        log: 日志回调
+    """
+
+    def __init__(
+        self,
+        idle_unload_minutes: float = 30.0,
+        memory_budget_mb: int = 0,
+        preferred_engine: Optional[Callable[[], Optional[str]]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self.idle_unload_minutes = idle_unload_minutes
+        self.memory_budget_mb = memory_budget_mb
+        self._preferred_engine = preferred_engine or (lambda: None)
+        self._on_change = on_change or (lambda: None)
+        self._log = log or print
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._keys: Deque[float] = deque(maxlen=KEY_BURST_COUNT)
+        self._lock = threading.Lock()
+        self.resident_mb: Optional[float] = None
+        _RESIDENT_BYTES.set_function(lambda: self.resident_mb * 1024 * 1024 if self.resident_mb is not None else None)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="ocr-lifecycle", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(CHECK_INTERVAL_S):
+            try:
+                self.check()
+            except Exception as e:
+                self._log(f"[OCR] 生命周期检查失败: {e}")
+
+    def check(self) -> None:
+        """执行一次空闲卸载和内存预算检查"""
+        if get_ocr_state() == STATE_READY:
+            self.resident_mb = ocr_resident_memory_mb()
+            idle = ocr_idle_seconds()
+            if self.idle_unload_minutes and idle >= self.idle_unload_minutes * 60:
+                self._unload(f"空闲 {idle / 60:.0f} 分钟")
+            elif self.memory_budget_mb and self.resident_mb and self.resident_mb > self.memory_budget_mb:
+                self._enforce_budget(idle)
+        else:
+            self.resident_mb = ocr_resident_memory_mb()
+        self._on_change()
+
+    def _enforce_budget(self, idle: float) -> None:
+        engine = get_ocr_engine()
+        released = engine.trim_pool()
+        if released:
+            self.resident_mb = ocr_resident_memory_mb()
+            self._log(
+                f"[OCR] 常驻内存超出预算 {self.memory_budget_mb} MB，已释放 {released} 个引擎实例，"
+                f"当前 {self.resident_mb or 0:.0f} MB"
+            )
+        if self.resident_mb and self.resident_mb > self.memory_budget_mb and idle >= BUDGET_UNLOAD_IDLE_S:
+            self._unload(f"常驻内存 {self.resident_mb:.0f} MB 超出预算 {self.memory_budget_mb} MB")
+
+    def _unload(self, reason: str) -> None:
+        before = self.resident_mb
+        if not unload_ocr_engine():
+            return
+        self.resident_mb = ocr_resident_memory_mb()
+        freed = f"，释放约 {max(0.0, before - self.resident_mb):.0f} MB" if before and self.resident_mb is not None else ""
+        self._log(f"[OCR] {reason}，已卸载模型{freed}；有刷卡活动时自动重新加载")
+
+    def notify_activity(self, source: str) -> bool:
+        """
+        报告一次设备活动：刷新空闲计时，即将到来的识别之前不会被空闲卸载；
+        模型已卸载时在后台重新加载
+
+        Returns:
+            是否触发了重新加载
+        """
+        mark_ocr_activity()
+        if get_ocr_state() != STATE_UNLOADED:
+            return False
+        self._log(f"[OCR] 检测到{source}，重新加载模型")
+        start_ocr_warmup(self._preferred_engine())
+        return True
+
+    def note_keystroke(self) -> None:
+        """记录一次按键（可在键盘钩子线程中调用），短时间内连续按键视为开始刷卡"""
+        now = time.monotonic()
+        with self._lock:
+            self._keys.append(now)
+            burst = len(self._keys) == KEY_BURST_COUNT and now - self._keys[0] <= KEY_BURST_WINDOW_S
+            if burst:
+                self._keys.clear()
+        if burst:
+            self.notify_activity("刷卡器输入")
+
+    def stats(self) -> Dict[str, object]:
+        """常驻内存、预算和加载/卸载次数，用于界面显示"""
+        stats: Dict[str, object] = dict(get_ocr_lifecycle_stats())
+        stats["resident_mb"] = self.resident_mb
+        stats["budget_mb"] = self.memory_budget_mb
+        stats["state"] = get_ocr_state()
+        return stats
@@ -0,0 +1,336 @@
+"""
+OCR图像预处理流水线 - 基于NumPy的声明式步骤
+
+预处理方案用字符串描述，步骤之间以 ';' 分隔，参数写在 '=' 之后，例如：
+    grayscale;stretch=2,98;binarize=otsu;height;pad=8
+
+可用步骤：
+    grayscale            转灰度
+    stretch[=lo,hi]      按百分位拉伸对比度（默认 2,98）
+    binarize[=otsu]      Otsu 全局二值化；binarize=adaptive[,block,c] 为局部均值自适应二值化
+    sharpen[=amount]     3x3 反锐化掩模（默认 1.0）
+    height[=px]          将高度归一到识别模型期望的像素（缺省使用引擎的 target_height）
+    pad[=px]             四周按边缘像素扩展留白
+
+除缩放外，各步骤都在线程内复用的预分配缓冲区上原地计算，每个字段只在输出时分配一次。
+字段可在 OCRField.preprocess_profile 中写预设名称或完整方案。
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import PIL.Image
+
+# 预设方案
+PRESETS: Dict[str, str] = {
+    "text": "grayscale;stretch;sharpen=1.0;height;pad=8",
+    "numeric": "grayscale;stretch;binarize=otsu;height;pad=8",
+    "adaptive": "grayscale;binarize=adaptive;height;pad=8",
+    # 整页识别：一张图里有多行不同高度的文字，不做高度归一
+    "form": "grayscale;stretch;pad=8",
+    "raw": "",
+}
+
+# 字段编辑界面中显示的预设说明
+PRESET_LABELS: Dict[str, str] = {
+    "": "默认（按引擎）",
+    "text": "文字（姓名等）",
+    "numeric": "数字/编号",
+    "adaptive": "背景不均匀",
+    "form": "整页（不缩放）",
+    "raw": "不处理",
+}
+
+DEFAULT_PRESET = "text"
+
+Step = Tuple[str, Tuple[float, ...]]
+
+
+class _Workspace(threading.local):
+    """每个线程独立的可复用缓冲区，容量不足时才重新分配"""
+
+    def __init__(self) -> None:
+        self.buffers: Dict[str, np.ndarray] = {}
+
+    def get(self, name: str, shape: Tuple[int, ...], dtype=np.float32) -> np.ndarray:
+        size = int(np.prod(shape))
+        buf = self.buffers.get(name)
+        if buf is None or buf.size < size or buf.dtype != dtype:
+            buf = np.empty(max(size, 64 * 1024), dtype=dtype)
+            self.buffers[name] = buf
+        return buf[:size].reshape(shape)
+
+
+_workspace = _Workspace()
+
+
+# ---------------------------------------------------------------- 步骤实现
+def _grayscale(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    if arr.ndim == 2:
+        return arr
+    gray = ws.get("gray", arr.shape[:2])
+    tmp = ws.get("tmp", arr.shape[:2])
+    np.multiply(arr[..., 0], 0.299, out=gray)
+    np.multiply(arr[..., 1], 0.587, out=tmp)
+    gray += tmp
+    np.multiply(arr[..., 2], 0.114, out=tmp)
+    gray += tmp
+    return gray
+
+
+def _histogram(arr: np.ndarray, ws: _Workspace) -> np.ndarray:
+    """256 级灰度直方图（比对浮点数组排序求百分位快一个数量级）"""
+    u8 = ws.get("u8", arr.shape, np.uint8)
+    np.copyto(u8, arr, casting="unsafe")
+    return np.bincount(u8.ravel(), minlength=256)
+
+
+def _stretch(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    lo_pct, hi_pct = (args + (2.0, 98.0)[len(args):])[:2]
+    cdf = np.cumsum(_histogram(arr, ws))
+    lo, hi = np.searchsorted(cdf, (cdf[-1] * lo_pct / 100.0, cdf[-1] * hi_pct / 100.0))
+    if hi - lo < 1.0:
+        return arr
+    arr -= lo
+    arr *= 255.0 / (hi - lo)
+    np.clip(arr, 0, 255, out=arr)
+    return arr
+
+
+def _otsu_threshold(arr: np.ndarray, ws: _Workspace) -> float:
+    hist = _histogram(arr, ws)
+    prob = hist / hist.sum()
+    omega = np.cumsum(prob)
+    mu = np.cumsum(prob * np.arange(256))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sigma_b = (mu[-1] * omega - mu) ** 2 / (omega * (1.0 - omega))
+    # 纯色图片没有可分的两类，方差全为 NaN
+    return float(np.argmax(np.nan_to_num(sigma_b, nan=-1.0)))
+
+
+def _box_mean(arr: np.ndarray, block: int) -> np.ndarray:
+    """block x block 邻域均值（积分图实现，边缘按边缘像素扩展）"""
+    r = block // 2
+    padded = np.pad(arr, r + 1, mode="edge").astype(np.float64)
+    integral = padded.cumsum(0).cumsum(1)
+    h, w = arr.shape
+    total = (
+        integral[block:block + h, block:block + w]
+        - integral[:h, block:block + w]
+        - integral[block:block + h, :w]
+        + integral[:h, :w]
+    )
+    return total / (block * block)
+
+
+def _binarize(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    if arr.ndim == 3:
+        arr = _grayscale(arr, (), ws)
+    mask = ws.get("mask", arr.shape, np.bool_)
+    mode = args[0] if args else 0.0
+    if mode == 1.0:  # adaptive
+        block = int(args[1]) if len(args) > 1 else 15
+        block += 1 - block % 2
+        c = args[2] if len(args) > 2 else 8.0
+        np.greater(arr, _box_mean(arr, block) - c, out=mask)
+    else:
+        np.greater(arr, _otsu_threshold(arr, ws), out=mask)
+    # 识别模型期望浅底深字：亮像素占少数时说明是深色背景，需要反相
+    invert = mask.mean() < 0.5
+    np.multiply(mask, 255.0, out=arr, casting="unsafe")
+    if invert:
+        np.subtract(255.0, arr, out=arr)
+    return arr
+
+
+def _sharpen(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    amount = args[0] if args else 1.0
+    h, w = arr.shape[:2]
+    padded = ws.get("pad", (h + 2, w + 2) + arr.shape[2:])
+    padded[1:-1, 1:-1] = arr
+    padded[0, 1:-1] = arr[0]
+    padded[-1, 1:-1] = arr[-1]
+    padded[:, 0] = padded[:, 1]
+    padded[:, -1] = padded[:, -2]
+
+    blur = ws.get("blur", arr.shape)
+    np.copyto(blur, padded[:-2, :-2])
+    for dy in range(3):
+        for dx in range(3):
+            if dy or dx:
+                blur += padded[dy:dy + h, dx:dx + w]
+    blur *= 1.0 / 9.0
+    # arr + amount * (arr - blur)
+    np.subtract(arr, blur, out=blur)
+    blur *= amount
+    arr += blur
+    np.clip(arr, 0, 255, out=arr)
+    return arr
+
+
+def _height_scale(height: int, target: int) -> float:
+    """矮于目标高度时放大；远高于目标（多行或大字号）时缩小到3倍目标高度以内"""
+    if height <= 0 or target <= 0:
+        return 1.0
+    if height < target:
+        return target / height
+    if height > target * 3:
+        return target * 3 / height
+    return 1.0
+
+
+def _resize(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    target = int(args[0]) if args else 0
+    scale = _height_scale(arr.shape[0], target)
+    if scale == 1.0:
+        return arr
+    u8 = ws.get("u8", arr.shape, np.uint8)
+    np.copyto(u8, arr, casting="unsafe")
+    new_size = (max(1, round(arr.shape[1] * scale)), max(1, round(arr.shape[0] * scale)))
+    resample = PIL.Image.BICUBIC if scale > 1 else PIL.Image.BOX
+    resized = PIL.Image.fromarray(u8).resize(new_size, resample)
+    out = ws.get("resized", (new_size[1], new_size[0]) + arr.shape[2:])
+    np.copyto(out, np.asarray(resized), casting="unsafe")
+    return out
+
+
+def _pad(arr: np.ndarray, args: Tuple[float, ...], ws: _Workspace) -> np.ndarray:
+    px = int(args[0]) if args else 8
+    if px <= 0:
+        return arr
+    h, w = arr.shape[:2]
+    out = ws.get("padded", (h + 2 * px, w + 2 * px) + arr.shape[2:])
+    out[px:px + h, px:px + w] = arr
+    out[:px, px:px + w] = arr[:1]
+    out[px + h:, px:px + w] = arr[-1:]
+    out[:, :px] = out[:, px:px + 1]
+    out[:, px + w:] = out[:, px + w - 1:px + w]
+    return out
+
+
+_STEPS: Dict[str, Callable[[np.ndarray, Tuple[float, ...], _Workspace], np.ndarray]] = {
+    "grayscale": _grayscale,
+    "stretch": _stretch,
+    "binarize": _binarize,
+    "sharpen": _sharpen,
+    "height": _resize,
+    "pad": _pad,
+}
+
+_BINARIZE_MODES = {"otsu": 0.0, "adaptive": 1.0}
+
+
+# ---------------------------------------------------------------- 流水线
+def parse_profile(spec: str, target_height: int = 48) -> List[Step]:
+    """
+    解析预处理方案（预设名称或步骤字符串），未知步骤抛出 ValueError
+
+    Args:
+        spec: 预设名称或完整方案
+        target_height: height 步骤缺省参数时使用的目标高度
+    """
+    spec = PRESETS.get(spec.strip(), spec) if spec else PRESETS[DEFAULT_PRESET]
+    steps: List[Step] = []
+    for raw in spec.split(";"):
+        raw = raw.strip()
+        if not raw:
+            continue
+        name, _, arg_text = raw.partition("=")
+        name = name.strip()
+        if name not in _STEPS:
+            raise ValueError(f"未知的预处理步骤: {name}")
+        args: List[float] = []
+        for part in filter(None, (p.strip() for p in arg_text.split(","))):
+            if name == "binarize" and not args:
+                if part not in _BINARIZE_MODES:
+                    raise ValueError(f"未知的二值化方式: {part}")
+                args.append(_BINARIZE_MODES[part])
+            else:
+                args.append(float(part))
+        if name == "height" and not args:
+            args.append(float(target_height))
+        steps.append((name, tuple(args)))
+    return steps
+
+
+class PreprocessPipeline:
+    """按步骤顺序执行的预处理流水线，线程安全（缓冲区按线程隔离）"""
+
+    def __init__(self, steps: List[Step]):
+        self.steps = steps
+        self.profile_id = ";".join(
+            name + ("=" + ",".join(f"{a:g}" for a in args) if args else "") for name, args in steps
+        ) or "raw"
+
+    def run(self, image: PIL.Image.Image) -> PIL.Image.Image:
+        """执行预处理，返回新分配的图片（灰度流水线输出 L 模式）"""
+        if not self.steps:
+            return image
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        ws = _workspace
+        steps = self.steps
+        if steps[0][0] == "grayscale":
+            # 首步转灰度直接用 Pillow 的C实现（权重与 _grayscale 相同）
+            image = image.convert("L")
+            steps = steps[1:]
+        src = np.asarray(image)
+        arr = ws.get("work", src.shape)
+        np.copyto(arr, src, casting="unsafe")
+        for name, args in steps:
+            arr = _STEPS[name](arr, args, ws)
+        # 输出必须是新数组：工作缓冲区会被同一线程的下一次调用覆盖
+        out = np.empty(arr.shape, dtype=np.uint8)
+        np.copyto(out, arr, casting="unsafe")
+        return PIL.Image.fromarray(out)
+
+    def geometry(self, height: int) -> Tuple[float, float]:
+        """
+        输入高度为 height 时的 (缩放比例, 输出图四周留白像素)，用于把文本框换算回原图坐标
+
+        按步骤顺序重放：缩放前加的留白随之缩放，输出坐标 = 原图坐标 * 缩放比例 + 留白。
+        """
+        scale, pad, current = 1.0, 0.0, height
+        for name, args in self.steps:
+            if name == "height":
+                factor = _height_scale(current, int(args[0]) if args else 0)
+                if factor != 1.0:
+                    # 与 _resize 相同的取整，按实际缩放后的高度计算比例
+                    resized = max(1, round(current * factor))
+                    factor = resized / current
+                    scale *= factor
+                    pad *= factor
+                    current = resized
+            elif name == "pad":
+                px = int(args[0]) if args else 8
+                if px > 0:
+                    pad += px
+                    current += 2 * px
+        return scale, pad
+
+
+def binarizes(profile: Optional[str]) -> bool:
+    """方案是否包含二值化步骤；二值化按前景像素占比自动定极性，反色后的截图处理结果相同"""
+    try:
+        steps = parse_profile(profile or "")
+    except ValueError:
+        return False
+    return any(name == "binarize" for name, _args in steps)
+
+
+_pipelines: Dict[Tuple[str, int], PreprocessPipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(profile: Optional[str], target_height: int) -> PreprocessPipeline:
+    """获取（缓存的）预处理流水线；profile 为空时使用默认预设"""
+    key = (profile or "", target_height)
+    pipeline = _pipelines.get(key)
+    if pipeline is None:
+        pipeline = PreprocessPipeline(parse_profile(profile or "", target_height))
+        with _pipelines_lock:
+            _pipelines[key] = pipeline
+    return pipeline
@@ -0,0 +1,224 @@
+"""
+OCR识别重试策略 - 基于同一帧截图的变体重试
+
+每次识别只截屏一次：各字段区域按最大留白扩展后一起截取，原始区域和各种变体
+（扩大区域、放大、反色）都在内存中从这一帧派生。第一轮批量识别所有字段的原始
+截图，未通过的字段把全部变体放进第二轮的同一批次推理（引擎池有多个实例时自动
+并行），按策略中的顺序取第一个通过的变体。
+
+启用名单的字段把识别文字吸附到最近的名单项，高置信度吸附即视为通过。
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import PIL.Image
+import PIL.ImageOps
+
+from app.ocr_engine import OCREngine, OCRResult, Region, _region_bbox, grab_regions, use_ocr_engine
+from app.ocr_preprocess import binarizes
+from app.roster import Roster
+
+# 变体名称 -> 说明；配置中用逗号分隔，按顺序决定优先级
+VARIANT_LABELS: Dict[str, str] = {
+    "pad": "扩大区域",
+    "upscale": "放大",
+    "invert": "反色",
+}
+
+DEFAULT_VARIANTS = ("pad", "upscale", "invert")
+
+# pad 变体在每个方向上扩大的像素
+PAD_MARGIN = 5
+
+# upscale 变体的放大倍数
+UPSCALE_FACTOR = 2
+
+
+def parse_variants(spec: str) -> Tuple[str, ...]:
+    """解析逗号分隔的变体列表，未知名称抛出 ValueError"""
+    names = tuple(name.strip() for name in (spec or "").split(",") if name.strip())
+    unknown = [name for name in names if name not in VARIANT_LABELS]
+    if unknown:
+        raise ValueError(f"未知的重试变体: {', '.join(unknown)}")
+    return names
+
+
+@dataclass(frozen=True)
+class RetryStrategy:
+    """
+    单个字段的识别与重试策略
+
+    有名单时由名单吸附决定是否通过；否则配置了校验规则（正则表达式，在去掉空白的
+    文字中搜索）时由校验规则决定；都没有时引擎给出置信度要求不低于 min_confidence。
+    """
+    variants: Tuple[str, ...] = DEFAULT_VARIANTS
+    validator: str = ""
+    min_confidence: float = 0.5
+    profile: str = ""
+    roster: Optional[Roster] = field(default=None, compare=False)
+
+    @classmethod
+    def for_field(cls, ocr_field, default_min_confidence: float, roster: Optional[Roster] = None) -> "RetryStrategy":
+        """由 OCRField 的配置构建策略，字段未设置置信度阈值时使用全局阈值"""
+        try:
+            variants = parse_variants(ocr_field.retry_variants)
+        except ValueError:
+            variants = DEFAULT_VARIANTS
+        if binarizes(ocr_field.preprocess_profile):
+            # 二值化会按前景自动反色，抵消反色变体，多一次推理也得不到不同的结果
+            variants = tuple(name for name in variants if name != "invert")
+        return cls(
+            variants=variants,
+            validator=ocr_field.validator,
+            min_confidence=ocr_field.min_confidence or default_min_confidence,
+            profile=ocr_field.preprocess_profile,
+            roster=roster if roster is not None and len(roster) else None,
+        )
+
+    def accepts(self, result: OCRResult) -> bool:
+        text = "".join(result.text.split())
+        if not text:
+            return False
+        if self.validator:
+            try:
+                return re.search(self.validator, text) is not None
+            except re.error:
+                return True
+        return not result.tokens or result.confidence >= self.min_confidence
+
+    def evaluate(self, result: OCRResult) -> Tuple[OCRResult, bool]:
+        """返回（可能已吸附到名单项的）结果和是否通过"""
+        if self.roster is None:
+            return result, self.accepts(result)
+        match = self.roster.match(result.text)
+        if match is None:
+            return result, False
+        return replace(result, text=match.entry), match.confident
+
+    def rank(self, result: OCRResult) -> Tuple[bool, bool, float]:
+        """没有变体通过时用于挑选最好的结果，吸附到名单的结果优先"""
+        snapped = self.roster is not None and self.roster.match(result.text) is not None
+        return bool(result.text.strip()), snapped or self.accepts(result), result.confidence
+
+
+@dataclass
+class RetryOutcome:
+    """单个字段的识别结果和所用的尝试次数；raw_text 为吸附到名单前的识别文字"""
+    result: OCRResult = field(default_factory=OCRResult)
+    attempts: int = 1
+    variant: str = ""
+    accepted: bool = False
+    raw_text: str = ""
+
+
+def _variant_image(name: str, base: PIL.Image.Image, padded: PIL.Image.Image) -> PIL.Image.Image:
+    if name == "pad":
+        return padded
+    if name == "upscale":
+        return base.resize((base.width * UPSCALE_FACTOR, base.height * UPSCALE_FACTOR), PIL.Image.BICUBIC)
+    if name == "invert":
+        return PIL.ImageOps.invert(base.convert("RGB"))
+    raise ValueError(f"未知的重试变体: {name}")
+
+
+def _padded_rect(region: Region, margin: int) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int, int]]:
+    """扩展后的截取区域，以及原始区域在扩展截图中的位置 (left, top, right, bottom)"""
+    left, top, right, bottom = _region_bbox(region)
+    if right <= left or bottom <= top:
+        return (left, top, 0, 0), (0, 0, 0, 0)
+    pad_left, pad_top = max(0, left - margin), max(0, top - margin)
+    outer = (pad_left, pad_top, right + margin - pad_left, bottom + margin - pad_top)
+    inner = (left - pad_left, top - pad_top, right - pad_left, bottom - pad_top)
+    return outer, inner
+
+
+def recognize_with_strategies(
+    rects: Sequence[Region],
+    strategies: Sequence[RetryStrategy],
+    on_batch: Optional[Callable[[List[OCRResult]], None]] = None,
+) -> List[RetryOutcome]:
+    """
+    一次截屏识别多个区域，原始截图未通过的字段用同一帧派生的变体批量重试
+
+    Args:
+        rects: 区域列表，元素为 Rect 或 (x, y, width, height)
+        strategies: 与 rects 对应的重试策略
+        on_batch: 每轮批量识别后的回调，用于记录各阶段耗时
+
+    Returns:
+        与 rects 顺序一致的识别结果，无效区域返回空结果
+    """
+    outcomes = [RetryOutcome() for _ in rects]
+    if not rects:
+        return outcomes
+    # 截屏到最后一轮推理都持有引擎，期间不会被空闲卸载
+    with use_ocr_engine() as engine:
+        return _recognize_rounds(engine, rects, strategies, on_batch, outcomes)
+
+
+def _recognize_rounds(
+    engine: OCREngine,
+    rects: Sequence[Region],
+    strategies: Sequence[RetryStrategy],
+    on_batch: Optional[Callable[[List[OCRResult]], None]],
+    outcomes: List[RetryOutcome],
+) -> List[RetryOutcome]:
+    layout = [_padded_rect(rect, PAD_MARGIN) for rect in rects]
+    frames = grab_regions([outer for outer, _ in layout])
+    bases: List[Optional[PIL.Image.Image]] = [
+        frame.crop(inner) if frame is not None else None
+        for frame, (_, inner) in zip(frames, layout)
+    ]
+
+    # 第一轮：所有字段的原始截图一次批量推理
+    first = [idx for idx, base in enumerate(bases) if base is not None]
+    if not first:
+        return outcomes
+    results = engine.recognize_images_detailed(
+        [bases[idx] for idx in first], profiles=[strategies[idx].profile for idx in first]
+    )
+    if on_batch:
+        on_batch(results)
+    pending = []
+    for idx, raw in zip(first, results):
+        result, accepted = strategies[idx].evaluate(raw)
+        outcomes[idx] = RetryOutcome(result=result, attempts=1, accepted=accepted, raw_text=raw.text)
+        if not accepted and strategies[idx].variants:
+            pending.append(idx)
+    if not pending:
+        return outcomes
+
+    # 第二轮：未通过字段的全部变体放进同一批次
+    jobs: List[Tuple[int, str]] = []
+    images: List[PIL.Image.Image] = []
+    for idx in pending:
+        for name in strategies[idx].variants:
+            jobs.append((idx, name))
+            images.append(_variant_image(name, bases[idx], frames[idx]))
+    results = engine.recognize_images_detailed(images, profiles=[strategies[idx].profile for idx, _ in jobs])
+    if on_batch:
+        on_batch(results)
+
+    by_field: Dict[int, List[Tuple[str, OCRResult]]] = {}
+    for (idx, name), result in zip(jobs, results):
+        by_field.setdefault(idx, []).append((name, result))
+    for idx, tried in by_field.items():
+        strategy = strategies[idx]
+        best = outcomes[idx]
+        for attempt, (name, raw) in enumerate(tried, start=2):
+            result, accepted = strategy.evaluate(raw)
+            if accepted:
+                outcomes[idx] = RetryOutcome(
+                    result=result, attempts=attempt, variant=name, accepted=True, raw_text=raw.text
+                )
+                break
+            if strategy.rank(result) > strategy.rank(best.result):
+                best = RetryOutcome(result=result, attempts=attempt, variant=name, raw_text=raw.text)
+        else:
+            best.attempts = 1 + len(tried)
+            outcomes[idx] = best
+    return outcomes
@@ -0,0 +1,586 @@
+"""
+OCR工作进程 - 常驻的独立识别服务
+
+OCR模型运行在独立进程中，不再与Tk界面争抢GIL；PaddleOCR/torch 崩溃或卡死
+只影响工作进程，界面进程可以将其杀掉并重新拉起。工作进程以分离方式启动，
+界面重启后可以直接复用已加载好的模型。
+
+通信方式：
+- 控制消息走本机回环地址上的 multiprocessing.connection（带认证）
+- 像素数据走 multiprocessing.shared_memory，不对图片做序列化
+
+单独运行：
+    python -m app.ocr_server --port 47831 --workdir <配置目录>
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_PORT = 47831
+AUTHKEY_FILE = "ocr_server.key"
+LOG_FILE = "ocr_server.log"
+
+# 配置不同的旧工作进程退出并释放端口的最长等待时间（秒）
+WORKER_EXIT_TIMEOUT_S = 10.0
+
+# 共享内存初始大小，不够时按需扩大
+_SHM_MIN_SIZE = 4 * 1024 * 1024
+
+
+def _load_authkey(workdir: Path) -> bytes:
+    """读取（首次运行时生成）界面进程与工作进程共用的认证密钥"""
+    path = workdir / AUTHKEY_FILE
+    try:
+        key = path.read_bytes()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+    key = secrets.token_hex(16).encode("ascii")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(key)
+    return key
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    if os.name != "nt":
+        # 共享内存由界面进程创建和释放，避免本进程退出时 resource_tracker 将其删除
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+    return shm
+
+
+# ---------------------------------------------------------------- 工作进程
+class OCRServer:
+    """OCR工作进程：持有 OCREngine，按请求从共享内存读取图片并识别"""
+
+    def __init__(
+        self,
+        port: int,
+        workdir: Path,
+        preferred_engine: Optional[str] = None,
+        pool_size: int = 1,
+        memory_budget_mb: int = 0,
+        disk_cache: bool = False,
+    ):
+        self.port = port
+        self.workdir = workdir
+        self.preferred_engine = preferred_engine
+        self.pool_size = pool_size
+        self.memory_budget_mb = memory_budget_mb
+        self.disk_cache = disk_cache
+        self._stop_event = threading.Event()
+
+    def settings(self) -> Dict[str, Any]:
+        """启动参数，客户端据此判断常驻的工作进程是否与当前配置一致"""
+        return {
+            "engine": self.preferred_engine,
+            "pool_size": self.pool_size,
+            "memory_budget_mb": self.memory_budget_mb,
+            "disk_cache": self.disk_cache,
+        }
+
+    def serve_forever(self) -> None:
+        from app.ocr_engine import (
+            OCR_CACHE_FILE, configure_ocr_cache, configure_ocr_memory_budget, configure_ocr_pool, start_ocr_warmup,
+        )
+
+        configure_ocr_cache(disk_path=self.workdir / OCR_CACHE_FILE if self.disk_cache else None)
+        configure_ocr_pool(self.pool_size)
+        configure_ocr_memory_budget(self.memory_budget_mb)
+        start_ocr_warmup(self.preferred_engine)
+
+        listener = Listener(("127.0.0.1", self.port), authkey=_load_authkey(self.workdir))
+        print(f"OCR工作进程已启动: pid={os.getpid()} port={self.port}", flush=True)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    print(f"接受连接失败: {e}", flush=True)
+                    continue
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _serve_connection(self, conn: Connection) -> None:
+        attached: Dict[str, shared_memory.SharedMemory] = {}
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    reply = self._dispatch(message, attached)
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                conn.send(reply)
+                if message.get("op") == "shutdown":
+                    self._stop_event.set()
+                    os._exit(0)
+        finally:
+            for shm in attached.values():
+                try:
+                    shm.close()
+                except BufferError:
+                    pass
+            conn.close()
+
+    def _hello(self) -> Dict[str, Any]:
+        import app.ocr_engine as ocr_engine
+
+        info: Dict[str, Any] = {}
+        engine_name = None
+        if ocr_engine.get_ocr_state() == ocr_engine.STATE_READY:
+            engine = ocr_engine.get_ocr_engine()
+            info = engine.get_engine_info()
+            engine_name = engine.engine_name
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "state": ocr_engine.get_ocr_state(),
+            "error": ocr_engine.get_ocr_error(),
+            "engine_name": engine_name,
+            "engine_info": info,
+            "settings": self.settings(),
+        }
+
+    def _dispatch(self, message: Dict[str, Any], attached: Dict[str, shared_memory.SharedMemory]) -> Dict[str, Any]:
+        import app.ocr_engine as ocr_engine
+
+        op = message.get("op")
+        if op == "hello":
+            return self._hello()
+        if op == "stats":
+            return {"ok": True, "cache": ocr_engine.get_ocr_cache().stats(), "rss_mb": ocr_engine.process_rss_mb()}
+        if op == "trim":
+            engine = ocr_engine._ocr_engine
+            return {"ok": True, "released": engine.trim_pool() if engine is not None else 0}
+        if op == "shutdown":
+            return {"ok": True}
+        if op != "recognize":
+            return {"ok": False, "error": f"未知请求: {op}"}
+
+        import PIL.Image
+
+        name = message["shm"]
+        shm = attached.get(name)
+        if shm is None:
+            for old in attached.values():
+                try:
+                    old.close()
+                except BufferError:
+                    pass
+            attached.clear()
+            shm = attached[name] = _attach_shared_memory(name)
+
+        # 直接在共享内存上构建图片，不做拷贝
+        images = [
+            PIL.Image.frombuffer("RGB", (width, height), shm.buf[offset:offset + width * height * 3], "raw", "RGB", 0, 1)
+            for offset, width, height in message["images"]
+        ]
+        try:
+            deadline = message.get("deadline")
+            if deadline and time.time() > deadline:
+                return {"ok": False, "error": "请求已超过截止时间"}
+            with ocr_engine.use_ocr_engine() as engine:
+                results = engine.recognize_images_detailed(
+                    images, use_cache=message.get("use_cache", True), profiles=message.get("profiles")
+                )
+            return {"ok": True, "results": [result.to_dict() for result in results]}
+        finally:
+            del images
+
+
+# ---------------------------------------------------------------- 界面进程客户端
+class RemoteOCREngine:
+    """
+    OCR工作进程的客户端，接口与 OCREngine 一致
+
+    连接不上时自动以分离方式拉起工作进程；请求超过截止时间视为工作进程卡死，
+    将其杀掉并在后台重新拉起。
+    """
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        workdir: Optional[Path] = None,
+        call_timeout: float = 15.0,
+        start_timeout: float = 180.0,
+        preferred_engine: Optional[str] = None,
+        pool_size: int = 1,
+        memory_budget_mb: int = 0,
+        disk_cache: bool = False,
+        on_state: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.port = port
+        self.workdir = Path(workdir) if workdir else Path(__file__).resolve().parent.parent
+        self.call_timeout = call_timeout
+        self.start_timeout = start_timeout
+        self.preferred_engine = preferred_engine
+        self.pool_size = pool_size
+        self.memory_budget_mb = memory_budget_mb
+        self.disk_cache = disk_cache
+        self._on_state = on_state or (lambda _state, _error="": None)
+
+        self.engine = self  # 与 OCREngine 保持一致：engine 为 None 表示没有可用引擎
+        self.engine_name: Optional[str] = None
+        self.worker_pid: Optional[int] = None
+        self._engine_info: Dict[str, Any] = {}
+        self._conn: Optional[Connection] = None
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._lock = threading.RLock()
+        self._respawning = False
+
+    # --- 连接管理
+    def _worker_command(self) -> List[str]:
+        args = ["--port", str(self.port), "--workdir", str(self.workdir)]
+        if self.preferred_engine:
+            args += ["--engine", self.preferred_engine]
+        if self.pool_size > 1:
+            args += ["--pool-size", str(self.pool_size)]
+        if self.memory_budget_mb:
+            args += ["--memory-budget", str(self.memory_budget_mb)]
+        if self.disk_cache:
+            args.append("--disk-cache")
+        if getattr(sys, "frozen", False):
+            return [sys.executable, "--ocr-server", *args]
+        return [sys.executable, "-m", "app.ocr_server", *args]
+
+    def _spawn_worker(self) -> None:
+        log = open(self.workdir / LOG_FILE, "ab")
+        kwargs: Dict[str, Any] = {
+            "cwd": str(Path(__file__).resolve().parent.parent),
+            "stdin": subprocess.DEVNULL,
+            "stdout": log,
+            "stderr": subprocess.STDOUT,
+        }
+        if os.name == "nt":
+            kwargs["creationflags"] = (
+                getattr(subprocess, "DETACHED_PROCESS", 0)
+                | getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+                | getattr(subprocess, "CREATE_NO_WINDOW", 0)
+            )
+        else:
+            kwargs["start_new_session"] = True
+        subprocess.Popen(self._worker_command(), **kwargs)
+        log.close()
+
+    def settings(self) -> Dict[str, Any]:
+        """期望的工作进程启动参数，与 OCRServer.settings() 对应"""
+        return {
+            "engine": self.preferred_engine,
+            "pool_size": self.pool_size,
+            "memory_budget_mb": self.memory_budget_mb,
+            "disk_cache": self.disk_cache,
+        }
+
+    def _open_connection(self) -> Connection:
+        return Client(("127.0.0.1", self.port), authkey=_load_authkey(self.workdir))
+
+    def connect(self, spawn: bool = True) -> None:
+        """连接工作进程，必要时拉起并等待其监听端口"""
+        with self._lock:
+            if self._conn is not None:
+                return
+            try:
+                self._conn = self._open_connection()
+                return
+            except (ConnectionRefusedError, OSError):
+                if not spawn:
+                    raise
+            self._spawn_worker()
+            deadline = time.time() + 30.0
+            while True:
+                try:
+                    self._conn = self._open_connection()
+                    return
+                except (ConnectionRefusedError, OSError):
+                    if time.time() > deadline:
+                        raise RuntimeError("OCR工作进程启动超时")
+                    time.sleep(0.2)
+
+    def wait_ready(self) -> None:
+        """
+        等待工作进程完成模型加载和预热，期间同步上报就绪状态
+
+        工作进程在界面重启后继续运行；已在运行的工作进程启动参数（引擎、池大小、磁盘缓存等）
+        与当前配置不同时让它退出，按当前配置重新拉起。
+        """
+        deadline = time.time() + self.start_timeout
+        last_state = None
+        checked = False
+        while True:
+            hello = self._call({"op": "hello"}, timeout=self.call_timeout, kill_on_timeout=False)
+            self.worker_pid = hello.get("pid")
+            if not checked:
+                checked = True
+                running = hello.get("settings")
+                if running != self.settings():
+                    print(f"OCR工作进程配置与当前配置不同（{running} → {self.settings()}），重新启动", flush=True)
+                    self._restart_worker()
+                    continue
+            state = hello.get("state")
+            if state != last_state:
+                self._on_state(state, hello.get("error", ""))
+                last_state = state
+            if state == "ready":
+                self.engine_name = hello.get("engine_name")
+                self._engine_info = hello.get("engine_info") or {}
+                return
+            if state == "failed":
+                raise RuntimeError(hello.get("error") or "OCR工作进程加载引擎失败")
+            if time.time() > deadline:
+                raise RuntimeError("等待OCR工作进程就绪超时")
+            time.sleep(0.2)
+
+    def _restart_worker(self) -> None:
+        """让当前工作进程退出，等它释放监听端口后按本端的启动参数重新拉起"""
+        self.shutdown_worker()
+        self.worker_pid = None
+        deadline = time.time() + WORKER_EXIT_TIMEOUT_S
+        while time.time() < deadline:
+            try:
+                self._open_connection().close()
+            except (ConnectionRefusedError, OSError, EOFError):
+                break
+            time.sleep(0.1)
+        else:
+            raise RuntimeError("旧的OCR工作进程未退出")
+        self.connect(spawn=True)
+
+    def _drop_connection(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    def _kill_worker(self) -> None:
+        """杀掉卡死的工作进程，并在后台重新拉起"""
+        pid = self.worker_pid
+        self._drop_connection()
+        if pid:
+            try:
+                # Windows 上 SIGTERM 即 TerminateProcess；POSIX 上卡死的进程可能不响应 SIGTERM
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+            except Exception as e:
+                print(f"结束OCR工作进程失败: {e}")
+        self.worker_pid = None
+        if not self._respawning:
+            self._respawning = True
+            self._on_state("loading", "")
+            threading.Thread(target=self._respawn, name="ocr-server-respawn", daemon=True).start()
+
+    def _respawn(self) -> None:
+        try:
+            time.sleep(0.2)  # 等待旧进程释放监听端口
+            self.connect(spawn=True)
+            self.wait_ready()
+        except Exception as e:
+            self._on_state("failed", f"OCR工作进程重启失败: {e}")
+        finally:
+            self._respawning = False
+
+    def _call(self, message: Dict[str, Any], timeout: Optional[float] = None, kill_on_timeout: bool = True) -> Dict[str, Any]:
+        timeout = self.call_timeout if timeout is None else timeout
+        with self._lock:
+            if self._respawning and message.get("op") != "hello":
+                raise RuntimeError("OCR工作进程重启中")
+            self.connect(spawn=True)
+            assert self._conn is not None
+            try:
+                self._conn.send(message)
+                responded = self._conn.poll(timeout)
+                reply = self._conn.recv() if responded else None
+            except (EOFError, OSError) as e:
+                # 工作进程崩溃：丢弃连接，下次调用时重新拉起
+                self._drop_connection()
+                raise RuntimeError(f"OCR工作进程连接中断: {e}")
+            if reply is None:
+                if kill_on_timeout:
+                    self._kill_worker()
+                else:
+                    self._drop_connection()
+                raise TimeoutError(f"OCR工作进程 {timeout:.1f}s 内未响应")
+        if not reply.get("ok"):
+            raise RuntimeError(reply.get("error") or "OCR工作进程返回错误")
+        return reply
+
+    def close(self) -> None:
+        """断开连接并释放共享内存（工作进程继续运行）"""
+        with self._lock:
+            self._drop_connection()
+            if self._shm is not None:
+                self._shm.close()
+                try:
+                    self._shm.unlink()
+                except FileNotFoundError:
+                    pass
+                self._shm = None
+
+    def shutdown_worker(self) -> None:
+        """请求工作进程退出"""
+        try:
+            self._call({"op": "shutdown"}, kill_on_timeout=False)
+        except Exception:
+            pass
+        self.close()
+
+    # --- 共享内存
+    def _ensure_shm(self, size: int) -> shared_memory.SharedMemory:
+        if self._shm is not None and self._shm.size >= size:
+            return self._shm
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, _SHM_MIN_SIZE))
+        return self._shm
+
+    # --- 与 OCREngine 一致的识别接口
+    def recognize_images(
+        self, images: Sequence[Any], use_cache: bool = True, profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[str]:
+        return [result.text for result in self.recognize_images_detailed(images, use_cache, profiles)]
+
+    def recognize_images_detailed(
+        self, images: Sequence[Any], use_cache: bool = True, profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Any]:
+        from app.ocr_engine import OCRResult, mark_ocr_activity
+
+        if not images:
+            return []
+        mark_ocr_activity()
+        start = time.perf_counter()
+        rgb_images = [img if img.mode == "RGB" else img.convert("RGB") for img in images]
+        with self._lock:
+            shm = self._ensure_shm(sum(img.width * img.height * 3 for img in rgb_images))
+            layout = []
+            offset = 0
+            for img in rgb_images:
+                size = img.width * img.height * 3
+                shm.buf[offset:offset + size] = img.tobytes()
+                layout.append((offset, img.width, img.height))
+                offset += size
+            reply = self._call({
+                "op": "recognize",
+                "shm": shm.name,
+                "images": layout,
+                "use_cache": use_cache,
+                "profiles": list(profiles) if profiles else None,
+                "deadline": time.time() + self.call_timeout,
+            })
+        results = [OCRResult.from_dict(item) for item in reply["results"]]
+        # 往返耗时中不属于工作进程各阶段的部分计为进程间传输
+        round_trip_ms = (time.perf_counter() - start) * 1000
+        worker_ms = max((sum(r.timings.values()) for r in results), default=0.0)
+        for result in results:
+            result.timings["transport"] = max(0.0, round_trip_ms - worker_ms)
+        return results
+
+    def recognize_regions(self, rects: Sequence[Any], profiles: Optional[Sequence[Optional[str]]] = None) -> List[str]:
+        return [result.text for result in self.recognize_regions_detailed(rects, profiles)]
+
+    def recognize_regions_detailed(
+        self, rects: Sequence[Any], profiles: Optional[Sequence[Optional[str]]] = None
+    ) -> List[Any]:
+        from app.ocr_engine import OCRResult, grab_regions
+
+        if not rects:
+            return []
+        start = time.perf_counter()
+        crops = grab_regions(rects)
+        capture_ms = (time.perf_counter() - start) * 1000
+        profiles = list(profiles) if profiles else [None] * len(rects)
+        valid = [idx for idx, crop in enumerate(crops) if crop is not None]
+        results = [OCRResult(engine=self.engine_name or "", timings={"capture": capture_ms}) for _ in rects]
+        if valid:
+            detailed = self.recognize_images_detailed(
+                [crops[idx] for idx in valid], profiles=[profiles[idx] for idx in valid]
+            )
+            for idx, result in zip(valid, detailed):
+                result.timings["capture"] = capture_ms
+                results[idx] = result
+        return results
+
+    def recognize_form(self, rects: Sequence[Any], labels: Optional[Sequence[str]] = None) -> List[Any]:
+        from app.ocr_engine import recognize_form_regions
+
+        if not rects:
+            return []
+        return recognize_form_regions(self, rects, labels)
+
+    def recognize_from_image(self, image: Any, profile: Optional[str] = None) -> str:
+        return self.recognize_images([image], profiles=[profile])[0]
+
+    def recognize_batch(self, images: Sequence[Any]) -> List[str]:
+        return self.recognize_images(images, use_cache=False)
+
+    def recognize_from_screen_area(self, x: int, y: int, width: int, height: int) -> str:
+        return self.recognize_regions([(x, y, width, height)])[0]
+
+    def save_area_screenshot(self, x: int, y: int, width: int, height: int, save_path: str) -> bool:
+        try:
+            from app.screen_capture import grab
+
+            grab((x, y, x + width, y + height)).save(save_path)
+            return True
+        except Exception as e:
+            print(f"保存截图失败: {e}")
+            return False
+
+    def warm_up(self) -> None:
+        """工作进程启动时已自行预热"""
+
+    def get_engine_info(self) -> Dict[str, Any]:
+        info = dict(self._engine_info)
+        if info:
+            info["description"] = f"{info.get('description', '')}（独立进程 pid={self.worker_pid}）"
+        return info
+
+    def cache_stats(self) -> Dict[str, int]:
+        return self._call({"op": "stats"}).get("cache", {})
+
+    def resident_memory_mb(self) -> Optional[float]:
+        """工作进程的常驻内存（MB）"""
+        return self._call({"op": "stats"}, kill_on_timeout=False).get("rss_mb")
+
+    def trim_pool(self) -> int:
+        return int(self._call({"op": "trim"}, kill_on_timeout=False).get("released", 0))
+
+
+def serve_main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="OCR工作进程")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workdir", default=str(Path(__file__).resolve().parent.parent))
+    parser.add_argument("--engine", default=None, help="优先使用的引擎类型 paddle/easyocr/tesseract")
+    parser.add_argument("--pool-size", type=int, default=1, help="引擎池最大实例数")
+    parser.add_argument("--memory-budget", type=int, default=0, help="常驻内存预算（MB），0 表示不限制")
+    parser.add_argument("--disk-cache", action="store_true", help="识别结果缓存写入 workdir 下的磁盘文件")
+    args = parser.parse_args(argv)
+    OCRServer(
+        args.port, Path(args.workdir), args.engine, args.pool_size, args.memory_budget, args.disk_cache
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    serve_main()
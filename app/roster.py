@@ -0,0 +1,222 @@
+"""
+字段名单 - 医生/护士/诊疗间等封闭词表字段的模糊匹配
+
+每个字段一份名单，用单字倒排索引筛选候选：编辑距离不超过 k 的名单项至少包含识别
+文字中除 k 个以外的所有不同汉字，因此数千条名单也只需对少量候选计算编辑距离。
+OCR 原始结果在距离阈值内吸附到最近的名单项；名单可从文本文件导入，
+也会从确认过的识别结果中自动学习。名单保存在配置目录下的 rosters.json 中，
+按字段参数名分组。
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from collections import Counter
+from typing import Dict, Iterable, Optional, Set
+
+from app.config_manager import atomic_write_text
+
+# 吸附允许的编辑距离占识别文字长度的比例（至少允许1个字符的差异）
+MAX_DISTANCE_RATIO = 0.34
+
+# 相似度不低于该值且没有同样接近的其他名单项时视为高置信度吸附，可直接结束重试
+CONFIDENT_SCORE = 0.6
+
+# 识别置信度不低于该值、且未吸附到已有名单项的结果在提交成功后自动加入名单
+LEARN_CONFIDENCE = 0.9
+
+# 自动学习时名单项的最大长度，过长的多半是误识别的整行文字
+MAX_ENTRY_LENGTH = 16
+
+_NOISE = re.compile(r"[\s:：,，.。;；、'\"“”‘’()（）\[\]【】]+")
+
+
+def normalize_entry(text: str) -> str:
+    """去掉空白和常见标点，OCR 常把它们识别错或多识别出来"""
+    return _NOISE.sub("", text or "")
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """
+    Levenshtein 编辑距离
+
+    给出 limit 时，一旦确定距离超过 limit 就提前返回 limit + 1。
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+@dataclass
+class RosterMatch:
+    entry: str
+    distance: int
+    score: float
+    unique: bool = True
+
+    @property
+    def confident(self) -> bool:
+        return self.distance == 0 or (self.unique and self.score >= CONFIDENT_SCORE)
+
+
+class Roster:
+    """单个字段的名单，线程安全（刷卡识别在后台线程匹配，界面线程导入和学习）"""
+
+    def __init__(self, entries: Optional[Dict[str, int]] = None) -> None:
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+        # 单字 -> 包含该字的名单项；长度 -> 名单项（识别文字太短、无法用单字筛选时使用）
+        self._postings: Dict[str, Set[str]] = {}
+        self._by_length: Dict[int, Set[str]] = {}
+        self._longest = 0
+        for entry, count in (entries or {}).items():
+            self.add(entry, count)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, text: str) -> bool:
+        return normalize_entry(text) in self._counts
+
+    def add(self, text: str, count: int = 1) -> bool:
+        """加入名单项或累加其使用次数，返回是否为新名单项"""
+        entry = normalize_entry(text)
+        if not entry:
+            return False
+        with self._lock:
+            if entry in self._counts:
+                self._counts[entry] += count
+                return False
+            self._counts[entry] = count
+            for ch in set(entry):
+                self._postings.setdefault(ch, set()).add(entry)
+            self._by_length.setdefault(len(entry), set()).add(entry)
+            self._longest = max(self._longest, len(entry))
+            return True
+
+    def entries(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def _candidates(self, query: str, limit: int) -> Iterable[str]:
+        distinct = set(query)
+        required = len(distinct) - limit
+        if required <= 0:
+            return [
+                entry
+                for length in range(max(1, len(query) - limit), len(query) + limit + 1)
+                for entry in self._by_length.get(length, ())
+            ]
+        shared: Counter = Counter()
+        for ch in distinct:
+            shared.update(self._postings.get(ch, ()))
+        return [
+            entry for entry, count in shared.items()
+            if count >= required and abs(len(entry) - len(query)) <= limit
+        ]
+
+    def match(self, text: str) -> Optional[RosterMatch]:
+        """
+        在距离阈值内查找最接近的名单项
+
+        距离相同时取使用次数多的；存在同样接近、次数也相同的其他名单项时标记为不唯一。
+        """
+        query = normalize_entry(text)
+        if not query:
+            return None
+        limit = max(1, int(len(query) * MAX_DISTANCE_RATIO))
+        with self._lock:
+            if query in self._counts:
+                return RosterMatch(entry=query, distance=0, score=1.0)
+            # 比最长的名单项还长出阈值以上的文字不可能匹配，直接放弃
+            if len(query) - self._longest > limit:
+                return None
+            found = []
+            for entry in self._candidates(query, limit):
+                distance = edit_distance(query, entry, limit)
+                if distance <= limit:
+                    found.append((distance, -self._counts[entry], entry))
+        if not found:
+            return None
+        found.sort()
+        distance, neg_count, entry = found[0]
+        unique = len(found) == 1 or found[1][:2] != (distance, neg_count)
+        return RosterMatch(
+            entry=entry,
+            distance=distance,
+            score=1.0 - distance / max(len(query), len(entry)),
+            unique=unique,
+        )
+
+
+class RosterStore:
+    """按字段参数名分组的名单集合，持久化到 JSON 文件"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._rosters: Dict[str, Roster] = {}
+
+    def load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"读取名单失败: {e}")
+            return
+        self._rosters = {name: Roster(entries) for name, entries in data.items()}
+
+    def save(self) -> None:
+        """原子替换名单文件：每次提交成功后都会保存，写到一半中断不能丢掉已学习的名单"""
+        data = {name: roster.entries() for name, roster in self._rosters.items() if len(roster)}
+        atomic_write_text(self.path, json.dumps(data, ensure_ascii=False, indent=2))
+
+    def get(self, param_name: str) -> Roster:
+        roster = self._rosters.get(param_name)
+        if roster is None:
+            roster = self._rosters[param_name] = Roster()
+        return roster
+
+    def import_file(self, param_name: str, path: Path) -> int:
+        """
+        从文本文件导入名单，每行一项；CSV/制表符分隔的行取第一列
+
+        Returns:
+            新增的名单项数
+        """
+        roster = self.get(param_name)
+        added = 0
+        for line in path.read_text(encoding="utf-8-sig").splitlines():
+            entry = re.split(r"[,\t]", line, maxsplit=1)[0]
+            if roster.add(entry):
+                added += 1
+        return added
+
+    def learn(self, param_name: str, value: str) -> bool:
+        """学习一条确认过的值，过长的值不学习；返回是否为新名单项"""
+        entry = normalize_entry(value)
+        if not entry or len(entry) > MAX_ENTRY_LENGTH:
+            return False
+        return self.get(param_name).add(entry)
+
+    def seed(self, fields: Iterable) -> None:
+        """用启用名单匹配的字段的识别示例（人工确认过的值）补充名单"""
+        for f in fields:
+            if f.use_roster and f.sample_value and f.sample_value not in self.get(f.param_name):
+                self.learn(f.param_name, f.sample_value)
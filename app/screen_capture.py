@@ -0,0 +1,309 @@
+"""
+屏幕截图后端 - 截屏方式可替换，同一次刷卡中的多次截屏共享同一帧
+
+- pil：PIL.ImageGrab（Windows/macOS，Linux 下依赖 X11）
+- mss：mss 库（Windows GDI、X11 XShm、macOS），在 X11/Xvfb 下也能使用，通常比 pil 快
+- replay：从保存的整屏截图文件读取，用于测试、基准和问题复现，不需要显示器
+
+截到的帧缓存 ttl_ms 毫秒：在此期间请求的区域被缓存帧覆盖时直接从该帧裁剪，
+一次刷卡的各字段、重试和后台预识别不会重复截屏。各后端的截屏耗时单独统计。
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union
+
+try:
+    import PIL.Image
+    import PIL.ImageGrab
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# 截屏区域 (left, top, right, bottom)，为None时截取主屏幕
+BBox = Tuple[int, int, int, int]
+
+# 帧缓存有效期（毫秒）：只合并同一次识别流程中紧挨着的截屏，不会拿到过期的画面
+DEFAULT_TTL_MS = 20
+
+# 同时保留的帧数，锚点搜索和字段区域通常是不相交的两块
+MAX_CACHED_FRAMES = 4
+
+CAPTURE_BACKENDS = ("auto", "pil", "mss", "replay")
+
+BACKEND_LABELS = {
+    "auto": "自动",
+    "pil": "PIL",
+    "mss": "mss",
+    "replay": "回放截图文件",
+}
+
+
+class CaptureProvider:
+    """截屏后端基类，子类实现 grab"""
+
+    name = "base"
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class PILCapture(CaptureProvider):
+    name = "pil"
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        return PIL.ImageGrab.grab(bbox=bbox)
+
+
+class MSSCapture(CaptureProvider):
+    """mss 实例持有的设备上下文不能跨线程使用，每个线程各建一个"""
+
+    name = "mss"
+
+    def __init__(self) -> None:
+        import mss  # noqa: F401
+
+        self._local = threading.local()
+        self._instances: List = []
+        self._lock = threading.Lock()
+
+    def _sct(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            import mss
+
+            sct = self._local.sct = mss.mss()
+            with self._lock:
+                self._instances.append(sct)
+        return sct
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        sct = self._sct()
+        if bbox is None:
+            monitor = sct.monitors[1] if len(sct.monitors) > 1 else sct.monitors[0]
+        else:
+            left, top, right, bottom = bbox
+            monitor = {"left": left, "top": top, "width": right - left, "height": bottom - top}
+        shot = sct.grab(monitor)
+        return PIL.Image.frombytes("RGB", shot.size, shot.bgra, "raw", "BGRX")
+
+    def close(self) -> None:
+        with self._lock:
+            instances, self._instances = self._instances, []
+        for sct in instances:
+            try:
+                sct.close()
+            except Exception:
+                pass
+
+
+class ReplayCapture(CaptureProvider):
+    """
+    回放保存的整屏截图：path 为单个图片文件或图片目录（按文件名排序）
+
+    截图左上角对应屏幕坐标 (0, 0)，超出截图范围的部分为黑色。调用 advance()
+    切换到下一帧，到末尾后从头循环。
+    """
+
+    name = "replay"
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        path = Path(path)
+        if path.is_dir():
+            self.paths = sorted(p for p in path.iterdir() if p.suffix.lower() in (".png", ".jpg", ".jpeg", ".bmp"))
+        else:
+            self.paths = [path]
+        if not self.paths or not self.paths[0].exists():
+            raise FileNotFoundError(f"没有可回放的截图: {path}")
+        self._index = 0
+        self._frame: Optional["PIL.Image.Image"] = None
+        self._lock = threading.Lock()
+
+    def _current(self) -> "PIL.Image.Image":
+        if self._frame is None:
+            with PIL.Image.open(self.paths[self._index]) as image:
+                self._frame = image.convert("RGB")
+        return self._frame
+
+    def advance(self) -> int:
+        """切换到下一帧，返回新帧的序号"""
+        with self._lock:
+            self._index = (self._index + 1) % len(self.paths)
+            self._frame = None
+            return self._index
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        with self._lock:
+            frame = self._current()
+            return frame.copy() if bbox is None else frame.crop(bbox)
+
+
+def _mss_available() -> bool:
+    try:
+        return importlib.util.find_spec("mss") is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def create_provider(backend: str = "auto", replay_path: Optional[Union[str, Path]] = None) -> CaptureProvider:
+    """按名称创建截屏后端；auto 在安装了 mss 时使用 mss，否则使用 PIL"""
+    if backend == "replay":
+        return ReplayCapture(replay_path or "")
+    if backend == "mss" or (backend == "auto" and _mss_available()):
+        try:
+            return MSSCapture()
+        except ImportError:
+            if backend == "mss":
+                raise
+    return PILCapture()
+
+
+def _contains(outer: BBox, inner: BBox) -> bool:
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class ScreenCapture:
+    """带短时帧缓存和耗时统计的截屏入口，线程安全"""
+
+    def __init__(self, provider: CaptureProvider, ttl_ms: float = DEFAULT_TTL_MS) -> None:
+        self.provider = provider
+        self.ttl_ms = ttl_ms
+        self._lock = threading.Lock()
+        # (截屏时刻, 区域, 帧)，区域为None表示整个主屏幕
+        self._frames: Deque[Tuple[float, Optional[BBox], "PIL.Image.Image"]] = deque(maxlen=MAX_CACHED_FRAMES)
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @property
+    def backend(self) -> str:
+        return self.provider.name
+
+    def _cached(self, bbox: Optional[BBox], now: float) -> Optional["PIL.Image.Image"]:
+        for taken, area, frame in reversed(self._frames):
+            if (now - taken) * 1000 > self.ttl_ms:
+                continue
+            if area is None or bbox is None:
+                if area == bbox:
+                    return frame.copy()
+                continue
+            if _contains(area, bbox):
+                return frame.crop((bbox[0] - area[0], bbox[1] - area[1], bbox[2] - area[0], bbox[3] - area[1]))
+        return None
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        """截取屏幕区域 (left, top, right, bottom)，为None时截取主屏幕"""
+        if bbox is not None:
+            bbox = tuple(int(v) for v in bbox)  # type: ignore[assignment]
+        if self.ttl_ms > 0:
+            with self._lock:
+                frame = self._cached(bbox, time.perf_counter())
+                if frame is not None:
+                    self._record(0.0, hit=True)
+                    return frame
+        start = time.perf_counter()
+        frame = self.provider.grab(bbox)
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._record(elapsed, hit=False)
+            if self.ttl_ms > 0:
+                self._frames.append((time.perf_counter(), bbox, frame))
+        for fn in list(_grab_listeners):
+            try:
+                fn(bbox, frame)
+            except Exception:
+                pass
+        return frame.copy() if self.ttl_ms > 0 else frame
+
+    def _record(self, elapsed_ms: float, hit: bool) -> None:
+        stats = self._stats.setdefault(
+            self.provider.name, {"grabs": 0, "cache_hits": 0, "total_ms": 0.0, "max_ms": 0.0}
+        )
+        if hit:
+            stats["cache_hits"] += 1
+            return
+        stats["grabs"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def invalidate(self) -> None:
+        """丢弃缓存的帧（例如回放切换到下一帧后）"""
+        with self._lock:
+            self._frames.clear()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各后端的截屏次数、缓存命中次数、平均/最大耗时（毫秒）"""
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                item = dict(stats)
+                item["avg_ms"] = stats["total_ms"] / stats["grabs"] if stats["grabs"] else 0.0
+                result[name] = item
+            return result
+
+    def close(self) -> None:
+        self.invalidate()
+        self.provider.close()
+
+
+_capture: Optional[ScreenCapture] = None
+_capture_lock = threading.Lock()
+
+# 每次实际截屏（不含帧缓存命中）后调用 fn(区域, 帧)，用于录制刷卡会话
+_grab_listeners: List[Callable[[Optional[BBox], "PIL.Image.Image"], None]] = []
+
+
+def add_grab_listener(fn: Callable[[Optional[BBox], "PIL.Image.Image"], None]) -> None:
+    """在截屏线程中调用 fn，不能修改帧，也不能阻塞"""
+    _grab_listeners.append(fn)
+
+
+def remove_grab_listener(fn: Callable[[Optional[BBox], "PIL.Image.Image"], None]) -> None:
+    if fn in _grab_listeners:
+        _grab_listeners.remove(fn)
+
+
+def configure_screen_capture(
+    backend: str = "auto",
+    ttl_ms: float = DEFAULT_TTL_MS,
+    replay_path: Optional[Union[str, Path]] = None,
+    provider: Optional[CaptureProvider] = None,
+) -> ScreenCapture:
+    """
+    重新配置全局截屏入口
+
+    Args:
+        backend: auto / pil / mss / replay
+        ttl_ms: 帧缓存有效期（毫秒），为0时不缓存
+        replay_path: replay 后端读取的截图文件或目录
+        provider: 直接使用该截屏后端（例如会话回放），此时忽略 backend
+    """
+    global _capture
+    if provider is None:
+        provider = create_provider(backend, replay_path)
+    with _capture_lock:
+        old_capture, _capture = _capture, ScreenCapture(provider, ttl_ms)
+    if old_capture is not None:
+        old_capture.close()
+    return _capture
+
+
+def get_screen_capture() -> ScreenCapture:
+    """获取全局截屏入口，未配置时使用自动选择的后端"""
+    global _capture
+    if _capture is None:
+        with _capture_lock:
+            if _capture is None:
+                _capture = ScreenCapture(create_provider("auto"))
+    return _capture
+
+
+def grab(bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+    """便捷的截屏函数，见 ScreenCapture.grab"""
+    return get_screen_capture().grab(bbox)
@@ -0,0 +1,202 @@
+"""
+屏幕变化监视器 - 后台预识别
+
+以较低频率只截取已配置的字段识别区域，在缩小的灰度图上比较像素变化；
+字段内容发生变化并稳定下来后，在后台低优先级线程中提前完成OCR识别。
+识别结果写入 ocr_engine 的内容寻址缓存，刷卡时像素未变化的字段直接命中缓存，
+只有自上次预识别后发生变化的字段才需要重新识别。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+    import PIL.Image
+    WATCHER_AVAILABLE = True
+except ImportError:
+    WATCHER_AVAILABLE = False
+
+# 监视区域: (field_id, (x, y, width, height), 预处理方案)
+WatchRegion = Tuple[str, Tuple[int, int, int, int], str]
+
+
+@dataclass
+class _FieldWatchState:
+    signature: Optional["np.ndarray"] = None
+    changed: bool = True  # 首次看到的内容也需要预识别
+    stable_ticks: int = 0
+    text: str = ""
+    recognized_at: float = 0.0
+
+
+def _lower_current_thread_priority() -> None:
+    """尽量降低当前线程的调度优先级，避免与界面和刷卡流程抢占CPU"""
+    try:
+        if os.name == "nt":
+            import ctypes
+
+            THREAD_PRIORITY_BELOW_NORMAL = -1
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_PRIORITY_BELOW_NORMAL)
+        elif hasattr(os, "setpriority"):
+            # Linux 上 nice 值按线程生效
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except Exception:
+        pass
+
+
+class ScreenChangeWatcher:
+    """后台屏幕变化监视器，字段内容变化并稳定后提前识别"""
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        settle_ticks: int = 2,
+        diff_threshold: float = 1.5,
+        downscale: int = 4,
+        logger: Optional[Callable[[str], None]] = None,
+    ):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            settle_ticks: 变化后需要连续保持不变的采样次数
+            diff_threshold: 缩小灰度图的平均像素差阈值（0-255），超过视为变化
+            downscale: 比较前的缩小倍数
+            logger: 日志回调
+        """
+        self.interval = max(0.05, interval)
+        self.settle_ticks = max(1, settle_ticks)
+        self.diff_threshold = diff_threshold
+        self.downscale = max(1, downscale)
+        self._log = logger or (lambda _msg: None)
+
+        self._regions: List[WatchRegion] = []
+        self._states: Dict[str, _FieldWatchState] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._pause_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+        self.ticks = 0
+        self.speculative_runs = 0
+
+    # --- 控制
+    def start(self) -> bool:
+        if not WATCHER_AVAILABLE:
+            self._log("[预识别] 缺少 numpy/pillow，无法启动屏幕变化监视")
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="screen-watcher", daemon=True)
+        self._thread.start()
+        self._log(f"[预识别] 屏幕变化监视已启动，采样间隔 {self.interval:.2f}s")
+        return True
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def set_regions(self, regions: List[WatchRegion]) -> None:
+        """更新监视的字段区域（不可变快照），区域或预处理方案改变的字段重新开始跟踪"""
+        with self._lock:
+            old = {field_id: (rect, profile) for field_id, rect, profile in self._regions}
+            self._regions = list(regions)
+            self._states = {
+                field_id: self._states[field_id]
+                for field_id, rect, profile in self._regions
+                if field_id in self._states and old.get(field_id) == (rect, profile)
+            }
+
+    def pause(self) -> None:
+        """暂停后台预识别（刷卡识别期间调用，让出OCR引擎），可嵌套"""
+        with self._lock:
+            self._pause_count += 1
+
+    def resume(self) -> None:
+        with self._lock:
+            self._pause_count = max(0, self._pause_count - 1)
+
+    def precomputed(self) -> Dict[str, str]:
+        """已预识别字段的最近结果 field_id -> 文字"""
+        with self._lock:
+            return {fid: st.text for fid, st in self._states.items() if st.recognized_at and not st.changed}
+
+    # --- 内部
+    def _signature(self, image: "PIL.Image.Image") -> "np.ndarray":
+        width = max(1, image.width // self.downscale)
+        height = max(1, image.height // self.downscale)
+        small = image.convert("L").resize((width, height), PIL.Image.BOX)
+        return np.asarray(small, dtype=np.int16)
+
+    def _is_different(self, old: Optional["np.ndarray"], new: "np.ndarray") -> bool:
+        if old is None or old.shape != new.shape:
+            return True
+        return float(np.abs(new - old).mean()) > self.diff_threshold
+
+    def _run(self) -> None:
+        _lower_current_thread_priority()
+        while not self._stop_event.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                self._log(f"[预识别] 采样失败: {e}")
+
+    def _tick(self) -> None:
+        from app.ocr_engine import STATE_READY, get_ocr_state, grab_regions, use_ocr_engine
+
+        with self._lock:
+            regions = list(self._regions)
+            paused = self._pause_count > 0
+        if not regions or paused:
+            return
+
+        crops = grab_regions([rect for _, rect, _ in regions])
+        self.ticks += 1
+
+        settled: List[Tuple[str, "PIL.Image.Image", str]] = []
+        with self._lock:
+            for (field_id, _rect, profile), crop in zip(regions, crops):
+                if crop is None:
+                    continue
+                state = self._states.setdefault(field_id, _FieldWatchState())
+                signature = self._signature(crop)
+                if self._is_different(state.signature, signature):
+                    state.changed = True
+                    state.stable_ticks = 0
+                else:
+                    state.stable_ticks += 1
+                state.signature = signature
+                if state.changed and state.stable_ticks >= self.settle_ticks:
+                    settled.append((field_id, crop, profile))
+
+        if not settled or get_ocr_state() != STATE_READY:
+            return
+
+        # 识别结果写入内容寻址缓存，刷卡时相同像素的字段直接命中
+        with use_ocr_engine() as engine:
+            texts = engine.recognize_images(
+                [crop for _, crop, _ in settled], profiles=[profile for _, _, profile in settled]
+            )
+        self.speculative_runs += 1
+        now = time.time()
+        with self._lock:
+            for (field_id, _crop, _profile), text in zip(settled, texts):
+                state = self._states.get(field_id)
+                if state is None:
+                    continue
+                state.changed = False
+                state.text = text
+                state.recognized_at = now
+        self._log(f"[预识别] {len(settled)} 个字段内容变化已稳定，后台识别完成")
@@ -6,7 +6,6 @@ from typing import Optional, Tuple
 import traceback
 
 try:
-    import pyautogui
     import PIL.Image
     import PIL.ImageTk
     import PIL.ImageDraw
@@ -23,6 +22,7 @@ class ScreenshotSelector:
     def __init__(self, parent_window=None):
         self.parent_window = parent_window
         self.result = None  # 返回 (x, y, width, height) 或 None
+        self.screenshot = None  # 框选时使用的全屏截图
         self.screenshot_thread = None
         
     def select_area(self) -> Optional[Tuple[int, int, int, int]]:
@@ -31,8 +31,8 @@ class ScreenshotSelector:
         if not SCREENSHOT_AVAILABLE:
             messagebox.showwarning(
                 "依赖缺失",
-                "屏幕截图功能需要安装 pyautogui 和 pillow\n"
-                "请运行: pip install pyautogui pillow\n"
+                "屏幕截图功能需要安装 pillow\n"
+                "请运行: pip install pillow\n"
                 "将使用手动输入方式"
             )
             return self._manual_input_area()
@@ -90,6 +90,14 @@ class ScreenshotSelector:
             else:
                 return None
     
+    def select_patch(self) -> Optional[Tuple[Tuple[int, int, int, int], "PIL.Image.Image"]]:
+        """框选一块区域并返回 (区域坐标, 该区域的截图)，用于版面锚点的参考图"""
+        area = self.select_area()
+        if not area or self.screenshot is None:
+            return None
+        x, y, w, h = area
+        return area, self.screenshot.crop((x, y, x + w, y + h))
+    
     def _manual_input_area(self) -> Optional[Tuple[int, int, int, int]]:
         """手动输入区域坐标"""
         dialog = tk.Toplevel(self.parent_window)
@@ -179,7 +187,10 @@ class ScreenshotSelector:
                 
             # 截取全屏
             print("正在截取屏幕...")
-            screenshot = pyautogui.screenshot()
+            from app.screen_capture import grab
+
+            screenshot = grab()
+            self.screenshot = screenshot
             print(f"截图成功，尺寸: {screenshot.size}")
             
             # 创建选择窗口
@@ -0,0 +1,352 @@
+"""
+刷卡会话录制与回放 - 在离线环境中复现现场的慢刷卡
+
+录制（SessionRecorder）把一段时间内的刷卡按关联ID写入一个 zip 归档：
+    session.json     录制开始/结束时间、当时的配置
+    events.jsonl     每行一个事件：
+                       card    卡号到达（相对开始的秒数、卡号、来源）
+                       frame   刷卡流程中的一次截屏（区域和 frames/ 下的PNG）
+                       http    验证/绑定接口的一次请求和响应（含耗时或错误）
+                       result  流程结束（结果、总耗时、各环节耗时）
+    frames/*.png     截屏
+    files/           录制开始时的名单和锚点参考图
+
+回放（scripts/replay_session.py）在无界面服务中运行真实的刷卡流程：卡号按录制的间隔
+（或尽快）送入，SessionCapture 用录制的截屏代替屏幕，ReplayTransport 用录制的响应代替
+接口，最后对比录制和回放的吞吐、延迟和提交的字段值。
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import queue
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import PIL.Image
+
+from app.config_manager import AppConfig
+from app.screen_capture import BBox, CaptureProvider, add_grab_listener, remove_grab_listener
+from app.tracing import TRACER, Trace, current_trace
+
+SESSION_VERSION = 1
+
+# 回放时追踪中记录原关联ID的卡号字段
+REPLAY_OF = "replay_of"
+
+
+def stage_durations(trace: Trace) -> Dict[str, float]:
+    """追踪根节点下各环节的耗时（毫秒），同名环节累加"""
+    stages: Dict[str, float] = defaultdict(float)
+    for span in list(trace.root.children):
+        if span.end is not None:
+            stages[span.name] += round((span.end - span.start) * 1000, 2)
+    return dict(stages)
+
+
+class RecordingTransport:
+    """包装 requests：照常发送请求，同时把请求和响应记录到会话"""
+
+    def __init__(self, inner, recorder: "SessionRecorder") -> None:
+        self._inner = inner
+        self._recorder = recorder
+
+    def _call(self, method: str, url: str, body: Optional[Dict], **kwargs):
+        start = time.perf_counter()
+        try:
+            if method == "POST":
+                resp = self._inner.post(url, json=body, **kwargs)
+            else:
+                resp = self._inner.get(url, **kwargs)
+        except Exception as e:
+            self._recorder.http(method, url, body, (time.perf_counter() - start) * 1000, error=str(e))
+            raise
+        self._recorder.http(
+            method, url, body, (time.perf_counter() - start) * 1000, status=resp.status_code, text=resp.text
+        )
+        return resp
+
+    def get(self, url: str, **kwargs):
+        return self._call("GET", url, None, **kwargs)
+
+    def post(self, url: str, json: Optional[Dict] = None, **kwargs):
+        return self._call("POST", url, json, **kwargs)
+
+
+class SessionRecorder:
+    """
+    录制刷卡会话
+
+    start() 后记录刷卡流程中的截屏和流程结果；调用方在卡号到达时调用 card()，
+    并把 SwipePipeline.http 换成 transport(pipeline.http)。截屏在后台线程中编码写入，
+    不占用刷卡流程的时间；close() 写入事件列表并关闭归档。
+
+    Args:
+        path: 归档文件（.zip）
+        config: 录制时的配置
+        workdir: 配置目录，名单和锚点参考图从这里复制
+    """
+
+    def __init__(
+        self, path: Path, config: AppConfig, workdir: Path, log: Optional[Callable[[str], None]] = None
+    ) -> None:
+        self.path = Path(path)
+        self.config = config
+        self.workdir = workdir
+        self._log = log or (lambda _line: None)
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # 归档只在写入线程和 close() 中访问，与事件列表分开加锁，写截屏时不阻塞刷卡流程
+        self._zip_lock = threading.Lock()
+        self._frames: "queue.Queue[Optional[Tuple[str, PIL.Image.Image]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._frame_count = 0
+        self._started_at = 0.0
+
+    def start(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED)
+        self._started_at = time.time()
+        for name in ("rosters.json", self.config.anchor.image_file if self.config.anchor else ""):
+            source = self.workdir / name if name else None
+            if source is not None and source.is_file():
+                self._zip.write(source, f"files/{Path(name).name}")
+        self._writer = threading.Thread(target=self._write_frames, name="session-recorder", daemon=True)
+        self._writer.start()
+        add_grab_listener(self._on_grab)
+        TRACER.add_listener(self._on_trace_end)
+        self._log(f"[录制] 开始录制刷卡会话：{self.path}")
+
+    def transport(self, inner) -> RecordingTransport:
+        return RecordingTransport(inner, self)
+
+    def _add(self, event: Dict[str, Any], at: Optional[float] = None) -> None:
+        event["t"] = round((time.time() if at is None else at) - self._started_at, 4)
+        with self._lock:
+            self._events.append(event)
+
+    def card(self, card: Dict[str, Any]) -> None:
+        """卡号到达（TRACER.begin 之后、去重之前调用）"""
+        self._add({
+            "type": "card",
+            "trace_id": card.get("trace_id", ""),
+            "card": {key: card.get(key, "") for key in ("hex", "dec", "source")},
+        }, at=card.get("arrived_at"))
+
+    def http(
+        self, method: str, url: str, body: Optional[Dict], elapsed_ms: float,
+        status: int = 0, text: str = "", error: str = "",
+    ) -> None:
+        trace = current_trace()
+        event = {
+            "type": "http", "trace_id": trace.trace_id if trace else "", "method": method, "url": url,
+            "body": body, "elapsed_ms": round(elapsed_ms, 1),
+        }
+        if error:
+            event["error"] = error
+        else:
+            event.update(status=status, text=text)
+        self._add(event)
+
+    def _on_grab(self, bbox: Optional[BBox], frame: "PIL.Image.Image") -> None:
+        trace = current_trace()
+        if trace is None:
+            # 刷卡流程以外的截屏（定位、校准等）不录制
+            return
+        with self._lock:
+            self._frame_count += 1
+            name = f"frames/{self._frame_count:06d}.png"
+        left, top = (bbox[0], bbox[1]) if bbox else (0, 0)
+        self._add({
+            "type": "frame", "trace_id": trace.trace_id, "file": name,
+            "bbox": [left, top, left + frame.width, top + frame.height],
+        })
+        self._frames.put((name, frame.copy()))
+
+    def _on_trace_end(self, trace: Trace) -> None:
+        root = trace.root
+        self._add({
+            "type": "result", "trace_id": trace.trace_id, "outcome": root.attrs.get("outcome", ""),
+            "duration_ms": round(((root.end or time.time()) - root.start) * 1000, 2),
+            "stages": stage_durations(trace),
+        })
+
+    def _write_frames(self) -> None:
+        while True:
+            item = self._frames.get()
+            if item is None:
+                return
+            name, frame = item
+            buffer = io.BytesIO()
+            frame.save(buffer, format="PNG", optimize=False)
+            with self._zip_lock:
+                if self._zip is not None:
+                    # PNG 已经压缩过
+                    self._zip.writestr(zipfile.ZipInfo(name, time.localtime()[:6]), buffer.getvalue())
+
+    def close(self) -> None:
+        if self._zip is None:
+            return
+        remove_grab_listener(self._on_grab)
+        TRACER.remove_listener(self._on_trace_end)
+        self._frames.put(None)
+        if self._writer is not None:
+            self._writer.join(timeout=30)
+        with self._lock:
+            events = sorted(self._events, key=lambda e: e["t"])
+        with self._zip_lock:
+            archive, self._zip = self._zip, None
+        cards = sum(1 for e in events if e["type"] == "card")
+        archive.writestr("events.jsonl", "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events))
+        archive.writestr("session.json", json.dumps({
+            "version": SESSION_VERSION,
+            "started_at": self._started_at,
+            "ended_at": time.time(),
+            "cards": cards,
+            "frames": self._frame_count,
+            "config": self.config.to_dict(),
+        }, ensure_ascii=False, indent=2))
+        archive.close()
+        self._log(f"[录制] 已保存刷卡会话：{self.path}（{cards} 次刷卡，{self._frame_count} 张截屏）")
+
+
+class SessionArchive:
+    """读取录制的会话归档"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._zip = zipfile.ZipFile(self.path)
+        self._lock = threading.Lock()
+        self.info: Dict[str, Any] = json.loads(self._zip.read("session.json"))
+        self.events: List[Dict[str, Any]] = [
+            json.loads(line) for line in self._zip.read("events.jsonl").decode("utf-8").splitlines() if line.strip()
+        ]
+        self.cards = [e for e in self.events if e["type"] == "card"]
+        self.results = {e["trace_id"]: e for e in self.events if e["type"] == "result"}
+        self.frames: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.exchanges: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for event in self.events:
+            if event["type"] == "frame":
+                self.frames[event["trace_id"]].append(event)
+            elif event["type"] == "http":
+                self.exchanges[event["trace_id"]].append(event)
+        self._images: Dict[str, "PIL.Image.Image"] = {}
+
+    @property
+    def config(self) -> AppConfig:
+        return AppConfig.from_dict(self.info.get("config") or {})
+
+    def extract_files(self, target: Path) -> None:
+        """把录制时的名单和锚点参考图解压到 target 目录"""
+        for name in self._zip.namelist():
+            if name.startswith("files/"):
+                (target / Path(name).name).write_bytes(self._zip.read(name))
+
+    def image(self, name: str) -> "PIL.Image.Image":
+        with self._lock:
+            image = self._images.get(name)
+            if image is None:
+                with PIL.Image.open(io.BytesIO(self._zip.read(name))) as source:
+                    image = self._images[name] = source.convert("RGB")
+            return image
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+def _recorded_trace_id(fallback: str) -> str:
+    trace = current_trace()
+    if trace is not None and trace.card.get(REPLAY_OF):
+        return trace.card[REPLAY_OF]
+    return fallback
+
+
+class SessionCapture(CaptureProvider):
+    """
+    回放截屏：按当前刷卡流程对应的原关联ID取录制的截屏
+
+    请求的区域由该次刷卡录制的各帧拼出（后录制的帧覆盖先录制的），没有录制到的部分为黑色。
+    """
+
+    name = "session"
+
+    def __init__(self, archive: SessionArchive) -> None:
+        self.archive = archive
+        # 不在刷卡流程中（没有当前追踪）时使用最近送入的卡号
+        self.last_trace_id = ""
+
+    def grab(self, bbox: Optional[BBox] = None) -> "PIL.Image.Image":
+        frames = self.archive.frames.get(_recorded_trace_id(self.last_trace_id), [])
+        if bbox is None:
+            bbox = tuple(frames[0]["bbox"]) if frames else (0, 0, 1, 1)  # type: ignore[assignment]
+        left, top, right, bottom = bbox
+        canvas = PIL.Image.new("RGB", (max(1, right - left), max(1, bottom - top)))
+        for frame in frames:
+            f_left, f_top, f_right, f_bottom = frame["bbox"]
+            if f_right <= left or f_left >= right or f_bottom <= top or f_top >= bottom:
+                continue
+            canvas.paste(self.archive.image(frame["file"]), (f_left - left, f_top - top))
+        return canvas
+
+
+class _RecordedResponse:
+    def __init__(self, status: int, text: str) -> None:
+        self.status_code = status
+        self.text = text
+
+    def json(self) -> Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise OSError(f"HTTP {self.status_code}")
+
+
+class ReplayTransport:
+    """
+    回放接口：按原关联ID依次返回录制的响应
+
+    Args:
+        archive: 会话归档
+        realtime: 按录制的耗时等待后再返回（否则立即返回）
+    """
+
+    def __init__(self, archive: SessionArchive, realtime: bool = True) -> None:
+        self.realtime = realtime
+        self._pending = {trace_id: list(items) for trace_id, items in archive.exchanges.items()}
+        self._lock = threading.Lock()
+        # 提交的字段值与录制不同的请求：(原关联ID, 参数名, 录制值, 回放值)
+        self.mismatches: List[Tuple[str, str, str, str]] = []
+
+    def _call(self, method: str, url: str, body: Optional[Dict]) -> _RecordedResponse:
+        trace_id = _recorded_trace_id("")
+        with self._lock:
+            pending = self._pending.get(trace_id, [])
+            exchange = next((e for e in pending if e["method"] == method), None)
+            if exchange is not None:
+                pending.remove(exchange)
+        if exchange is None:
+            raise OSError(f"录制中没有关联ID {trace_id or '-'} 的 {method} 请求")
+        if body and isinstance(exchange.get("body"), dict):
+            recorded = exchange["body"].get("fields") or {}
+            for name, value in (body.get("fields") or {}).items():
+                if name in recorded and recorded[name] != value:
+                    with self._lock:
+                        self.mismatches.append((trace_id, name, recorded[name], value))
+        if self.realtime:
+            time.sleep(exchange.get("elapsed_ms", 0.0) / 1000)
+        if exchange.get("error"):
+            raise OSError(exchange["error"])
+        return _RecordedResponse(exchange.get("status", 200), exchange.get("text", ""))
+
+    def get(self, url: str, **kwargs) -> _RecordedResponse:
+        return self._call("GET", url, None)
+
+    def post(self, url: str, json: Optional[Dict] = None, **kwargs) -> _RecordedResponse:
+        return self._call("POST", url, json)
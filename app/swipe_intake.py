@@ -0,0 +1,167 @@
+"""
+刷卡入口队列 - 跨来源去重、限制同时进行的流程数、流水线式刷卡排队
+
+同一次刷卡可能从 BLE 通知、HID 键盘输入、以及转交 HID 监听器后再次回调等多个途径
+到达。入口按卡号去重：dedupe_seconds 内重复到达的同一卡号无论来源都只处理一次。
+
+- 默认模式：新卡立即开始处理，取消仍在进行的旧流程（见 app/swipe_workflow.py）
+- 流水线模式：最多 max_active 个流程同时进行（包括等待确认的），之后的刷卡按到达顺序
+  排队，前一个流程结束（提交、失败或取消）后自动开始，不会覆盖正在确认的绑定对话框
+
+只在界面线程中调用。
+"""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from app.metrics import REGISTRY
+from app.tracing import TRACER
+
+# 流水线模式下最多排队的刷卡数，超出时丢弃最早的
+MAX_QUEUED = 20
+
+_CARDS_TOTAL = REGISTRY.counter("swipe_cards_total", "刷卡入口收到的卡号（accepted/duplicate）", labels=("result",))
+_QUEUE_EVENTS = REGISTRY.counter("swipe_queue_events_total", "流水线模式下排队和因队列已满丢弃的刷卡", labels=("event",))
+_QUEUE_WAIT = REGISTRY.histogram("swipe_queue_wait_seconds", "刷卡从到达到开始处理的排队时间")
+_QUEUE_DEPTH = REGISTRY.gauge("swipe_queue_depth", "排队中的刷卡数")
+_ACTIVE_RUNS = REGISTRY.gauge("swipe_active_runs", "进行中的刷卡流程数")
+
+
+def card_key(card: Dict[str, str]) -> str:
+    """去重用的卡号：优先10进制卡号，其次8位16进制卡号"""
+    return (card.get("dec") or card.get("hex") or "").strip().upper()
+
+
+class SwipeIntake:
+    """
+    刷卡入口
+
+    Args:
+        start: 开始处理一次刷卡的回调 start(card, preempt)
+        dedupe_seconds: 同一卡号在该时间内重复到达视为同一次刷卡
+        pipeline: 流水线模式（排队）；否则新卡取消旧流程
+        max_active: 流水线模式下同时进行的流程数
+        log: 日志回调
+    """
+
+    def __init__(
+        self,
+        start: Callable[[Dict[str, str], bool], None],
+        dedupe_seconds: float = 2.0,
+        pipeline: bool = False,
+        max_active: int = 1,
+        log: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._start = start
+        self.dedupe_seconds = dedupe_seconds
+        self.pipeline = pipeline
+        self.max_active = max(1, max_active)
+        self._log = log or print
+        self._clock = clock
+        self._recent: Dict[str, float] = {}
+        # (卡片, 到达时刻)
+        self._queue: Deque[Tuple[Dict[str, str], float]] = deque()
+        self._active = 0
+        self._stats = {
+            "received": 0, "duplicates": 0, "started": 0, "queued": 0, "dropped": 0,
+            "max_depth": 0, "total_wait_ms": 0.0, "max_wait_ms": 0.0,
+        }
+
+    def configure(self, dedupe_seconds: float, pipeline: bool, max_active: int) -> None:
+        self.dedupe_seconds = dedupe_seconds
+        self.pipeline = pipeline
+        self.max_active = max(1, max_active)
+        self._pump()
+
+    @property
+    def depth(self) -> int:
+        """排队中的刷卡数"""
+        return len(self._queue)
+
+    def accept(self, card: Dict[str, str]) -> bool:
+        """去重：同一卡号在去重窗口内再次到达时返回False"""
+        key = card_key(card)
+        if not key:
+            return True
+        now = self._clock()
+        self._stats["received"] += 1
+        # 清理过期记录，去重表只保留窗口内的卡号
+        self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedupe_seconds}
+        seen = self._recent.get(key)
+        if seen is not None:
+            self._stats["duplicates"] += 1
+            _CARDS_TOTAL.inc(result="duplicate")
+            self._log(
+                f"[刷卡] 卡号 {key} 在 {(now - seen) * 1000:.0f}ms 内重复到达（来源 {card.get('source', '未知')}），已忽略"
+            )
+            return False
+        self._recent[key] = now
+        _CARDS_TOTAL.inc(result="accepted")
+        return True
+
+    def submit(self, card: Dict[str, str]) -> bool:
+        """
+        开始处理一次刷卡；流水线模式下进行中的流程已满时排队
+
+        Returns:
+            是否立即开始
+        """
+        if not self.pipeline:
+            self._begin(card, self._clock(), preempt=True)
+            return True
+        if self._active < self.max_active and not self._queue:
+            self._begin(card, self._clock(), preempt=False)
+            return True
+        if len(self._queue) >= MAX_QUEUED:
+            dropped, _ = self._queue.popleft()
+            self._stats["dropped"] += 1
+            _QUEUE_EVENTS.inc(event="dropped")
+            TRACER.end(TRACER.get(dropped), "dropped")
+            self._log(f"[刷卡] 排队已满，丢弃最早的卡号 {card_key(dropped)}")
+        self._queue.append((card, self._clock()))
+        self._stats["queued"] += 1
+        _QUEUE_EVENTS.inc(event="queued")
+        _QUEUE_DEPTH.set(len(self._queue))
+        self._stats["max_depth"] = max(self._stats["max_depth"], len(self._queue))
+        self._log(f"[刷卡] 卡号 {card_key(card)} 排队，前面还有 {self._active + len(self._queue) - 1} 张卡")
+        return False
+
+    def release(self) -> None:
+        """一个流程结束（提交、失败或取消），开始处理排队的下一张卡"""
+        self._active = max(0, self._active - 1)
+        _ACTIVE_RUNS.set(self._active)
+        self._pump()
+
+    def _pump(self) -> None:
+        while self._queue and self._active < self.max_active:
+            card, arrived = self._queue.popleft()
+            self._begin(card, arrived, preempt=False)
+
+    def _begin(self, card: Dict[str, str], arrived: float, preempt: bool) -> None:
+        wait_ms = (self._clock() - arrived) * 1000
+        self._active += 1
+        self._stats["started"] += 1
+        self._stats["total_wait_ms"] += wait_ms
+        self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        _QUEUE_WAIT.observe(wait_ms / 1000)
+        _QUEUE_DEPTH.set(len(self._queue))
+        _ACTIVE_RUNS.set(self._active)
+        if wait_ms >= 1:
+            self._log(f"[刷卡] 卡号 {card_key(card)} 排队 {wait_ms:.0f}ms 后开始处理，队列剩余 {len(self._queue)}")
+            trace = TRACER.get(card)
+            if trace is not None:
+                now = time.time()
+                trace.span("queue_wait", parent=trace.root, start=now - wait_ms / 1000).finish(now)
+        self._start(card, preempt)
+
+    def stats(self) -> Dict[str, float]:
+        """到达/重复/开始/排队/丢弃次数、当前与最大队列深度、平均与最大等待时间（毫秒）"""
+        stats = dict(self._stats)
+        stats["depth"] = len(self._queue)
+        stats["active"] = self._active
+        stats["avg_wait_ms"] = stats["total_wait_ms"] / stats["started"] if stats["started"] else 0.0
+        return stats
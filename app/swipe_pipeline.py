@@ -0,0 +1,510 @@
+"""
+刷卡处理管线 - 验证、字段识别、绑定提交中与界面无关的部分
+
+图形界面（app/main.py）和无界面服务（app/headless.py）共用这里的实现：
+- 洗消验证/信息绑定接口的同步请求和V2验证响应的解析
+- 刷卡流程的字段识别（整页识别、重试策略、名单吸附、字段级清理）
+- 提交payload的组装和提交成功后的名单学习
+
+除 recognize_* 和接口请求可在后台线程中调用外，其余方法只在调度线程中调用。
+"""
+
+from __future__ import annotations
+
+import contextlib
+import datetime as dt
+import json
+import re
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from app.config_manager import AppConfig
+from app.metrics import REGISTRY
+from app.roster import RosterStore
+
+_OCR_STAGE_SECONDS = REGISTRY.histogram("ocr_stage_seconds", "每个字段各识别阶段的耗时", labels=("stage",))
+_OCR_CACHE_LOOKUPS = REGISTRY.counter("ocr_cache_lookups_total", "字段识别的结果缓存命中情况", labels=("result",))
+_OCR_FIELD_ATTEMPTS = REGISTRY.histogram(
+    "ocr_field_attempts", "每个字段识别到通过校验（或放弃）所用的尝试次数", buckets=(1, 2, 3, 4, 5, 6, 8)
+)
+_OCR_FIELD_RESULTS = REGISTRY.counter(
+    "ocr_field_results_total", "字段识别结果（accepted/unverified/empty）", labels=("outcome",)
+)
+
+
+def human_now() -> str:
+    return dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def parse_card_input(value: str, source: str) -> Optional[Dict[str, str]]:
+    """手动输入的卡号：纯数字按10进制，否则按16进制解析；空输入返回None"""
+    clean = value.strip().replace(" ", "")
+    hex_value = ""
+    dec_value = ""
+    if not clean:
+        return None
+    if clean.isdigit():
+        dec_value = clean
+        try:
+            hex_value = f"{int(clean):08X}"
+        except Exception:
+            hex_value = clean
+    else:
+        hex_candidate = clean.upper()
+        try:
+            dec_value = f"{int(hex_candidate, 16):010d}"
+            hex_value = f"{int(hex_candidate, 16):08X}"
+        except Exception:
+            hex_value = hex_candidate
+            dec_value = hex_candidate
+    return {"hex": hex_value, "dec": dec_value, "source": source}
+
+
+def _field_span_attrs(result, **attrs) -> Dict:
+    """追踪中字段分段的属性：识别文字、置信度、缓存命中和各阶段耗时"""
+    attrs.update(text=result.text, confidence=round(result.confidence, 3), cached=result.cached)
+    if result.timings:
+        attrs["timings_ms"] = {stage: round(ms, 1) for stage, ms in result.timings.items()}
+    return attrs
+
+
+def locate_layout_shift(tracker, current: Tuple[int, int], log: Callable[[str], None]) -> Tuple[int, int]:
+    """在锚点原位置附近查找锚点，返回字段区域的平移量；未设置锚点或未找到时为 (0, 0)"""
+    shift = (0, 0)
+    if tracker is None:
+        return shift
+    try:
+        match = tracker.locate()
+    except Exception as e:
+        log(f"[锚点] 定位失败，按原坐标识别: {e}")
+        return shift
+    if match.found:
+        shift = match.shift
+        if shift != current:
+            log(f"[锚点] 版面偏移 ({shift[0]}, {shift[1]})，匹配度 {match.score:.2f}，耗时 {match.elapsed_ms:.1f}ms")
+    else:
+        log(f"[锚点] 未找到锚点（匹配度 {match.score:.2f}），按原坐标识别")
+    return shift
+
+
+class SwipePipeline:
+    """
+    刷卡处理管线
+
+    Args:
+        config: 应用配置（与调用方共享同一对象，配置修改立即生效）
+        rosters: 字段名单
+        log: 日志回调（需线程安全）
+        layout_shift: 不属于刷卡流程的识别（界面线程）前调用，返回字段区域的版面平移量；
+            刷卡流程使用流程自带的锚点定位器，测得的平移写入 run.layout_shift
+    """
+
+    def __init__(
+        self,
+        config: AppConfig,
+        rosters: RosterStore,
+        log: Callable[[str], None],
+        layout_shift: Optional[Callable[[], Tuple[int, int]]] = None,
+    ) -> None:
+        self.config = config
+        self.rosters = rosters
+        self._log = log
+        self._layout_shift = layout_shift or (lambda: (0, 0))
+        # 接口请求的实现（提供 get/post 的对象），会话录制和回放时替换
+        self.http = requests
+
+    # ---- 接口请求 ----
+
+    def post_json(self, url: str, payload: Dict) -> Tuple[bool, Dict]:
+        """同步发送POST请求（在后台线程中调用），返回 (是否成功, 响应或错误)"""
+        if not url:
+            return False, {"error": "未配置接口地址"}
+        try:
+            resp = self.http.post(url, json=payload, timeout=10)
+            resp.raise_for_status()
+            try:
+                return True, resp.json()
+            except json.JSONDecodeError:
+                return True, {"message": resp.text}
+        except Exception as exc:
+            return False, {"error": str(exc)}
+
+    def get_json(self, url: str, payload: Dict) -> Tuple[bool, Dict]:
+        """同步发送GET请求（在后台线程中调用），返回 (是否成功, 响应或错误)"""
+        if not url:
+            return False, {"error": "未配置接口地址"}
+        try:
+            # 构建GET请求URL
+            import urllib.parse
+
+            # V2版本特殊处理：将10位数卡号删除前面4个0，保留后6位，然后拼接到URL后面
+            if self.config.service.selected_version == "v2":
+                card_dec = payload.get("card_dec", "")
+
+                # 处理卡号：删除前面4个0，保留后6位
+                if len(card_dec) == 10 and card_dec.startswith("0000"):
+                    processed_card = card_dec[4:]
+                    self._log(f"[V2] 卡号处理：{card_dec} → {processed_card}")
+                else:
+                    # 如果不是10位或不以前4个0开头，使用原始卡号
+                    processed_card = card_dec
+                    self._log(f"[V2] 卡号未处理：{processed_card}")
+
+                full_url = f"{url}{processed_card}"
+                self._log(f"[V2] 发送GET请求: {full_url}")
+
+                resp = self.http.get(full_url, timeout=10)
+                resp.raise_for_status()
+
+                self._log(f"[V2] 响应状态码: {resp.status_code}")
+                self._log(f"[V2] 响应内容: {resp.text}")
+
+                try:
+                    return True, resp.json()
+                except json.JSONDecodeError:
+                    return True, {"message": resp.text}
+            else:
+                # 其他版本使用标准GET参数
+                params = {}
+
+                # 提取需要的参数
+                if payload.get("card_hex"):
+                    params["card_hex"] = payload["card_hex"]
+                if payload.get("card_dec"):
+                    params["card_dec"] = payload["card_dec"]
+
+                # 添加fields中的参数
+                for field_name, field_value in payload.get("fields", {}).items():
+                    params[field_name] = field_value
+
+                # 构建完整URL
+                if "?" in url:
+                    if url.endswith("?"):
+                        full_url = url + urllib.parse.urlencode(params)
+                    else:
+                        full_url = url + "&" + urllib.parse.urlencode(params)
+                else:
+                    full_url = url + "?" + urllib.parse.urlencode(params)
+
+                self._log(f"[GET] 发送请求: {full_url}")
+
+                resp = self.http.get(full_url, timeout=10)
+                resp.raise_for_status()
+
+                self._log(f"[GET] 响应状态码: {resp.status_code}")
+                self._log(f"[GET] 响应内容: {resp.text}")
+
+                try:
+                    return True, resp.json()
+                except json.JSONDecodeError:
+                    return True, {"message": resp.text}
+        except Exception as exc:
+            return False, {"error": str(exc)}
+
+    def v2_verify_failure(self, ok: bool, response: Dict) -> Optional[str]:
+        """解析V2洗消验证响应：状态为“可用”时返回None，否则返回失败原因"""
+        # 记录完整响应内容以便调试
+        self._log(f"[V2版本] 洗消验证响应内容: {response}")
+
+        if not ok:
+            # 请求失败的情况
+            if isinstance(response, dict):
+                # 检查是否有 "error" 或 "msg" 字段
+                if "error" in response:
+                    msg = response.get("error", "验证失败")
+                elif "msg" in response:
+                    msg = response.get("msg", "验证失败")
+                else:
+                    msg = "验证失败"
+            else:
+                msg = str(response)
+            self._log(f"[V2版本] 洗消验证失败: {msg}")
+            return msg
+
+        # 确保response是字典类型
+        if not isinstance(response, dict):
+            text = str(response)
+            self._log(f"[V2版本] 验证失败: {text}")
+            return text
+
+        # 获取状态码
+        code = response.get("code")
+        self._log(f"[V2版本] 洗消验证接口返回状态码: {code}")
+        if code == 200:
+            self._log(f"[V2版本] 洗消验证接口返回成功 (code=200)")
+
+            # 检查返回内容的 "data.status.first" 是否等于 "可用"
+            data = response.get("data", {})
+            if data and isinstance(data, dict):
+                status = data.get("status", {})
+                if status and isinstance(status, dict) and status.get("first") == "可用":
+                    return None
+
+            # 如果没有 "data.status.first" 或不等于 "可用"，检查是否有 "msg" 字段
+            if "msg" in response:
+                msg = response.get("msg", "验证失败")
+            else:
+                msg = "返回内容格式不符合要求"
+            self._log(f"[V2版本] 验证失败：{msg}")
+            return msg
+
+        # 响应状态码不是200，检查是否有 "msg" 字段
+        if "msg" in response:
+            msg = response.get("msg", "验证失败")
+            self._log(f"[V2版本] 验证失败：{msg}")
+        else:
+            msg = response.get("message", "验证失败")
+            self._log(f"[V2版本] 验证失败: {msg}")
+        return msg
+
+    # ---- 字段识别 ----
+
+    def log_ocr_timings(self, results) -> None:
+        """记录一次批量识别各阶段的耗时，用于分析刷卡延迟"""
+        if not results:
+            return
+        for r in results:
+            _OCR_CACHE_LOOKUPS.inc(result="hit" if r.cached else "miss")
+            for stage, ms in r.timings.items():
+                _OCR_STAGE_SECONDS.observe(ms / 1000, stage=stage)
+        # 截屏和批量推理的耗时由同批字段共享，取各字段的最大值作为该批次的耗时
+        stages = [("capture", "截屏"), ("preprocess", "预处理"), ("inference", "推理"),
+                  ("postprocess", "整理"), ("cache", "缓存"), ("transport", "传输")]
+        parts = []
+        for key, label in stages:
+            values = [r.timings[key] for r in results if key in r.timings]
+            if values:
+                parts.append(f"{label} {max(values):.0f}ms")
+        cached = sum(1 for r in results if r.cached)
+        self._log(f"[OCR] 耗时（{len(results)} 个字段，缓存命中 {cached}）：{' / '.join(parts)}")
+
+    def log_ocr_cache_stats(self) -> None:
+        try:
+            from app.ocr_engine import get_ocr_cache, get_ocr_engine
+
+            stats = get_ocr_cache().stats()
+            self._log(
+                f"[OCR] 结果缓存：命中 {stats['hits']}（磁盘 {stats['disk_hits']}） / 未命中 {stats['misses']} / "
+                f"淘汰 {stats['evictions'] + stats['disk_evictions']}"
+            )
+            pool = getattr(get_ocr_engine(), "pool", None)
+            if pool is not None:
+                pool_stats = pool.stats()
+                self._log(
+                    f"[OCR] 引擎池：实例 {pool_stats['size']}/{pool_stats['max_size']}，"
+                    f"空闲 {pool_stats['idle']}，等待 {pool_stats['waits']} 次"
+                )
+        except Exception:
+            pass
+
+    def clean_recognized_value(self, field, recognized_text: str) -> str:
+        """识别结果的字段级清理"""
+        # 特殊处理：年龄字段只保留数字
+        if field.name == "年龄":
+            # 提取所有数字，去掉汉字如"岁"、"月"等
+            numbers = re.findall(r'\d+', recognized_text)
+            if numbers:
+                cleaned_text = ''.join(numbers)
+                self._log(f"[OCR] 年龄字段清理：'{recognized_text}' → '{cleaned_text}'")
+                return cleaned_text
+        return recognized_text
+
+    def recognize_fields_detailed(self, fields, run=None):
+        """
+        批量识别多个字段，返回 field_id -> 结构化识别结果
+
+        启用整页识别时先对所有字段做一次整页检测识别，未通过字段校验的字段再逐字段识别；
+        逐字段识别一次截屏，原始截图未通过的按字段的重试策略用同一帧派生的变体批量重试。
+
+        Args:
+            fields: OCRField 或字段快照，可在后台线程中调用
+            run: 所属的刷卡流程，流程被取消时在各阶段之间抛出 SwipeCancelled
+        """
+        from app.ocr_retry import VARIANT_LABELS, RetryStrategy, recognize_with_strategies
+        from app.swipe_workflow import snapshot_fields
+
+        trace = run.trace if run is not None else None
+
+        def _timed(name: str):
+            return trace.timed(name) if trace is not None else contextlib.nullcontext()
+
+        targets = [f for f in snapshot_fields(fields) if f.area]
+        with _timed("anchor"):
+            if run is not None:
+                run.layout_shift = locate_layout_shift(run.anchor, run.layout_shift, self._log)
+                dx, dy = run.layout_shift
+            else:
+                dx, dy = self._layout_shift()
+        rects = [(x + dx, y + dy, w, h) for x, y, w, h in (f.area for f in targets)]
+        strategies = [
+            RetryStrategy.for_field(
+                f, self.config.ocr.min_confidence, self.rosters.get(f.param_name) if f.use_roster else None
+            )
+            for f in targets
+        ]
+
+        results = {}
+        if run is not None:
+            run.check()
+        if self.config.ocr.form_recognition and len(targets) > 1:
+            from app.ocr_engine import use_ocr_engine
+
+            with _timed("form") as form_span:
+                try:
+                    with use_ocr_engine() as engine:
+                        page = engine.recognize_form(rects, labels=[f.name for f in targets])
+                except Exception as e:
+                    self._log(f"[OCR] 整页识别失败，改为逐字段识别: {e}")
+                    page = []
+            if page:
+                self.log_ocr_timings(page)
+            for f, strategy, raw in zip(targets, strategies, page):
+                result, accepted = strategy.evaluate(raw)
+                if accepted:
+                    if raw.text != result.text:
+                        self._log(f"[名单] {f.name}：'{raw.text}' → '{result.text}'")
+                    results[f.field_id] = result
+                    _OCR_FIELD_ATTEMPTS.observe(1)
+                    _OCR_FIELD_RESULTS.inc(outcome="accepted")
+                    if trace is not None:
+                        trace.span(
+                            f"field:{f.name}", parent=form_span, start=form_span.start,
+                            **_field_span_attrs(result, attempts=1, accepted=True, via="form"),
+                        ).finish(form_span.end)
+            if page:
+                self._log(f"[OCR] 整页识别：{len(results)}/{len(targets)} 个字段通过，其余逐字段识别")
+
+        # 每轮批量识别的结束时刻，用于追踪中的 ocr_round 和字段分段
+        round_ends: List[float] = []
+        ocr_start = time.time()
+
+        def _on_batch(batch) -> None:
+            if trace is not None:
+                stages = {}
+                for r in batch:
+                    for stage, ms in r.timings.items():
+                        stages[stage] = round(max(stages.get(stage, 0.0), ms), 1)
+                trace.span(
+                    "ocr_round", start=round_ends[-1] if round_ends else ocr_start,
+                    round=len(round_ends) + 1, images=len(batch), stage_max_ms=stages,
+                ).finish()
+            round_ends.append(time.time())
+            self.log_ocr_timings(batch)
+            # 每轮重试之间检查流程是否已被新卡取消
+            if run is not None:
+                run.check()
+
+        if run is not None:
+            run.check()
+        remaining = [idx for idx, f in enumerate(targets) if f.field_id not in results]
+        outcomes = recognize_with_strategies(
+            [rects[idx] for idx in remaining], [strategies[idx] for idx in remaining],
+            on_batch=_on_batch,
+        )
+        for idx, outcome in zip(remaining, outcomes):
+            f = targets[idx]
+            results[f.field_id] = outcome.result
+            if outcome.raw_text and outcome.raw_text != outcome.result.text:
+                self._log(f"[名单] {f.name}：'{outcome.raw_text}' → '{outcome.result.text}'")
+            _OCR_FIELD_ATTEMPTS.observe(outcome.attempts)
+            if trace is not None and round_ends:
+                trace.span(
+                    f"field:{f.name}", start=ocr_start,
+                    **_field_span_attrs(
+                        outcome.result, attempts=outcome.attempts, accepted=outcome.accepted, variant=outcome.variant
+                    ),
+                ).finish(round_ends[0] if outcome.attempts <= 1 else round_ends[-1])
+            if outcome.accepted:
+                _OCR_FIELD_RESULTS.inc(outcome="accepted")
+            else:
+                _OCR_FIELD_RESULTS.inc(outcome="unverified" if outcome.result.text.strip() else "empty")
+            if outcome.attempts <= 1:
+                continue
+            if outcome.accepted:
+                label = VARIANT_LABELS.get(outcome.variant, outcome.variant)
+                self._log(f"[OCR] {f.name} 第 {outcome.attempts} 次尝试（{label}）识别通过")
+            elif outcome.result.text.strip():
+                self._log(
+                    f"[OCR] {f.name} 尝试 {outcome.attempts} 次均未通过校验，"
+                    f"使用置信度最高的结果（{outcome.result.confidence:.2f}）：{outcome.result.text}"
+                )
+        return {f.field_id: results[f.field_id] for f in targets}
+
+    def recognize_swipe(self, run) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """
+        在后台线程中识别刷卡流程的字段快照，返回 (field_id -> 清理后的识别结果, 名单学习候选)
+
+        不修改配置，结果由调用方在调度线程中用 apply_recognized 写回。
+        """
+        from app.roster import LEARN_CONFIDENCE
+
+        # 执行OCR识别所有字段：一次截屏、一次批量推理
+        targets = [f for f in run.fields if f.enabled and f.area]
+        for field in targets:
+            x, y, w, h = field.area
+            self._log(f"[OCR] 开始识别字段：{field.name}，区域：({x},{y},{w},{h})")
+
+        # 进行OCR文字识别，带重试机制
+        recognized = self.recognize_fields_detailed(targets, run)
+        self.log_ocr_cache_stats()
+
+        values: Dict[str, str] = {}
+        candidates: Dict[str, str] = {}
+        for field in targets:
+            result = recognized.get(field.field_id)
+            recognized_text = result.text if result else ""
+            if recognized_text and field.use_roster:
+                # 已在名单中的值累加次数；新值只有识别置信度足够高才在提交成功后学习
+                if recognized_text in self.rosters.get(field.param_name) or result.confidence >= LEARN_CONFIDENCE:
+                    candidates[field.param_name] = recognized_text
+            if recognized_text:
+                recognized_text = self.clean_recognized_value(field, recognized_text)
+                values[field.field_id] = recognized_text
+                self._log(f"[OCR] 识别成功：{field.name} = {recognized_text}（置信度 {result.confidence:.2f}）")
+            else:
+                self._log(f"[OCR] 未识别到文字：{field.name}")
+        return values, candidates
+
+    # ---- 提交 ----
+
+    def apply_recognized(self, values: Dict[str, str]) -> None:
+        """把 field_id -> 识别结果写回字段配置"""
+        for field in self.config.ocr_fields:
+            if field.field_id in values:
+                field.recognized_value = values[field.field_id]
+
+    def collect_field_values(self) -> Dict[str, str]:
+        payload: Dict[str, str] = {}
+        for field in self.config.ocr_fields:
+            if not field.enabled:
+                continue
+            value = field.recognized_value or field.default_value
+            payload[field.param_name] = value
+        return payload
+
+    def missing_fields(self) -> List[str]:
+        """启用但既无识别结果也无默认值的字段名"""
+        return [f.name for f in self.config.ocr_fields if f.enabled and not (f.recognized_value or f.default_value)]
+
+    def build_payload(self, card: Dict[str, str], fields: Optional[Dict[str, str]] = None) -> Dict:
+        """验证/绑定接口的payload；fields 为 None 时使用当前字段值"""
+        return {
+            "card_hex": card.get("hex"),
+            "card_dec": card.get("dec"),
+            "timestamp": human_now(),
+            "fields": self.collect_field_values() if fields is None else fields,
+        }
+
+    def learn_roster_candidates(self, candidates: Dict[str, str]) -> None:
+        """提交成功视为识别结果已确认：已有名单项累加次数，高置信度的新值加入名单"""
+        if not candidates:
+            return
+        for param_name, value in candidates.items():
+            if self.rosters.learn(param_name, value):
+                self._log(f"[名单] 新增 {param_name}: {value}")
+        try:
+            self.rosters.save()
+        except Exception as e:
+            self._log(f"[名单] 保存失败: {e}")
@@ -0,0 +1,403 @@
+"""
+刷卡流程状态机 - 验证、识别、提交在后台线程中执行，界面只通过派发的事件更新
+
+每次刷卡创建一个 SwipeRun，状态依次为
+    received → verifying → recognizing → awaiting_confirm → submitting → done / failed
+默认新卡到达时取消仍在进行的旧流程（cancelled）：旧流程的后台步骤在下一个检查点退出，
+已经在进行的步骤完成后结果被丢弃，不会再更新界面。流程失败时同样停止其后台步骤。
+流水线模式下多个流程可以同时进行（由 app/swipe_intake.py 限制数量），互不取消。
+
+后台步骤可以提前开始（speculate），例如在洗消验证返回前就开始识别字段；
+前一步完成后再用 attach 接收提前开始的步骤的结果，或随流程结束丢弃。
+
+后台步骤只读取刷卡时生成的字段配置快照（FieldSnapshot）和版面锚点，识别结果和
+测得的版面平移回到界面线程后再按 field_id 写回配置。
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.metrics import REGISTRY
+from app.tracing import TRACER, Span, Trace
+
+STATE_RECEIVED = "received"
+STATE_VERIFYING = "verifying"
+STATE_RECOGNIZING = "recognizing"
+STATE_AWAITING_CONFIRM = "awaiting_confirm"
+STATE_SUBMITTING = "submitting"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+_STEP_SECONDS = REGISTRY.histogram("swipe_step_seconds", "刷卡流程后台步骤耗时（验证、识别、绑定）", labels=("step",))
+_STEP_ERRORS = REGISTRY.counter("swipe_step_errors_total", "刷卡流程后台步骤抛出异常的次数", labels=("step",))
+_READY_SECONDS = REGISTRY.histogram("swipe_ready_seconds", "从收到卡号到可以确认提交的耗时")
+_RUN_SECONDS = REGISTRY.histogram("swipe_run_seconds", "刷卡流程从收到卡号到结束的总耗时", labels=("outcome",))
+_RUNS_TOTAL = REGISTRY.counter("swipe_runs_total", "结束的刷卡流程数", labels=("outcome",))
+
+STATE_LABELS = {
+    STATE_RECEIVED: "已收到卡号",
+    STATE_VERIFYING: "洗消验证中",
+    STATE_RECOGNIZING: "识别中",
+    STATE_AWAITING_CONFIRM: "等待确认",
+    STATE_SUBMITTING: "提交中",
+    STATE_DONE: "已完成",
+    STATE_FAILED: "失败",
+    STATE_CANCELLED: "已取消",
+}
+
+FINAL_STATES = frozenset({STATE_DONE, STATE_FAILED, STATE_CANCELLED})
+
+# 允许的状态迁移；任何未结束的状态都可以失败或被取消
+TRANSITIONS = {
+    STATE_RECEIVED: {STATE_VERIFYING, STATE_RECOGNIZING, STATE_AWAITING_CONFIRM},
+    STATE_VERIFYING: {STATE_RECOGNIZING, STATE_AWAITING_CONFIRM},
+    STATE_RECOGNIZING: {STATE_AWAITING_CONFIRM},
+    STATE_AWAITING_CONFIRM: {STATE_SUBMITTING},
+    # 提交失败后回到确认对话框，可以再次提交
+    STATE_SUBMITTING: {STATE_DONE, STATE_AWAITING_CONFIRM},
+}
+
+
+class SwipeCancelled(Exception):
+    """流程已被新的刷卡或用户取消"""
+
+
+@dataclass(frozen=True)
+class FieldSnapshot:
+    """刷卡时字段配置的只读快照，属性名与 OCRField 一致，可直接用于 RetryStrategy.for_field"""
+
+    field_id: str
+    name: str
+    param_name: str
+    enabled: bool
+    default_value: str
+    # 识别区域 (x, y, width, height)，未设置时为None
+    area: Optional[Tuple[int, int, int, int]]
+    preprocess_profile: str
+    retry_variants: str
+    validator: str
+    min_confidence: float
+    use_roster: bool
+
+    @classmethod
+    def of(cls, field) -> "FieldSnapshot":
+        if isinstance(field, FieldSnapshot):
+            return field
+        rect = field.recognition_area
+        return cls(
+            field_id=field.field_id,
+            name=field.name,
+            param_name=field.param_name,
+            enabled=field.enabled,
+            default_value=field.default_value,
+            area=(rect.x, rect.y, rect.width, rect.height) if rect else None,
+            preprocess_profile=field.preprocess_profile,
+            retry_variants=field.retry_variants,
+            validator=field.validator,
+            min_confidence=field.min_confidence,
+            use_roster=field.use_roster,
+        )
+
+
+def snapshot_fields(fields: Sequence) -> Tuple[FieldSnapshot, ...]:
+    """生成字段配置快照"""
+    return tuple(FieldSnapshot.of(f) for f in fields)
+
+
+class SwipeRun:
+    """一次刷卡流程"""
+
+    def __init__(
+        self,
+        run_id: int,
+        card: Dict[str, str],
+        fields: Tuple[FieldSnapshot, ...],
+        trace: Optional[Trace] = None,
+        anchor: Any = None,
+        layout_shift: Tuple[int, int] = (0, 0),
+    ) -> None:
+        self.run_id = run_id
+        self.card = dict(card)
+        self.fields = fields
+        # 刷卡时的版面锚点定位器（未设置锚点时为None）和当时的版面平移；
+        # 识别步骤在后台更新 layout_shift，由界面线程在识别完成后采用
+        self.anchor = anchor
+        self.layout_shift = layout_shift
+        # 本次刷卡的追踪（关联ID为 trace.trace_id）
+        self.trace = trace or TRACER.begin(self.card)
+        self._confirm_span: Optional[Span] = None
+        self.state = STATE_RECEIVED
+        self.error = ""
+        self.started = time.monotonic()
+        # (状态, 进入该状态时距开始的毫秒数)
+        self.history: List[Tuple[str, float]] = [(STATE_RECEIVED, 0.0)]
+        # 后台步骤名称 -> 耗时（毫秒）
+        self.timings: Dict[str, float] = {}
+        # 流程结束（完成、失败或取消）时置位，后台步骤在检查点退出
+        self._stop_event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.state == STATE_CANCELLED
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINAL_STATES
+
+    def entered_ms(self, state: str) -> Optional[float]:
+        """最近一次进入某状态时距开始的毫秒数，未进入过时为None"""
+        for entered, at in reversed(self.history):
+            if entered == state:
+                return at
+        return None
+
+    def check(self) -> None:
+        """后台步骤的检查点：流程已结束（被取消或失败）时抛出 SwipeCancelled"""
+        if self._stop_event.is_set():
+            raise SwipeCancelled(f"刷卡流程 #{self.run_id} 已结束（{STATE_LABELS.get(self.state, self.state)}）")
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started) * 1000
+
+    def describe(self) -> str:
+        """各状态的进入时刻，例如 received 0ms → verifying 2ms → recognizing 180ms"""
+        return " → ".join(f"{state} {at:.0f}ms" for state, at in self.history)
+
+
+class SwipeWorkflow:
+    """
+    管理当前的刷卡流程：状态迁移、取消旧流程、在后台执行步骤并把结果派发回界面线程
+
+    Args:
+        executor: 执行后台步骤的线程池
+        dispatch: 把回调派发到界面线程执行，例如 lambda fn: root.after(0, fn)
+        on_state: 状态变化时在界面线程调用 on_state(流程, 新状态)；事件按发生顺序派发，
+            处理时流程可能已进入后面的状态
+        log: 日志回调（需线程安全）
+    """
+
+    def __init__(
+        self,
+        executor: concurrent.futures.Executor,
+        dispatch: Callable[[Callable[[], None]], None],
+        on_state: Optional[Callable[[SwipeRun, str], None]] = None,
+        log: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        self._executor = executor
+        self._dispatch = dispatch
+        self._on_state = on_state or (lambda _run, _state: None)
+        self._log = log or print
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._current: Optional[SwipeRun] = None
+        # 尚未结束的流程，run_id -> 流程
+        self._active: Dict[int, SwipeRun] = {}
+
+    @property
+    def current(self) -> Optional[SwipeRun]:
+        """最近开始的流程"""
+        return self._current
+
+    def active(self) -> List[SwipeRun]:
+        """尚未结束的流程，按开始顺序"""
+        with self._lock:
+            return list(self._active.values())
+
+    def is_current(self, run: SwipeRun) -> bool:
+        """流程仍在进行（未结束、未被取消）"""
+        return run.run_id in self._active and not run.stopped
+
+    def start(
+        self,
+        card: Dict[str, str],
+        fields: Sequence,
+        preempt: bool = True,
+        anchor: Any = None,
+        layout_shift: Tuple[int, int] = (0, 0),
+    ) -> SwipeRun:
+        """
+        新卡到达：创建新流程
+
+        Args:
+            preempt: 取消仍在进行的其他流程；流水线模式为False
+            anchor: 版面锚点定位器，在界面线程取得后随流程交给后台识别步骤
+            layout_shift: 当前的版面平移
+        """
+        run = SwipeRun(
+            next(self._ids), card, snapshot_fields(fields), TRACER.get(card), anchor=anchor, layout_shift=layout_shift
+        )
+        with self._lock:
+            previous = list(self._active.values()) if preempt else []
+            self._current = run
+            self._active[run.run_id] = run
+        for old in previous:
+            if not old.finished:
+                self._cancel(old, f"新卡 #{run.run_id} 到达")
+        self._emit(run, STATE_RECEIVED)
+        return run
+
+    def cancel(self, run: Optional[SwipeRun] = None, reason: str = "") -> None:
+        """取消指定流程，未指定时取消所有进行中的流程"""
+        for target in [run] if run is not None else self.active():
+            if not target.finished:
+                self._cancel(target, reason)
+
+    def _cancel(self, run: SwipeRun, reason: str) -> None:
+        previous = run.state
+        self._enter(run, STATE_CANCELLED)
+        suffix = f"：{reason}" if reason else ""
+        self._log(f"[流程] #{run.run_id} 在{STATE_LABELS[previous]}阶段取消{suffix}")
+
+    def transition(self, run: SwipeRun, state: str) -> bool:
+        """
+        迁移到新状态；流程已取消或已被新流程取代时返回False
+
+        Raises:
+            ValueError: 不允许的状态迁移
+        """
+        if run.stopped or run.finished:
+            return False
+        if state not in TRANSITIONS.get(run.state, ()) and state not in (STATE_FAILED, STATE_CANCELLED):
+            raise ValueError(f"刷卡流程不能从 {run.state} 迁移到 {state}")
+        self._enter(run, state)
+        return True
+
+    def fail(self, run: SwipeRun, error: str) -> bool:
+        run.error = error
+        return self.transition(run, STATE_FAILED)
+
+    def finish(self, run: SwipeRun) -> bool:
+        if not self.transition(run, STATE_DONE):
+            return False
+        self._log(
+            f"[流程] #{run.run_id} 完成，用时 {run.elapsed_ms():.0f}ms（{run.describe()}），关联ID {run.trace.trace_id}"
+        )
+        return True
+
+    def _enter(self, run: SwipeRun, state: str) -> None:
+        run.state = state
+        run.history.append((state, run.elapsed_ms()))
+        if run._confirm_span is not None:
+            run._confirm_span.finish()
+            run._confirm_span = None
+        if state == STATE_AWAITING_CONFIRM:
+            run._confirm_span = run.trace.span("confirm_wait", parent=run.trace.root)
+        if state == STATE_AWAITING_CONFIRM and sum(1 for entered, _ in run.history if entered == state) == 1:
+            # 提交失败后回到确认状态不重复记录
+            _READY_SECONDS.observe(run.history[-1][1] / 1000)
+        if state in FINAL_STATES:
+            _RUN_SECONDS.observe(run.history[-1][1] / 1000, outcome=state)
+            _RUNS_TOTAL.inc(outcome=state)
+            attrs = {"error": run.error} if run.error else {}
+            TRACER.end(run.trace, state, run_id=run.run_id, **attrs)
+            run._stop_event.set()
+            with self._lock:
+                self._active.pop(run.run_id, None)
+        self._emit(run, state)
+
+    def _emit(self, run: SwipeRun, state: str) -> None:
+        self._dispatch(lambda: self._on_state(run, state))
+
+    def speculate(
+        self, run: SwipeRun, step: Callable[[SwipeRun], Any], name: Optional[str] = None
+    ) -> Optional[concurrent.futures.Future]:
+        """
+        提前在后台开始 step(run)，不派发结果；之后用 attach 接收结果
+
+        Args:
+            name: 步骤名称，耗时记录到 run.timings[name]
+        """
+        if run.stopped:
+            return None
+
+        def _timed(run: SwipeRun) -> Any:
+            start = time.perf_counter()
+            try:
+                if name:
+                    with run.trace.timed(name):
+                        result = step(run)
+                else:
+                    result = step(run)
+            except SwipeCancelled:
+                raise
+            except Exception:
+                if name:
+                    _STEP_ERRORS.inc(step=name)
+                raise
+            finally:
+                if name:
+                    run.timings[name] = (time.perf_counter() - start) * 1000
+            # 被取消的步骤只执行了一部分，不计入耗时分布
+            if name:
+                _STEP_SECONDS.observe(run.timings[name] / 1000, step=name)
+            return result
+
+        return self._executor.submit(_timed, run)
+
+    def attach(
+        self,
+        run: SwipeRun,
+        future: concurrent.futures.Future,
+        on_done: Callable[[SwipeRun, Any], None],
+        on_error: Optional[Callable[[SwipeRun, Exception], None]] = None,
+    ) -> None:
+        """
+        后台步骤完成后在界面线程调用 on_done(run, 结果)
+
+        流程在此期间结束或被新流程取代时丢弃结果；step 抛出异常时调用 on_error，
+        未提供时流程失败。
+        """
+
+        def _done(future: concurrent.futures.Future) -> None:
+            try:
+                result = future.result()
+            except (SwipeCancelled, concurrent.futures.CancelledError):
+                return
+            except Exception as e:
+                self._dispatch(lambda error=e: self._deliver_error(run, error, on_error))
+                return
+            self._dispatch(lambda: self._deliver(run, result, on_done))
+
+        future.add_done_callback(_done)
+
+    def run_step(
+        self,
+        run: SwipeRun,
+        step: Callable[[SwipeRun], Any],
+        on_done: Callable[[SwipeRun, Any], None],
+        on_error: Optional[Callable[[SwipeRun, Exception], None]] = None,
+        name: Optional[str] = None,
+    ) -> Optional[concurrent.futures.Future]:
+        """在后台执行 step(run)，完成后在界面线程调用 on_done(run, 结果)，见 attach"""
+        future = self.speculate(run, step, name)
+        if future is not None:
+            self.attach(run, future, on_done, on_error)
+        return future
+
+    def _deliver(self, run: SwipeRun, result: Any, on_done: Callable[[SwipeRun, Any], None]) -> None:
+        if not self.is_current(run):
+            self._log(f"[流程] #{run.run_id} 已结束，丢弃后台步骤的结果")
+            return
+        on_done(run, result)
+
+    def _deliver_error(
+        self, run: SwipeRun, error: Exception, on_error: Optional[Callable[[SwipeRun, Exception], None]]
+    ) -> None:
+        if not self.is_current(run):
+            return
+        if on_error is not None:
+            on_error(run, error)
+        else:
+            self._log(f"[流程] #{run.run_id} 出错: {error}")
+            self.fail(run, str(error))
@@ -0,0 +1,234 @@
+"""
+刷卡追踪 - 每次刷卡一个关联ID和一棵耗时分段树，写入按大小轮转的 JSONL 文件
+
+聚合指标（app/metrics.py）只能看出整体分布，解释不了某一次慢刷卡。每张卡到达时
+分配关联ID（card["trace_id"]，日志中同时打印），之后各环节记录起止时间：
+
+    swipe
+    ├─ source        设备回调到进入刷卡处理（卡号解析和派发到调度线程）
+    ├─ dedupe        跨来源去重
+    ├─ queue_wait    流水线模式下的排队
+    ├─ verify        洗消验证请求
+    ├─ recognize     字段识别
+    │  ├─ anchor     版面锚点定位
+    │  ├─ form       整页识别
+    │  ├─ ocr_round  每轮批量识别（第1轮为截屏+原始截图，第2轮为重试变体）
+    │  └─ field:姓名  每个字段从开始识别到最后一轮结束，附尝试次数、置信度、各阶段耗时
+    ├─ confirm_wait  等待确认（绑定对话框）
+    └─ bind          信息绑定请求
+
+流程结束（提交、失败、取消、去重丢弃）时整棵树作为一行 JSON 写入追踪文件。
+分析工具见 scripts/trace_report.py。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import logging.handlers
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+TRACE_FILE = "traces.jsonl"
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 5
+
+# 尚未结束的追踪最多保留的数量，超出时丢弃最早的（例如没有进入刷卡流程的卡号）
+MAX_OPEN_TRACES = 100
+
+_local = threading.local()
+
+
+class Span:
+    """一个耗时分段；时间为 time.time() 秒"""
+
+    __slots__ = ("name", "start", "end", "attrs", "children")
+
+    def __init__(self, name: str, start: Optional[float] = None, **attrs: Any) -> None:
+        self.name = name
+        self.start = time.time() if start is None else start
+        self.end: Optional[float] = None
+        self.attrs: Dict[str, Any] = attrs
+        self.children: List["Span"] = []
+
+    def finish(self, end: Optional[float] = None, **attrs: Any) -> "Span":
+        if self.end is None:
+            self.end = time.time() if end is None else end
+        self.attrs.update(attrs)
+        return self
+
+    def to_dict(self, origin: float, now: float) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "end_ms": round(((self.end if self.end is not None else now) - origin) * 1000, 2),
+        }
+        if self.end is None:
+            data["unfinished"] = True
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.children:
+            data["children"] = [child.to_dict(origin, now) for child in self.children]
+        return data
+
+
+class Trace:
+    """
+    一次刷卡的追踪
+
+    span() 未指定父节点时挂在当前线程正在进行的 timed() 分段下，否则挂在根节点下；
+    各方法可在任意线程中调用。
+    """
+
+    def __init__(self, trace_id: str, card: Dict[str, str], start: Optional[float] = None) -> None:
+        self.trace_id = trace_id
+        self.card = card
+        self.root = Span(
+            "swipe", start, card=card.get("dec") or card.get("hex") or "", source=card.get("source", "")
+        )
+        self._lock = threading.Lock()
+
+    def span(self, name: str, parent: Optional[Span] = None, start: Optional[float] = None, **attrs: Any) -> Span:
+        """开始一个分段，结束时调用 span.finish()"""
+        if parent is None:
+            current = getattr(_local, "current", None)
+            parent = current[1] if current is not None and current[0] is self else self.root
+        span = Span(name, start, **attrs)
+        with self._lock:
+            parent.children.append(span)
+        return span
+
+    @contextmanager
+    def timed(self, name: str, parent: Optional[Span] = None, **attrs: Any) -> Iterator[Span]:
+        """记录代码块的耗时；块内（同一线程）开始的分段挂在该分段下"""
+        span = self.span(name, parent, **attrs)
+        previous = getattr(_local, "current", None)
+        _local.current = (self, span)
+        try:
+            yield span
+        except Exception as e:
+            span.attrs.setdefault("error", str(e) or type(e).__name__)
+            raise
+        finally:
+            _local.current = previous
+            span.finish()
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            tree = self.root.to_dict(self.root.start, now)
+        return {
+            "trace_id": self.trace_id,
+            "started_at": round(self.root.start, 3),
+            "duration_ms": tree["end_ms"],
+            "outcome": self.root.attrs.get("outcome", ""),
+            "root": tree,
+        }
+
+
+class Tracer:
+    """分配关联ID、保存进行中的追踪，结束后写入追踪文件（未配置文件时只在内存中）"""
+
+    def __init__(self) -> None:
+        self._open: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._logger: Optional[logging.Logger] = None
+        self._listeners: List[Callable[[Trace], None]] = []
+
+    def add_listener(self, fn: Callable[[Trace], None]) -> None:
+        """追踪结束后调用 fn(trace)（在调用 end 的线程中，不能阻塞）"""
+        with self._lock:
+            self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[Trace], None]) -> None:
+        with self._lock:
+            if fn in self._listeners:
+                self._listeners.remove(fn)
+
+    def configure(
+        self, path: Optional[Path], max_bytes: int = TRACE_MAX_BYTES, backups: int = TRACE_BACKUPS
+    ) -> None:
+        """设置追踪文件，None 表示不写文件"""
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+                handler.close()
+            self._logger = None
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # 独立的 logger，不传播到程序日志
+        trace_logger = logging.getLogger("app.tracing.file")
+        trace_logger.propagate = False
+        trace_logger.setLevel(logging.INFO)
+        trace_logger.addHandler(handler)
+        self._logger = trace_logger
+
+    @property
+    def writing(self) -> bool:
+        return self._logger is not None
+
+    def begin(self, card: Dict[str, str]) -> Trace:
+        """
+        新卡号到达：分配关联ID写入 card["trace_id"]
+
+        card["arrived_at"]（设备回调时的 time.time()）存在时，从该时刻起记录 source 分段。
+        """
+        trace_id = uuid.uuid4().hex[:12]
+        arrived = card.get("arrived_at")
+        trace = Trace(trace_id, card, start=arrived)
+        if arrived is not None:
+            trace.span("source", start=arrived, source=card.get("source", "")).finish()
+        card["trace_id"] = trace_id
+        with self._lock:
+            self._open[trace_id] = trace
+            while len(self._open) > MAX_OPEN_TRACES:
+                self._open.popitem(last=False)
+        return trace
+
+    def get(self, card: Dict[str, str]) -> Optional[Trace]:
+        """卡号对应的进行中的追踪"""
+        with self._lock:
+            return self._open.get(card.get("trace_id", ""))
+
+    def end(self, trace: Optional[Trace], outcome: str, **attrs: Any) -> None:
+        """结束追踪并写入文件"""
+        if trace is None:
+            return
+        with self._lock:
+            if self._open.pop(trace.trace_id, None) is None:
+                return
+            listeners = list(self._listeners)
+        trace.root.finish(outcome=outcome, **attrs)
+        if self._logger is not None:
+            try:
+                self._logger.info(json.dumps(trace.to_dict(), ensure_ascii=False, default=str))
+            except Exception:
+                pass
+        for fn in listeners:
+            try:
+                fn(trace)
+            except Exception:
+                pass
+
+
+TRACER = Tracer()
+
+
+def current_trace() -> Optional[Trace]:
+    """当前线程正在进行的 timed() 分段所属的追踪（例如刷卡流程的后台步骤中）"""
+    current = getattr(_local, "current", None)
+    return current[0] if current is not None else None
+
+
+def stamp_arrival(card: Dict[str, Any], at: Optional[float] = None) -> Dict[str, Any]:
+    """在设备回调中记录卡号到达的时刻，作为追踪中 source 分段的起点"""
+    card.setdefault("arrived_at", time.time() if at is None else at)
+    return card
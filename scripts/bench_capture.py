@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+截屏后端基准：对比各后端截取整屏和字段区域的耗时
+
+字段区域取 app_settings.json 中已启用字段识别区域的外接矩形（与刷卡时 grab_regions
+截取的范围相同），没有配置字段时使用屏幕左上角 800x300 的区域。不可用的后端（未安装
+mss、没有显示器等）会列出失败原因。--replay 指定截图文件或目录时一并测量回放后端。
+
+用法：
+    python scripts/bench_capture.py
+    python scripts/bench_capture.py --repeat 100 --replay screenshots/full.png
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config_manager import AppConfig  # noqa: E402
+from app.ocr_engine import _region_bbox  # noqa: E402
+from app.screen_capture import ScreenCapture, create_provider  # noqa: E402
+
+
+def _fields_bbox():
+    settings = ROOT / "app_settings.json"
+    if settings.exists():
+        config = AppConfig.from_dict(json.loads(settings.read_text(encoding="utf-8")))
+        boxes = [_region_bbox(f.recognition_area) for f in config.ocr_fields if f.enabled and f.recognition_area]
+        boxes = [b for b in boxes if b[2] > b[0] and b[3] > b[1]]
+        if boxes:
+            return (
+                min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes),
+            )
+    return (0, 0, 800, 300)
+
+
+def _time_grabs(capture: ScreenCapture, bbox, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        capture.grab(bbox)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<24} 平均 {statistics.mean(samples):8.2f} ms  p50 {statistics.median(samples):8.2f} ms  p95 {p95:8.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="截屏后端基准")
+    parser.add_argument("--repeat", type=int, default=50, help="每项重复次数")
+    parser.add_argument("--replay", help="回放后端读取的截图文件或目录")
+    args = parser.parse_args()
+
+    bbox = _fields_bbox()
+    print(f"字段区域 {bbox}，每项重复 {args.repeat} 次\n")
+    backends = ["pil", "mss"] + (["replay"] if args.replay else [])
+    for backend in backends:
+        try:
+            provider = create_provider(backend, args.replay)
+            provider.grab(bbox)
+        except Exception as e:
+            print(f"{backend:<24} 不可用: {e}")
+            continue
+        # 不缓存：每次都真实截屏
+        capture = ScreenCapture(provider, ttl_ms=0)
+        _report(f"{backend} 整屏", _time_grabs(capture, None, args.repeat))
+        _report(f"{backend} 字段区域", _time_grabs(capture, bbox, args.repeat))
+        # 帧缓存：同一次刷卡中的逐字段截屏
+        cached = ScreenCapture(provider, ttl_ms=20)
+        _report(f"{backend} 字段区域(缓存)", _time_grabs(cached, bbox, args.repeat))
+        stats = cached.stats()[provider.name]
+        print(f"{'':<24} 实际截屏 {stats['grabs']:.0f} 次，缓存命中 {stats['cache_hits']:.0f} 次")
+        provider.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+整页识别 vs 逐字段识别基准
+
+screenshots/ 下保存的是各字段的定位截图而不是整页截图，因此把每个字段最近一次的截图
+按两列排布粘贴到白底画布上，合成一张“整页”，记录各字段在画布上的区域，然后对比：
+- 逐字段：各字段截图一次批量推理（与刷卡时 recognize_with_strategies 的第一轮相同）
+- 整页：画布只做一次检测识别，再由 split_form_result 按文本框位置分配给各字段
+
+期望值取 app_settings.json 中各字段的识别示例；没有示例的字段只比较两条路径的结果是否一致。
+不使用识别结果缓存，每轮都真实推理。
+
+用法：
+    python scripts/bench_form_mode.py                        # 自动选择已安装的引擎
+    python scripts/bench_form_mode.py --engine tesseract --repeat 10
+    python scripts/bench_form_mode.py --jitter 6             # 字段截图相对定位区域偏移，模拟定位不准
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import PIL.Image  # noqa: E402
+
+from app.config_manager import AppConfig  # noqa: E402
+from app.ocr_calibration import normalize_text  # noqa: E402
+from app.ocr_engine import (  # noqa: E402
+    ENGINE_PRIORITY,
+    FORM_PROFILE,
+    create_backend,
+    discover_engines,
+    split_form_result,
+)
+
+# 合成整页时字段之间的间距（像素）
+FIELD_GAP = 24
+COLUMN_GAP = 80
+
+
+def _load_fields():
+    """[(字段名, 预处理方案, 期望值, 截图)]，每个字段取最近一次的截图"""
+    settings = ROOT / "app_settings.json"
+    config = AppConfig.from_dict(json.loads(settings.read_text(encoding="utf-8"))) if settings.exists() else AppConfig.default()
+    fields = []
+    for f in config.ocr_fields:
+        shots = list((ROOT / "screenshots").glob(f"{f.name}_*.png"))
+        if not f.enabled or not shots:
+            continue
+        latest = max(shots, key=lambda p: p.stat().st_mtime)
+        fields.append((f.name, f.preprocess_profile, normalize_text(f.sample_value), PIL.Image.open(latest).convert("RGB")))
+    return fields
+
+
+def _compose(crops, jitter: int):
+    """两列排布合成整页，返回画布和各字段区域 (x, y, width, height)"""
+    half = (len(crops) + 1) // 2
+    column_width = max(crop.width for crop in crops) + COLUMN_GAP
+    rects, x, y = [], FIELD_GAP, FIELD_GAP
+    for idx, crop in enumerate(crops):
+        if idx == half:
+            x, y = FIELD_GAP + column_width, FIELD_GAP
+        rects.append((x, y, crop.width, crop.height))
+        y += crop.height + FIELD_GAP
+    width = max(r[0] + r[2] for r in rects) + FIELD_GAP + jitter
+    height = max(r[1] + r[3] for r in rects) + FIELD_GAP + jitter
+    canvas = PIL.Image.new("RGB", (width, height), (255, 255, 255))
+    for crop, (x, y, _, _) in zip(crops, rects):
+        canvas.paste(crop, (x + jitter, y + jitter))
+    return canvas, rects
+
+
+def _report(label: str, samples) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<12} 平均 {statistics.mean(samples):8.1f} ms  p50 {statistics.median(samples):8.1f} ms  p95 {p95:8.1f} ms")
+
+
+def _accuracy(label: str, texts, expected) -> None:
+    checked = [(normalize_text(text), want) for text, want in zip(texts, expected) if want]
+    exact = sum(1 for text, want in checked if text == want)
+    print(f"{label:<12} 与识别示例一致 {exact}/{len(checked)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="整页识别 vs 逐字段识别基准")
+    parser.add_argument("--engine", choices=ENGINE_PRIORITY, help="使用的引擎，默认按优先级选择已安装的引擎")
+    parser.add_argument("--repeat", type=int, default=5, help="每条路径重复次数")
+    parser.add_argument("--jitter", type=int, default=0, help="字段截图相对定位区域向右下偏移的像素")
+    args = parser.parse_args()
+
+    fields = _load_fields()
+    if len(fields) < 2:
+        print("screenshots/ 下至少需要两个已启用字段的截图")
+        return
+    engines = discover_engines()
+    engine_type = args.engine or next((e for e in ENGINE_PRIORITY if engines.get(e, {}).get("available")), None)
+    if engine_type is None:
+        print("没有可用的OCR引擎")
+        return
+
+    names = [name for name, _, _, _ in fields]
+    profiles = [profile for _, profile, _, _ in fields]
+    expected = [want for _, _, want, _ in fields]
+    crops = [crop for _, _, _, crop in fields]
+    canvas, rects = _compose(crops, args.jitter)
+
+    start = time.perf_counter()
+    backend = create_backend(engine_type)
+    backend.recognize_batch_detailed(crops[:1])
+    print(f"引擎 {engine_type}：加载+预热 {(time.perf_counter() - start) * 1000:.0f} ms")
+    print(f"字段 {len(fields)} 个，合成整页 {canvas.width}x{canvas.height}，每条路径重复 {args.repeat} 次\n")
+
+    per_field_ms, form_ms = [], []
+    per_field, form = [], []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        per_field = backend.recognize_batch_detailed(crops, profiles)
+        per_field_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        page = backend.recognize_batch_detailed([canvas], [FORM_PROFILE])[0]
+        form = split_form_result(page, rects)
+        form_ms.append((time.perf_counter() - start) * 1000)
+
+    _report("逐字段", per_field_ms)
+    _report("整页", form_ms)
+    _accuracy("逐字段", [r.text for r in per_field], expected)
+    _accuracy("整页", [r.text for r in form], expected)
+
+    agree = sum(1 for a, b in zip(per_field, form) if normalize_text(a.text) == normalize_text(b.text))
+    print(f"\n两条路径结果一致 {agree}/{len(fields)}")
+    for name, a, b in zip(names, per_field, form):
+        if normalize_text(a.text) != normalize_text(b.text):
+            print(f"  {name}: 逐字段 '{a.text}'  整页 '{b.text}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+OCR输入路径微基准：临时PNG文件 vs 内存数组
+
+用 screenshots/ 下的字段截图，对比每个字段在两种输入方式下的耗时：
+- 旧路径：PNG编码 → 写入临时文件 → 解码 → 删除文件
+- 新路径：image_to_array 直接从像素缓冲区构建数组
+
+用法：
+    python scripts/bench_image_input.py                 # 仅测输入转换开销
+    python scripts/bench_image_input.py --engine paddle # 连同引擎推理一起测
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+import PIL.Image  # noqa: E402
+
+from app.ocr_engine import image_to_array  # noqa: E402
+
+
+def _load_crops(limit: int):
+    paths = sorted((ROOT / "screenshots").glob("*.png"))[:limit]
+    return [PIL.Image.open(p).convert("RGB") for p in paths]
+
+
+def _temp_file_input(image: PIL.Image.Image, consume) -> None:
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_file:
+        image.save(tmp_file.name)
+        tmp_path = tmp_file.name
+    try:
+        consume(tmp_path)
+    finally:
+        Path(tmp_path).unlink(missing_ok=True)
+
+
+def _decode_file(path: str) -> None:
+    # 与引擎内部 cv2.imread 等价的解码开销
+    with PIL.Image.open(path) as img:
+        np.asarray(img.convert("RGB"))
+
+
+def _time_per_field(crops, func, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        for crop in crops:
+            start = time.perf_counter()
+            func(crop)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, samples) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"{label:<28} 平均 {statistics.mean(samples):8.3f} ms  p50 {statistics.median(samples):8.3f} ms  p95 {p95:8.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OCR输入路径微基准")
+    parser.add_argument("--engine", choices=["paddle", "easyocr"], help="同时测量引擎推理（需已安装对应库）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个字段重复次数")
+    parser.add_argument("--limit", type=int, default=60, help="最多使用的截图数量")
+    args = parser.parse_args()
+
+    crops = _load_crops(args.limit)
+    if not crops:
+        print("screenshots/ 下没有截图")
+        return
+    print(f"字段截图 {len(crops)} 张，每张重复 {args.repeat} 次")
+
+    _report("临时PNG文件", _time_per_field(crops, lambda img: _temp_file_input(img, _decode_file), args.repeat))
+    _report("内存数组 (RGB)", _time_per_field(crops, lambda img: image_to_array(img, "RGB"), args.repeat))
+    _report("内存数组 (BGR)", _time_per_field(crops, lambda img: image_to_array(img, "BGR"), args.repeat))
+
+    if args.engine == "paddle":
+        from app.ocr_engine import PaddleOCREngine
+
+        ocr = PaddleOCREngine().ocr
+        repeat = max(1, args.repeat // 10)
+        _report("Paddle + 临时PNG文件", _time_per_field(crops, lambda img: _temp_file_input(img, lambda p: ocr.ocr(p, cls=True)), repeat))
+        _report("Paddle + 内存数组", _time_per_field(crops, lambda img: ocr.ocr(image_to_array(img, "BGR"), cls=True), repeat))
+    elif args.engine == "easyocr":
+        from app.ocr_engine import EasyOCREngine
+
+        reader = EasyOCREngine().reader
+        repeat = max(1, args.repeat // 10)
+        _report("EasyOCR + 临时PNG文件", _time_per_field(crops, lambda img: _temp_file_input(img, reader.readtext), repeat))
+        _report("EasyOCR + 内存数组", _time_per_field(crops, lambda img: reader.readtext(image_to_array(img, "RGB")), repeat))
+
+
+if __name__ == "__main__":
+    main()
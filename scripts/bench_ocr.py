@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+OCR准确率与延迟基准：screenshots/ 下的字段截图 × 各引擎 × 各预处理方案
+
+标注文件 screenshots/ground_truth.json 记录每张截图中可见的文字。每个引擎在独立的
+子进程中通过 OCREngine 加载和识别（绕过识别结果缓存），模型加载耗时和峰值内存互不
+影响。对每个 引擎 × 预处理方案 统计：
+- 完全匹配数、字符错误率（CER，编辑距离 / 标注长度，忽略空白），并按字段细分
+- 单字段识别延迟 p50/p95/p99
+- 模型加载+预热耗时、进程峰值内存（RSS）
+
+预处理方案 field 表示按 app_settings.json 中各字段配置的方案（即实际刷卡时使用的方案）。
+--json 输出的结果按键排序、数值取整，同一环境下两次运行的差异即为识别结果的变化；
+--baseline 指定上次的输出时，列出完全匹配数下降或 CER 上升的字段，以及识别文字有变化的截图。
+
+用法：
+    python scripts/bench_ocr.py
+    python scripts/bench_ocr.py --engines paddle --profiles field,text --repeat 5
+    python scripts/bench_ocr.py --json bench.json --baseline bench_old.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import PIL.Image  # noqa: E402
+
+from app.config_manager import AppConfig  # noqa: E402
+from app.ocr_calibration import normalize_text  # noqa: E402
+from app.ocr_engine import ENGINE_PRIORITY, OCR_ENGINES, discover_engines  # noqa: E402
+from app.ocr_preprocess import PRESETS  # noqa: E402
+from app.roster import edit_distance  # noqa: E402
+
+DEFAULT_MANIFEST = ROOT / "screenshots" / "ground_truth.json"
+
+# 按字段配置选择预处理方案
+FIELD_PROFILE = "field"
+
+
+def _peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    try:
+        import psutil  # type: ignore
+
+        info = psutil.Process().memory_info()
+        peak = getattr(info, "peak_wset", None)
+        if peak:
+            return peak / (1024 * 1024)
+    except ImportError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / (1024 * 1024)
+        return 0.0
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def character_error_rate(text: str, expected: str) -> float:
+    """编辑距离 / 标注长度；标注为空时，识别出任何文字都记为 1"""
+    text, expected = normalize_text(text), normalize_text(expected)
+    if not expected:
+        return 0.0 if not text else 1.0
+    return edit_distance(text, expected) / len(expected)
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def load_manifest(path: Path):
+    """[(文件名, 字段名, 标注文字)]，截图文件不存在的条目跳过"""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    samples = []
+    for name, item in sorted(data.get("samples", {}).items()):
+        if (path.parent / name).exists():
+            samples.append((name, name.rsplit("_", 2)[0], item.get("text", "")))
+    return samples
+
+
+def _field_profiles():
+    """字段名 -> 配置的预处理方案"""
+    settings = ROOT / "app_settings.json"
+    if not settings.exists():
+        return {}
+    config = AppConfig.from_dict(json.loads(settings.read_text(encoding="utf-8")))
+    return {f.name: f.preprocess_profile for f in config.ocr_fields}
+
+
+# ---------------------------------------------------------------- 子进程：单个引擎
+def run_engine(engine_type: str, manifest: Path, profiles, repeat: int):
+    """在当前进程中加载一个引擎并跑完全部截图和预处理方案"""
+    from app.ocr_engine import OCREngine, configure_ocr_pool
+
+    # 逐字段测延迟，不需要并行的引擎实例
+    configure_ocr_pool(1)
+    report = {"engine": engine_type, "error": "", "load_ms": 0.0, "peak_rss_mb": 0.0, "profiles": {}}
+    start = time.perf_counter()
+    engine = OCREngine(preferred_engine=engine_type)
+    if engine.engine_name != engine_type:
+        report["error"] = f"引擎加载失败（实际使用 {engine.engine_name}）"
+        return report
+    engine.warm_up()
+    report["load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    samples = load_manifest(manifest)
+    images = []
+    for name, _, _ in samples:
+        with PIL.Image.open(manifest.parent / name) as img:
+            images.append(img.convert("RGB"))
+    field_profiles = _field_profiles()
+
+    for profile in profiles:
+        latencies = []
+        results = {}
+        fields = {}
+        for (name, field_name, expected), image in zip(samples, images):
+            actual_profile = field_profiles.get(field_name, "") if profile == FIELD_PROFILE else profile
+            text = ""
+            for _ in range(max(1, repeat)):
+                t0 = time.perf_counter()
+                text = engine.recognize_images_detailed([image], use_cache=False, profiles=[actual_profile])[0].text
+                latencies.append((time.perf_counter() - t0) * 1000)
+            cer = character_error_rate(text, expected)
+            exact = normalize_text(text) == normalize_text(expected)
+            results[name] = text
+            stats = fields.setdefault(field_name, {"samples": 0, "exact": 0, "cer": 0.0})
+            stats["samples"] += 1
+            stats["exact"] += int(exact)
+            stats["cer"] += cer
+        latencies.sort()
+        for stats in fields.values():
+            stats["cer"] = round(stats["cer"] / stats["samples"], 3)
+        report["profiles"][profile] = {
+            "samples": len(samples),
+            "exact": sum(s["exact"] for s in fields.values()),
+            "cer": round(
+                sum(character_error_rate(results[n], e) for n, _, e in samples) / max(1, len(samples)), 3
+            ),
+            "p50_ms": round(statistics.median(latencies), 1) if latencies else 0.0,
+            "p95_ms": round(_percentile(latencies, 0.95), 1),
+            "p99_ms": round(_percentile(latencies, 0.99), 1),
+            "fields": fields,
+            "results": results,
+        }
+    report["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return report
+
+
+def _run_in_subprocess(engine_type: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "report.json"
+        command = [
+            sys.executable, str(Path(__file__).resolve()),
+            "--worker", engine_type, "--worker-output", str(output),
+            "--manifest", str(args.manifest), "--profiles", args.profiles, "--repeat", str(args.repeat),
+        ]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if completed.returncode != 0 or not output.exists():
+            error = (completed.stderr or "").strip().splitlines()
+            return {"engine": engine_type, "error": error[-1] if error else f"退出码 {completed.returncode}"}
+        return json.loads(output.read_text(encoding="utf-8"))
+
+
+# ---------------------------------------------------------------- 汇总
+def _print_report(report: dict) -> None:
+    for engine_type, item in report["engines"].items():
+        if item.get("error"):
+            print(f"{engine_type}: 失败 ({item['error']})")
+            continue
+        print(f"{engine_type}: 加载+预热 {item['load_ms']:.0f} ms  峰值内存 {item['peak_rss_mb']:.0f} MB")
+        for profile, stats in item["profiles"].items():
+            print(
+                f"  {profile:<10} 完全匹配 {stats['exact']:>3}/{stats['samples']:<3} CER {stats['cer']:.3f}  "
+                f"p50 {stats['p50_ms']:7.1f} ms  p95 {stats['p95_ms']:7.1f} ms  p99 {stats['p99_ms']:7.1f} ms"
+            )
+            for field_name, field_stats in sorted(stats["fields"].items()):
+                print(
+                    f"    {field_name:<8} {field_stats['exact']}/{field_stats['samples']}  "
+                    f"CER {field_stats['cer']:.3f}"
+                )
+
+
+def _regressions(report: dict, baseline: dict):
+    """完全匹配数下降或 CER 上升的 引擎/方案/字段"""
+    found = []
+    for engine_type, item in report["engines"].items():
+        old_item = baseline.get("engines", {}).get(engine_type, {})
+        for profile, stats in item.get("profiles", {}).items():
+            old_stats = old_item.get("profiles", {}).get(profile)
+            if not old_stats:
+                continue
+            for field_name, field_stats in stats["fields"].items():
+                old = old_stats["fields"].get(field_name)
+                if old and (field_stats["exact"] < old["exact"] or field_stats["cer"] > old["cer"]):
+                    found.append(
+                        f"{engine_type}/{profile}/{field_name}: 完全匹配 {old['exact']} → {field_stats['exact']}，"
+                        f"CER {old['cer']:.3f} → {field_stats['cer']:.3f}"
+                    )
+            for name, text in stats["results"].items():
+                old_text = old_stats["results"].get(name)
+                if old_text is not None and old_text != text:
+                    found.append(f"{engine_type}/{profile}/{name}: '{old_text}' → '{text}'")
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OCR准确率与延迟基准")
+    parser.add_argument("--engines", help="逗号分隔的引擎类型，默认使用所有已安装的引擎")
+    parser.add_argument(
+        "--profiles",
+        default=",".join([FIELD_PROFILE] + [name for name in PRESETS if name != "form"]),
+        help="逗号分隔的预处理方案，field 表示按字段配置",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="每张截图重复识别次数")
+    parser.add_argument("--manifest", type=Path, default=DEFAULT_MANIFEST, help="标注文件")
+    parser.add_argument("--json", type=Path, help="结果写入该 JSON 文件")
+    parser.add_argument("--baseline", type=Path, help="与上次的 JSON 结果比较")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+
+    if args.worker:
+        report = run_engine(args.worker, args.manifest, profiles, args.repeat)
+        args.worker_output.write_text(json.dumps(report, ensure_ascii=False), encoding="utf-8")
+        return
+
+    samples = load_manifest(args.manifest)
+    if not samples:
+        print(f"{args.manifest} 中没有可用的标注截图")
+        return
+    discover_engines()
+    if args.engines:
+        engines = [e.strip() for e in args.engines.split(",") if e.strip()]
+    else:
+        engines = [e for e in ENGINE_PRIORITY if OCR_ENGINES.get(e, {}).get("available")]
+    if not engines:
+        print("没有可用的OCR引擎")
+        return
+    print(f"标注截图 {len(samples)} 张，预处理方案 {', '.join(profiles)}，每张重复 {args.repeat} 次\n")
+
+    report = {
+        "manifest": args.manifest.name,
+        "samples": len(samples),
+        "repeat": args.repeat,
+        "engines": {engine_type: _run_in_subprocess(engine_type, args) for engine_type in engines},
+    }
+    _print_report(report)
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\n结果已写入 {args.json}")
+    if args.baseline:
+        found = _regressions(report, json.loads(args.baseline.read_text(encoding="utf-8")))
+        print(f"\n与 {args.baseline} 相比：" + ("没有退化" if not found else f"{len(found)} 处变化"))
+        for line in found:
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+刷卡会话回放：用录制的卡号、截屏和接口响应，在无界面服务中重新运行真实的刷卡流程
+
+录制：python -m app --record logs/session.zip（无界面模式同样支持 --record）。回放使用
+当前代码；配置默认取自录制时的配置，--config 可换成新的配置（例如调整后的识别方案），
+名单和锚点参考图取自归档。截屏由录制的帧拼出，验证/绑定接口返回录制的响应，不访问
+真实后端，也不改动本机的配置、名单和追踪文件。
+
+节奏：
+- 默认按录制的时间间隔送入卡号、按录制的耗时返回接口响应，重现现场的负载
+- --fast 尽快送入：上一张处理完（流水线模式下同时进行的流程未满）即送入下一张，
+  接口立即返回，录制中被去重的重复到达不再送入，衡量当前版本本身的处理能力
+
+输出录制与回放的吞吐（张/分钟）、延迟 p50/p95/最大、各结果次数和各环节耗时 p50，
+并列出提交的字段值与录制不同的请求。--json 保存结果，--baseline 与上次的结果比较。
+
+用法：
+    python scripts/replay_session.py logs/session.zip
+    python scripts/replay_session.py logs/session.zip --fast --json replay.json --baseline replay_old.json
+    python scripts/replay_session.py logs/session.zip --config app_settings.json --keep
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config_manager import ConfigManager  # noqa: E402
+from app.headless import HeadlessService  # noqa: E402
+from app.ocr_engine import wait_ocr_ready  # noqa: E402
+from app.screen_capture import configure_screen_capture  # noqa: E402
+from app.session_record import (  # noqa: E402
+    REPLAY_OF, ReplayTransport, SessionArchive, SessionCapture, stage_durations,
+)
+from app.tracing import TRACER, stamp_arrival  # noqa: E402
+
+# 等待模型加载的最长时间（秒），加载时间不计入回放
+WARMUP_TIMEOUT_S = 300
+
+# 列出的字段值差异条数
+MAX_MISMATCHES = 20
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def _summary(results, elapsed_s: float) -> dict:
+    """results: [{outcome, duration_ms, stages}]"""
+    durations = sorted(r["duration_ms"] for r in results)
+    stages = {}
+    for r in results:
+        for name, ms in r.get("stages", {}).items():
+            stages.setdefault(name, []).append(ms)
+    return {
+        "swipes": len(results),
+        "elapsed_s": round(elapsed_s, 2),
+        "per_minute": round(len(results) / elapsed_s * 60, 1) if elapsed_s > 0 else 0.0,
+        "p50_ms": round(_percentile(durations, 0.5), 1),
+        "p95_ms": round(_percentile(durations, 0.95), 1),
+        "max_ms": round(durations[-1], 1) if durations else 0.0,
+        "outcomes": dict(Counter(r["outcome"] for r in results)),
+        "stages_p50_ms": {name: round(_percentile(sorted(v), 0.5), 1) for name, v in sorted(stages.items())},
+    }
+
+
+def _recorded_summary(archive: SessionArchive, cards) -> dict:
+    results = [archive.results[c["trace_id"]] for c in cards if c["trace_id"] in archive.results]
+    ends = [r["t"] for r in results]
+    elapsed = (max(ends) - cards[0]["t"]) if ends else 0.0
+    return _summary(results, elapsed)
+
+
+def run_replay(archive: SessionArchive, config, fast: bool, workdir: Path, timeout_s: float) -> dict:
+    # 回放不接入真实设备和端口；只用 HID 监听以外的刷卡流程
+    config.hid.enabled = False
+    config.backend.metrics_port = 0
+    config.backend.trace_swipes = True
+    if fast:
+        config.backend.swipe_dedupe_seconds = 0.0
+    archive.extract_files(workdir)
+    config_path = workdir / "app_settings.json"
+    manager = ConfigManager(config_path)
+    manager.save(config)
+    manager.close()
+
+    cards = archive.cards
+    if fast:
+        cards = [c for c in cards if archive.results.get(c["trace_id"], {}).get("outcome") != "duplicate"]
+    if not cards:
+        return {"cards": 0}
+
+    service = HeadlessService(config_path, ipc_port=0, metrics_port=0)
+    service.start()
+    capture = SessionCapture(archive)
+    configure_screen_capture(ttl_ms=0, provider=capture)
+    transport = ReplayTransport(archive, realtime=not fast)
+    service.pipeline.http = transport
+    dispatcher = threading.Thread(target=service.run, name="replay-dispatch", daemon=True)
+    dispatcher.start()
+    if any(f.enabled and f.recognition_area for f in config.ocr_fields):
+        print("等待OCR引擎就绪...")
+        wait_ocr_ready(timeout=WARMUP_TIMEOUT_S)
+
+    results = {}
+    lock = threading.Lock()
+    all_done = threading.Event()
+    concurrency = config.backend.swipe_max_active if config.backend.swipe_pipeline else 1
+    slots = threading.Semaphore(max(1, concurrency))
+
+    def _on_end(trace) -> None:
+        recorded_id = trace.card.get(REPLAY_OF)
+        if not recorded_id:
+            return
+        root = trace.root
+        with lock:
+            results[recorded_id] = {
+                "outcome": root.attrs.get("outcome", ""),
+                "duration_ms": ((root.end or time.time()) - root.start) * 1000,
+                "stages": stage_durations(trace),
+                "ended_at": time.time(),
+            }
+            if len(results) >= len(cards):
+                all_done.set()
+        slots.release()
+
+    TRACER.add_listener(_on_end)
+    mode = "尽快" if fast else "按录制节奏"
+    print(f"回放 {len(cards)} 次刷卡（{mode}）...")
+    started = time.time()
+    try:
+        for event in cards:
+            if fast:
+                slots.acquire(timeout=timeout_s)
+            else:
+                delay = started + (event["t"] - cards[0]["t"]) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            card = dict(event["card"])
+            card[REPLAY_OF] = event["trace_id"]
+            capture.last_trace_id = event["trace_id"]
+            stamp_arrival(card)
+            service.dispatch(lambda card=card: service.on_card_data(card))
+        all_done.wait(timeout=timeout_s)
+    finally:
+        TRACER.remove_listener(_on_end)
+        service.stop()
+        dispatcher.join(timeout=5)
+        service.shutdown()
+
+    with lock:
+        finished = dict(results)
+    last_end = max((r["ended_at"] for r in finished.values()), default=started)
+    return {
+        "session": archive.path.name,
+        "mode": "fast" if fast else "recorded",
+        "cards": len(cards),
+        "unfinished": len(cards) - len(finished),
+        "recorded": _recorded_summary(archive, cards),
+        "replay": _summary(list(finished.values()), last_end - started),
+        "mismatches": [
+            {"trace_id": trace_id, "field": name, "recorded": old, "replay": new}
+            for trace_id, name, old, new in transport.mismatches
+        ],
+    }
+
+
+def _print_report(report: dict) -> None:
+    recorded, replay = report["recorded"], report["replay"]
+    print(f"\n{'':<14}{'录制':>12}{'回放':>12}")
+    for key, label in (("per_minute", "张/分钟"), ("p50_ms", "p50 ms"), ("p95_ms", "p95 ms"), ("max_ms", "最大 ms")):
+        print(f"{label:<14}{recorded.get(key, 0):>12.1f}{replay.get(key, 0):>12.1f}")
+    print("结果：录制 " + json.dumps(recorded.get("outcomes", {}), ensure_ascii=False)
+          + "  回放 " + json.dumps(replay.get("outcomes", {}), ensure_ascii=False))
+    if report["unfinished"]:
+        print(f"超时未结束 {report['unfinished']} 次")
+    stages = sorted(set(recorded.get("stages_p50_ms", {})) | set(replay.get("stages_p50_ms", {})))
+    if stages:
+        print("\n各环节 p50（ms）：")
+        for name in stages:
+            old = recorded.get("stages_p50_ms", {}).get(name)
+            new = replay.get("stages_p50_ms", {}).get(name)
+            print(f"  {name:<14}{'-' if old is None else f'{old:.1f}':>12}{'-' if new is None else f'{new:.1f}':>12}")
+    mismatches = report["mismatches"]
+    if mismatches:
+        print(f"\n提交的字段值与录制不同 {len(mismatches)} 处：")
+        for item in mismatches[:MAX_MISMATCHES]:
+            print(f"  关联ID={item['trace_id']} {item['field']}: '{item['recorded']}' → '{item['replay']}'")
+
+
+def _compare(report: dict, baseline: dict):
+    """与上次回放结果比较吞吐和延迟"""
+    lines = []
+    old, new = baseline.get("replay", {}), report["replay"]
+    for key, label in (("per_minute", "张/分钟"), ("p50_ms", "p50"), ("p95_ms", "p95"), ("max_ms", "最大")):
+        if key in old and old[key]:
+            change = (new.get(key, 0) - old[key]) / old[key] * 100
+            lines.append(f"{label}: {old[key]:.1f} → {new.get(key, 0):.1f} ({change:+.0f}%)")
+    if baseline.get("session") != report.get("session") or baseline.get("mode") != report.get("mode"):
+        lines.append(f"注意：上次为 {baseline.get('session')}（{baseline.get('mode')}），会话或节奏不同")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="刷卡会话回放")
+    parser.add_argument("session", type=Path, help="录制的会话归档（.zip）")
+    parser.add_argument("--config", type=Path, help="使用该配置代替录制时的配置")
+    parser.add_argument("--fast", action="store_true", help="尽快送入卡号，接口立即返回")
+    parser.add_argument("--timeout", type=float, default=120.0, help="等待单张卡处理完的最长时间（秒）")
+    parser.add_argument("--json", type=Path, help="结果写入该 JSON 文件")
+    parser.add_argument("--baseline", type=Path, help="与上次的 JSON 结果比较")
+    parser.add_argument("--keep", action="store_true", help="保留回放目录（日志、追踪文件）")
+    args = parser.parse_args()
+
+    archive = SessionArchive(args.session)
+    config = ConfigManager(args.config).load() if args.config else archive.config
+    workdir = Path(tempfile.mkdtemp(prefix="replay-"))
+    (workdir / "logs").mkdir()
+    logging.basicConfig(
+        filename=str(workdir / "logs" / "replay.log"), level=logging.INFO, encoding="utf-8",
+        format="%(asctime)s - %(levelname)s - %(message)s",
+    )
+    print(f"会话 {args.session}：{len(archive.cards)} 次刷卡，录制于 "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(archive.info.get('started_at', 0)))}")
+    try:
+        report = run_replay(archive, config, args.fast, workdir, args.timeout)
+    finally:
+        archive.close()
+        TRACER.configure(None)
+        if not args.keep:
+            logging.shutdown()
+            shutil.rmtree(workdir, ignore_errors=True)
+    if not report.get("cards"):
+        print("会话中没有可回放的刷卡")
+        return
+    _print_report(report)
+    if args.keep:
+        print(f"\n日志和追踪文件：{workdir / 'logs'}（python scripts/trace_report.py --file {workdir / 'logs' / 'traces.jsonl'}）")
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\n结果已写入 {args.json}")
+    if args.baseline:
+        print(f"\n与 {args.baseline} 相比：")
+        for line in _compare(report, json.loads(args.baseline.read_text(encoding="utf-8"))):
+            print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
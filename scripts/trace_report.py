@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+刷卡追踪分析：从 logs/traces.jsonl（含轮转的 .1 ~ .5）中找出慢刷卡并定位耗时环节
+
+每行是一次刷卡的耗时分段树（见 app/tracing.py）。在指定时间范围内输出：
+- 总体：刷卡次数、各结果（done/failed/cancelled/duplicate...）次数、总耗时 p50/p95
+- 各环节：按分段名称统计次数、p50/p95/最大耗时，以及占全部刷卡总耗时的比例
+- 最慢的 N 次刷卡及其关键路径：从刷卡结束时刻向前，每一步取最晚结束的子分段，
+  逐层展开，得到决定总耗时的那条环节链；两段之间的空档记为“(间隙)”
+
+--id 指定关联ID（日志中“关联ID=”后的值）时打印该次刷卡的完整分段树。
+
+用法：
+    python scripts/trace_report.py
+    python scripts/trace_report.py --since "2026-10-16 08:00" --until "2026-10-16 12:00" --top 20
+    python scripts/trace_report.py --outcome done --file D:/bloothcard/logs/traces.jsonl
+    python scripts/trace_report.py --id 3f2a9c1b7d4e
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.tracing import TRACE_BACKUPS, TRACE_FILE  # noqa: E402
+
+DEFAULT_FILE = ROOT / "logs" / TRACE_FILE
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d")
+
+# 关键路径中短于该值的间隙不单独列出（毫秒）
+MIN_GAP_MS = 1.0
+
+
+def _parse_time(value: str) -> float:
+    for fmt in TIME_FORMATS:
+        try:
+            return dt.datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析时间 {value!r}，格式为 YYYY-MM-DD [HH:MM[:SS]]")
+
+
+def _format_time(ts: float) -> str:
+    return dt.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct))]
+
+
+def load_traces(path: Path, since=None, until=None, outcome=None):
+    """读取追踪文件及其轮转备份，按开始时间排序；无法解析的行跳过"""
+    files = [Path(f"{path}.{i}") for i in range(TRACE_BACKUPS, 0, -1)] + [path]
+    traces = []
+    for file in files:
+        if not file.exists():
+            continue
+        with file.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    continue
+                started = trace.get("started_at", 0.0)
+                if since is not None and started < since:
+                    continue
+                if until is not None and started >= until:
+                    continue
+                if outcome and trace.get("outcome") != outcome:
+                    continue
+                traces.append(trace)
+    traces.sort(key=lambda t: t.get("started_at", 0.0))
+    return traces
+
+
+def _duration(span) -> float:
+    return span["end_ms"] - span["start_ms"]
+
+
+def _walk(span):
+    yield span
+    for child in span.get("children", ()):
+        yield from _walk(child)
+
+
+def critical_path(span):
+    """
+    关键路径上的叶子环节，按时间顺序返回 [(名称, 开始ms, 耗时ms)]
+
+    从分段结束时刻向前，取结束不晚于当前时刻且最晚结束的子分段，展开它之后
+    把时刻移到它的开始；没有子分段覆盖的时间记为该分段自身（或间隙）。
+    """
+    children = span.get("children", ())
+    if not children:
+        return [(span["name"], span["start_ms"], _duration(span))]
+    path = []
+    cursor = span["end_ms"]
+    remaining = list(children)
+    while True:
+        candidates = [c for c in remaining if c["end_ms"] <= cursor + 1e-6 and c["start_ms"] >= span["start_ms"]]
+        if not candidates:
+            break
+        child = max(candidates, key=lambda c: c["end_ms"])
+        if cursor - child["end_ms"] >= MIN_GAP_MS:
+            path.append(("(间隙)", child["end_ms"], cursor - child["end_ms"]))
+        path.extend(reversed(critical_path(child)))
+        cursor = child["start_ms"]
+        # 按对象排除已选中的子分段：零长度分段的结束时刻等于新的 cursor，否则会被反复选中
+        remaining = [c for c in remaining if c is not child and c["end_ms"] <= cursor + 1e-6]
+    if cursor - span["start_ms"] >= MIN_GAP_MS:
+        path.append(("(间隙)", span["start_ms"], cursor - span["start_ms"]))
+    path.reverse()
+    return path
+
+
+def stage_breakdown(traces):
+    """分段名称 -> 耗时列表（毫秒）；field:姓名 等字段分段另外汇总为 field:*"""
+    stages = defaultdict(list)
+    for trace in traces:
+        for span in _walk(trace["root"]):
+            if span is trace["root"]:
+                continue
+            stages[span["name"]].append(_duration(span))
+            if span["name"].startswith("field:"):
+                stages["field:*"].append(_duration(span))
+    return stages
+
+
+def _print_overview(traces) -> None:
+    durations = sorted(t["duration_ms"] for t in traces)
+    outcomes = Counter(t.get("outcome", "") for t in traces)
+    print(
+        f"{_format_time(traces[0]['started_at'])} ~ {_format_time(traces[-1]['started_at'])}  "
+        f"刷卡 {len(traces)} 次  总耗时 p50 {_percentile(durations, 0.5):.0f} ms  "
+        f"p95 {_percentile(durations, 0.95):.0f} ms  最大 {durations[-1]:.0f} ms"
+    )
+    print("  结果：" + "  ".join(f"{name or '-'} {count}" for name, count in outcomes.most_common()))
+
+
+def _print_stages(traces) -> None:
+    total = sum(t["duration_ms"] for t in traces) or 1.0
+    stages = stage_breakdown(traces)
+    print("\n各环节耗时（ms）：")
+    print(f"  {'环节':<20}{'次数':>6}{'p50':>9}{'p95':>9}{'最大':>9}{'占比':>8}")
+    for name, values in sorted(stages.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        share = sum(values) / total * 100
+        print(
+            f"  {name:<20}{len(values):>6}{_percentile(values, 0.5):>9.1f}{_percentile(values, 0.95):>9.1f}"
+            f"{values[-1]:>9.1f}{share:>7.1f}%"
+        )
+
+
+def _print_slowest(traces, top: int) -> None:
+    slowest = sorted(traces, key=lambda t: -t["duration_ms"])[:top]
+    print(f"\n最慢的 {len(slowest)} 次刷卡：")
+    for trace in slowest:
+        root = trace["root"]
+        attrs = root.get("attrs", {})
+        print(
+            f"  {_format_time(trace['started_at'])}  关联ID={trace['trace_id']}  卡号={attrs.get('card', '')}  "
+            f"{trace['duration_ms']:.0f} ms  {trace.get('outcome', '')}"
+            + (f"  错误={attrs['error']}" if attrs.get("error") else "")
+        )
+        path = critical_path(root)
+        print("    关键路径：" + " → ".join(f"{name} {ms:.0f}" for name, _start, ms in path if ms >= MIN_GAP_MS))
+
+
+def _print_tree(span, indent: int = 0) -> None:
+    attrs = span.get("attrs", {})
+    extra = "  " + " ".join(f"{k}={v}" for k, v in attrs.items()) if attrs else ""
+    flag = "  (未结束)" if span.get("unfinished") else ""
+    print(f"{'  ' * indent}{span['name']:<{max(1, 24 - 2 * indent)}} +{span['start_ms']:>8.1f} {_duration(span):>8.1f} ms{flag}{extra}")
+    for child in span.get("children", ()):
+        _print_tree(child, indent + 1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="刷卡追踪分析")
+    parser.add_argument("--file", type=Path, default=DEFAULT_FILE, help="追踪文件，轮转的备份一并读取")
+    parser.add_argument("--since", type=_parse_time, help="开始时间 YYYY-MM-DD [HH:MM[:SS]]")
+    parser.add_argument("--until", type=_parse_time, help="结束时间（不含）")
+    parser.add_argument("--outcome", help="只统计该结果的刷卡，例如 done")
+    parser.add_argument("--top", type=int, default=10, help="列出最慢的刷卡次数")
+    parser.add_argument("--id", help="打印该关联ID的完整分段树")
+    args = parser.parse_args()
+
+    traces = load_traces(args.file, args.since, args.until, args.outcome)
+    if args.id:
+        for trace in traces:
+            if trace["trace_id"] == args.id:
+                print(f"{_format_time(trace['started_at'])}  关联ID={trace['trace_id']}  {trace.get('outcome', '')}")
+                _print_tree(trace["root"])
+                return
+        print(f"{args.file} 中没有关联ID {args.id}")
+        return
+    if not traces:
+        print(f"{args.file} 中没有符合条件的刷卡记录")
+        return
+    _print_overview(traces)
+    _print_stages(traces)
+    _print_slowest(traces, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from app import ocr_engine
+from app.ocr_engine import OCREnginePool
+
+
+class _Backend:
+    pass
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    """create_backend 的调用记录；每次调用前等待 gate，raise_next 为 True 时抛出异常"""
+    calls = {"count": 0, "threads": [], "raise_next": False, "gate": threading.Event()}
+    calls["gate"].set()
+
+    def _create(engine_type):
+        calls["count"] += 1
+        calls["threads"].append(threading.current_thread().name)
+        calls["gate"].wait(5)
+        if calls["raise_next"]:
+            calls["raise_next"] = False
+            raise RuntimeError("模型加载失败")
+        return _Backend()
+
+    monkeypatch.setattr(ocr_engine, "create_backend", _create)
+    monkeypatch.setattr(ocr_engine, "available_memory_mb", lambda: None)
+    return calls
+
+
+def test_checkout_waits_instead_of_loading_on_caller_thread(backends):
+    pool = OCREnginePool("paddle", first=_Backend(), max_size=3, reserve_mb=0)
+    first = pool.checkout()
+    with pytest.raises(TimeoutError):
+        pool.checkout(timeout=0.05)
+    assert backends["count"] == 0
+    pool.checkin(first)
+    assert pool.checkout(timeout=1) is first
+
+
+def test_grown_instance_serves_waiting_checkout(backends):
+    pool = OCREnginePool("paddle", first=_Backend(), max_size=3, reserve_mb=0)
+    pool.checkout()
+    backends["gate"].clear()
+    pool.grow_async()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout(timeout=2)))
+    waiter.start()
+    time.sleep(0.05)
+    backends["gate"].set()
+    waiter.join(2)
+    assert len(got) == 1 and isinstance(got[0], _Backend)
+    assert backends["threads"] == ["ocr-pool-grow"]
+    assert pool.stats()["size"] == 2
+
+
+def test_grow_failure_backs_off_without_lowering_cap(backends):
+    pool = OCREnginePool("paddle", first=_Backend(), max_size=3, reserve_mb=0)
+    backends["raise_next"] = True
+    with pool._cond:
+        pool._creating += 1
+    with pytest.warns(UserWarning):
+        assert pool._create() is None
+    stats = pool.stats()
+    assert stats["max_size"] == 3 and stats["grow_failures"] == 1
+    assert not pool._can_grow()
+    backoff = pool._grow_after - time.monotonic()
+    assert 0 < backoff <= ocr_engine.POOL_GROW_BACKOFF_S
+    pool.grow_async()
+    assert backends["count"] == 1
+    # 暂停期过后恢复扩容，成功后清零连续失败次数
+    pool._grow_after = 0.0
+    assert pool._can_grow()
+    with pool._cond:
+        pool._creating += 1
+    assert pool._create() is not None
+    assert pool._failure_streak == 0
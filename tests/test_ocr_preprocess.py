@@ -0,0 +1,42 @@
+import PIL.Image
+import pytest
+
+from app.ocr_preprocess import PRESETS, PreprocessPipeline, parse_profile
+
+TARGET_HEIGHT = 48
+
+# 矮于、接近、远高于目标高度的字段截图
+SIZES = [(78, 45), (120, 20), (200, 48), (300, 400)]
+
+
+def _crop(width: int, height: int) -> PIL.Image.Image:
+    image = PIL.Image.new("RGB", (width, height), (250, 250, 250))
+    image.paste((20, 20, 20), (width // 4, height // 4, width // 2, height // 2))
+    return image
+
+
+@pytest.mark.parametrize("spec", ["pad;height", "height;pad", "pad=4;height;pad=6", *PRESETS])
+@pytest.mark.parametrize("width,height", SIZES)
+def test_geometry_matches_output_size(spec, width, height):
+    pipeline = PreprocessPipeline(parse_profile(spec, TARGET_HEIGHT))
+    out = pipeline.run(_crop(width, height))
+    scale, pad = pipeline.geometry(height)
+    assert out.height == pytest.approx(height * scale + 2 * pad, abs=0.5)
+    # 宽度按各自取整，允许一个像素的误差
+    assert out.width == pytest.approx(width * scale + 2 * pad, abs=1.0)
+
+
+def test_geometry_pad_before_height():
+    pipeline = PreprocessPipeline(parse_profile("pad;height", TARGET_HEIGHT))
+    # 45 + 16 = 61 已在目标高度的范围内，不再缩放
+    assert pipeline.geometry(45) == (1.0, 8.0)
+    out = pipeline.run(_crop(78, 45))
+    assert out.size == (94, 61)
+
+
+def test_geometry_pad_scaled_with_height():
+    pipeline = PreprocessPipeline(parse_profile("pad=8;height", TARGET_HEIGHT))
+    scale, pad = pipeline.geometry(20)
+    # 20 + 16 = 36 放大到 48，先加的留白随之放大
+    assert scale == pytest.approx(48 / 36)
+    assert pad == pytest.approx(8 * 48 / 36)
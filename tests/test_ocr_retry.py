@@ -0,0 +1,25 @@
+from app.config_manager import NUMERIC_RETRY_VARIANTS, AppConfig, OCRField
+from app.ocr_retry import RetryStrategy
+
+
+def _field(**kwargs) -> OCRField:
+    return OCRField(field_id="f", name="字段", param_name="p", **kwargs)
+
+
+def test_invert_skipped_for_binarizing_profiles():
+    for profile in ("numeric", "adaptive", "grayscale;binarize=otsu;height"):
+        strategy = RetryStrategy.for_field(_field(preprocess_profile=profile), 0.5)
+        assert "invert" not in strategy.variants
+        assert strategy.variants == ("pad", "upscale")
+
+
+def test_invert_kept_without_binarize():
+    for profile in ("", "text", "form"):
+        strategy = RetryStrategy.for_field(_field(preprocess_profile=profile), 0.5)
+        assert strategy.variants == ("pad", "upscale", "invert")
+
+
+def test_default_numeric_fields_have_no_invert_variant():
+    numeric = [f for f in AppConfig.default().ocr_fields if f.preprocess_profile == "numeric"]
+    assert numeric
+    assert all(f.retry_variants == NUMERIC_RETRY_VARIANTS for f in numeric)
@@ -0,0 +1,53 @@
+from app.roster import Roster, RosterStore
+
+
+def test_exact_hit():
+    roster = Roster({"王医生": 3, "李护士": 1})
+    match = roster.match("王 医生")
+    assert match.entry == "王医生" and match.distance == 0 and match.confident
+
+
+def test_distance_one_snaps_to_entry():
+    roster = Roster({"王医生": 1, "李护士": 1, "诊疗间2": 1})
+    match = roster.match("王医主")
+    assert match.entry == "王医生"
+    assert match.distance == 1 and match.unique and match.confident
+
+
+def test_tie_is_not_unique():
+    roster = Roster({"张三丰": 1, "张三峰": 1})
+    match = roster.match("张三山")
+    assert match.distance == 1
+    assert not match.unique and not match.confident
+
+
+def test_tie_broken_by_usage_count():
+    roster = Roster({"张三丰": 5, "张三峰": 1})
+    match = roster.match("张三山")
+    assert match.entry == "张三丰" and match.unique
+
+
+def test_query_longer_than_longest_entry_plus_limit():
+    roster = Roster({"王医生": 1})
+    # 6 个字允许距离 2，比最长名单项长 3，不可能匹配
+    assert roster.match("王医生王医生") is None
+
+
+def test_candidates_use_postings_and_lengths():
+    roster = Roster({"王医生": 1, "李护士": 1, "王五": 1})
+    assert set(roster._candidates("王医主", 1)) == {"王医生"}
+    # 不同汉字太少、无法用单字筛选时按长度取候选
+    assert set(roster._candidates("王", 1)) == {"王五"}
+
+
+def test_store_save_round_trip(tmp_path):
+    path = tmp_path / "rosters.json"
+    store = RosterStore(path)
+    store.learn("docName", "王医生")
+    store.save()
+    store.learn("docName", "李医生")
+    store.save()
+    loaded = RosterStore(path)
+    loaded.load()
+    assert set(loaded.get("docName").entries()) == {"王医生", "李医生"}
+    assert [p.name for p in tmp_path.iterdir()] == ["rosters.json"]
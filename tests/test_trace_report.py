@@ -0,0 +1,32 @@
+import importlib.util
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+_spec = importlib.util.spec_from_file_location("trace_report", ROOT / "scripts" / "trace_report.py")
+trace_report = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(trace_report)
+
+
+def test_critical_path_with_zero_length_child():
+    root = {
+        "name": "swipe", "start_ms": 0.0, "end_ms": 10.0,
+        "children": [
+            {"name": "source", "start_ms": 0.0, "end_ms": 1.0},
+            {"name": "dedupe", "start_ms": 1.0, "end_ms": 1.0},
+            {"name": "verify", "start_ms": 1.0, "end_ms": 10.0},
+        ],
+    }
+    path = trace_report.critical_path(root)
+    names = [name for name, _start, _ms in path]
+    assert names[0] == "source" and names[-1] == "verify"
+    assert sum(ms for _name, _start, ms in path) == 10.0
+
+
+def test_critical_path_all_children_zero_length():
+    root = {
+        "name": "swipe", "start_ms": 0.0, "end_ms": 0.0,
+        "children": [{"name": f"step{i}", "start_ms": 0.0, "end_ms": 0.0} for i in range(3)],
+    }
+    path = trace_report.critical_path(root)
+    assert 1 <= len(path) <= 3
+    assert all(ms == 0.0 for _name, _start, ms in path)